@@ -1,17 +1,41 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, Toplevel, Label, messagebox
 from PIL import Image, ImageTk
-from processing.color import convert_to_grayscale
-from processing.threshold import calculate_threshold
-from processing.halftone import simple_halftone, error_diffusion_halftoning
-from processing.histogram import show_histogram, histogram_equalization
-from processing.simple_edge_detection import apply_sobel, apply_prewitt, apply_kirsch
-from processing.advanced_edge_detection import ( homogeneity_operator, difference_operator, difference_of_gaussians, 
-                                                    contrast_based_edge_detection, variance_operator, range_operator )
-from processing.filtering import apply_highpass, apply_lowpass, apply_median
-from processing.image_operations import invert_image, add_image_and_copy, subtract_image_and_copy
-from processing.utils import reset_image
-from processing.histogram_based_segmentation import manual_segmentation, peak_segmentation, valley_segmentation, adaptive_segmentation
+from processing.histogram import calculate_histogram, channel_histograms, export_histogram
+from processing.history import ImageHistory
+from processing.pipeline import LazyImage
+from processing.profiling import Profiler, format_record, operation_name
+from processing.progress import CancelToken, OperationCancelled, progress_context
+from processing.registry import CATEGORIES, operations_in
+from processing.result_cache import ResultCache
+
+# How often (ms) the main loop checks the worker thread for progress and results
+WORKER_POLL_INTERVAL = 50
+
+# Memory allowed for undo/redo states; older states are compressed, then spilled to disk
+HISTORY_BYTE_BUDGET = 256 * 1024 * 1024
+
+# Memory for results reused when an operation is run again on the same pixels,
+# and a directory to keep them across sessions (None: memory only)
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_DIR = None
+
+# Largest size shown in the image labels; images are never resized in place
+DISPLAY_SIZE = (400, 300)
+
+# Height (px) of the histogram views under the images
+HISTOGRAM_HEIGHT = 120
+
+# Buttons per row in each category frame
+CATEGORY_COLUMNS = {"Image Segmentation": 2}
+DEFAULT_CATEGORY_COLUMNS = 3
+
+def histogram_counts(img):
+    """Bin counts drawn for an image: luminance, plus each channel of RGB images."""
+    channels = channel_histograms(img) if img.mode == "RGB" else None
+    return calculate_histogram(img), channels
 
 class ImageProcessingApp:
     def __init__(self, root):
@@ -55,9 +79,25 @@ class ImageProcessingApp:
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Open Image", command=self.load_image)
         file_menu.add_command(label="Save Processed Image", command=self.save_image)
+        file_menu.add_command(label="Export Histogram...", command=self.export_histogram)
+        file_menu.add_command(label="Export Profiling Trace...", command=self.export_trace)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
 
+        # Edit menu
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
+        edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
+        edit_menu.add_separator()
+        # Deferred: operations are only recorded (and previewed) until the
+        # full-resolution pixels are needed, then run as one pipeline
+        self.deferred_var = tk.BooleanVar(value=False)
+        edit_menu.add_checkbutton(label="Deferred Processing", variable=self.deferred_var,
+                                  command=self.toggle_deferred)
+
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
@@ -93,6 +133,16 @@ class ImageProcessingApp:
         self.processed_frame = ttk.Label(self.image_frame, relief="solid", borderwidth=1)
         self.processed_frame.grid(row=0, column=1, padx=5, pady=5, sticky="nsew")
 
+        # Histograms of both images, drawn natively from cached bin counts
+        self.histogram_views = {}
+        for column, frame in enumerate((self.original_frame, self.processed_frame)):
+            canvas = tk.Canvas(self.image_frame, height=HISTOGRAM_HEIGHT, bg="white",
+                               highlightthickness=1, highlightbackground="gray")
+            canvas.grid(row=1, column=column, padx=5, pady=5, sticky="ew")
+            canvas.counts = None
+            canvas.bind("<Configure>", lambda event, c=canvas: self.draw_histogram(c))
+            self.histogram_views[frame] = canvas
+
         # Configure grid weights for image frames
         self.image_frame.grid_columnconfigure(0, weight=1)
         self.image_frame.grid_columnconfigure(1, weight=1)
@@ -120,157 +170,101 @@ class ImageProcessingApp:
         )
         self.reset_button.grid(row=0, column=2, padx=2, pady=2)
 
-        # Basic operations
-        row = 1
-        basic_ops = [
-            ("Grayscale", convert_to_grayscale),
-            ("Threshold", calculate_threshold),
-            ("Simple Halftone", simple_halftone),
-            ("Advanced Halftone", error_diffusion_halftoning),
-            ("Histogram", show_histogram),
-            ("Histogram Equalization", histogram_equalization)
-        ]
-
-        for text, func in basic_ops:
-            btn = ttk.Button(
-                self.buttons_frame, text=text,
-                command=lambda f=func: self.process_image(f),
-                state=tk.DISABLED
-            )
-            btn.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
-            row += 1
-
-        # Edge Detection Menu
-        edge_frame = ttk.LabelFrame(self.buttons_frame, text="Edge Detection")
-        edge_frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
-        row += 1
-
-        edge_ops = [
-            ("Sobel", apply_sobel),
-            ("Prewitt", apply_prewitt),
-            ("Kirsch", apply_kirsch)
-        ]
-
-        for i, (text, func) in enumerate(edge_ops):
-            btn = ttk.Button(
-                edge_frame, text=text,
-                command=lambda f=func: self.process_image(f),
-                state=tk.DISABLED
-            )
-            btn.grid(row=0, column=i, padx=2, pady=2)
-
-        # Advanced Edge Detection Menu
-        advanced_edge_frame = ttk.LabelFrame(self.buttons_frame, text="Advanced Edge Detection")
-        advanced_edge_frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
-        row += 1
-
-        advanced_edge_ops = [
-            ("Homogeneity", homogeneity_operator),
-            ("Difference", difference_operator),
-            ("DoG", difference_of_gaussians),
-            ("Contrast", contrast_based_edge_detection),
-            ("Variance", variance_operator),
-            ("Range", range_operator)
-        ]
-
-        # Loop to create buttons and arrange them in a 2x3 grid
-        for i, (text, func) in enumerate(advanced_edge_ops):
-            btn = ttk.Button(
-                advanced_edge_frame, text=text,
-                command=lambda f=func: self.process_image(f),
-                state=tk.DISABLED
-            )
-            
-            # Determine the row and column for the grid
-            row_position = i // 3  # Integer division for rows (0, 1, 2)
-            col_position = i % 3   # Modulo for columns (0, 1, 2)
-            
-            btn.grid(row=row_position, column=col_position, padx=2, pady=2)
+        self.cancel_button = ttk.Button(
+            control_frame, text="Cancel", command=self.cancel_operation,
+            state=tk.DISABLED
+        )
+        self.cancel_button.grid(row=0, column=3, padx=2, pady=2)
 
+        self.undo_button = ttk.Button(
+            control_frame, text="Undo", command=self.undo,
+            state=tk.DISABLED
+        )
+        self.undo_button.grid(row=1, column=0, padx=2, pady=2)
 
+        self.redo_button = ttk.Button(
+            control_frame, text="Redo", command=self.redo,
+            state=tk.DISABLED
+        )
+        self.redo_button.grid(row=1, column=1, padx=2, pady=2)
 
-        # Filtering Menu
-        filter_frame = ttk.LabelFrame(self.buttons_frame, text="Filtering")
-        filter_frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
-        row += 1
+        # Operation buttons, one frame per category of the registry
+        row = 1
+        for category in CATEGORIES:
+            operations = operations_in(category)
+
+            # Basic operations are listed as plain full-width buttons
+            if category == "Basic":
+                for operation in operations:
+                    btn = ttk.Button(
+                        self.buttons_frame, text=operation.label,
+                        command=lambda op=operation: self.request_operation(op),
+                        state=tk.DISABLED
+                    )
+                    btn.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
+                    row += 1
+                continue
+
+            frame = ttk.LabelFrame(self.buttons_frame, text=category)
+            frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
+            row += 1
 
-        filter_ops = [
-            ("High Pass", apply_highpass),
-            ("Low Pass", apply_lowpass),
-            ("Median", apply_median)
-        ]
+            columns = CATEGORY_COLUMNS.get(category, DEFAULT_CATEGORY_COLUMNS)
+            for i, operation in enumerate(operations):
+                btn = ttk.Button(
+                    frame, text=operation.label,
+                    command=lambda op=operation: self.request_operation(op),
+                    state=tk.DISABLED
+                )
+                btn.grid(row=i // columns, column=i % columns, padx=2, pady=2)
+
+    def request_operation(self, operation):
+        # Ask for the parameters (defaults pre-filled), then run
+        if operation.params:
+            self.ask_parameters(operation)
+        else:
+            self.process_image(operation)
+
+    def ask_parameters(self, operation):
+        params = operation.params
+
+        dialog = Toplevel(self.root)
+        dialog.title(operation.label)
+        dialog.geometry(f"300x{70 + 55 * len(params)}")
+
+        variables = []
+        for param in params:
+            default = None if param.required else param.default
+            if param.type is bool:
+                variable = tk.BooleanVar(value=bool(default))
+                ttk.Checkbutton(dialog, text=param.label, variable=variable).pack(pady=5)
+                variables.append((param, variable))
+                continue
+
+            prompt = f"Enter {param.label.lower()}"
+            if param.min is not None and param.max is not None:
+                prompt += f" ({param.min}-{param.max})"
+            Label(dialog, text=prompt + ":").pack(pady=5)
+            variable = tk.StringVar(value="" if default is None else str(default))
+            if param.choices is not None:
+                ttk.Combobox(dialog, textvariable=variable, values=param.choices,
+                             state="readonly").pack(pady=5)
+            else:
+                ttk.Entry(dialog, textvariable=variable).pack(pady=5)
+            variables.append((param, variable))
+
+        def apply():
+            try:
+                kwargs = {param.name: param.validate(variable.get()) if param.type is bool
+                          else param.parse(variable.get())
+                          for param, variable in variables}
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            dialog.destroy()
+            self.process_image(operation, kwargs)
 
-        for i, (text, func) in enumerate(filter_ops):
-            btn = ttk.Button(
-                filter_frame, text=text,
-                command=lambda f=func: self.process_image(f),
-                state=tk.DISABLED
-            )
-            btn.grid(row=0, column=i, padx=2, pady=2)
-
-        # Histogram-based Segmentation Menu
-        segmentation_frame = ttk.LabelFrame(self.buttons_frame, text="Image Segmentation")
-        segmentation_frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
-        row += 1
-
-        # Function to handle manual segmentation with threshold input
-        def manual_segment_dialog():
-            dialog = Toplevel(self.root)
-            dialog.title("Manual Segmentation")
-            dialog.geometry("300x100")
-            
-            Label(dialog, text="Enter threshold value (0-255):").pack(pady=5)
-            threshold_var = tk.StringVar(value="128")
-            entry = ttk.Entry(dialog, textvariable=threshold_var)
-            entry.pack(pady=5)
-            
-            def apply():
-                try:
-                    threshold = int(threshold_var.get())
-                    if 0 <= threshold <= 255:
-                        self.process_image(lambda img: manual_segmentation(img, threshold))
-                        dialog.destroy()
-                    else:
-                        messagebox.showerror("Error", "Threshold must be between 0 and 255")
-                except ValueError:
-                    messagebox.showerror("Error", "Please enter a valid number")
-            
-            ttk.Button(dialog, text="Apply", command=apply).pack(pady=5)
-
-        segmentation_ops = [
-            ("Manual", manual_segment_dialog),
-            ("Peak", lambda: self.process_image(peak_segmentation)),
-            ("Valley", lambda: self.process_image(valley_segmentation)),
-            ("Adaptive", lambda: self.process_image(lambda img: adaptive_segmentation(img, block_size=16)))
-        ]
-
-        # Create segmentation buttons in a grid
-        for i, (text, func) in enumerate(segmentation_ops):
-            btn = ttk.Button(
-                segmentation_frame, text=text,
-                command=func,
-                state=tk.DISABLED
-            )
-            btn.grid(row=i//2, column=i%2, padx=2, pady=2)
-
-        # Image Operations Menu
-        img_ops_frame = ttk.LabelFrame(self.buttons_frame, text="Image Operations")
-        img_ops_frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
-        row += 1
-
-        img_ops = [
-            ("Invert", invert_image),
-            ("Add & Copy", add_image_and_copy),
-            ("Sub & Copy", subtract_image_and_copy)
-        ]
-
-        for i, (text, func) in enumerate(img_ops):
-            btn = ttk.Button(
-                img_ops_frame, text=text,
-                command=lambda f=func: self.process_image(f),
-                state=tk.DISABLED
-            )
-            btn.grid(row=0, column=i, padx=2, pady=2)
+        ttk.Button(dialog, text="Apply", command=apply).pack(pady=5)
 
     def create_status_bar(self):
         self.status_var = tk.StringVar()
@@ -285,156 +279,17 @@ class ImageProcessingApp:
         self.original_image = None
         self.processed_image = None
         self.last_operation = None  # Track the last operation performed
-        # Dictionary mapping operations to their theory
-        self.theory_map = {
-            convert_to_grayscale: """Grayscale Conversion:
-Converts a color image to black and white by:
-- Taking the red, green, and blue colors
-- Mixing them with specific weights (59% green, 30% red, 11% blue)
-- Creating a single gray value""",
-
-            calculate_threshold: """Thresholding:
-Makes a black and white image by:
-- Choosing a threshold value
-- Making pixels brighter than threshold white
-- Making pixels darker than threshold black""",
-
-            simple_halftone: """Simple Halftoning:
-Creates a newspaper-like effect by:
-- Breaking image into small squares
-- Making each square either black or white
-- Creating the illusion of gray shades""",
-
-            error_diffusion_halftoning: """Error Diffusion Halftoning:
-An advanced newspaper-like effect that:
-- Processes image pixel by pixel
-- Spreads errors to nearby pixels
-- Creates smoother patterns than simple halftoning""",
-
-            show_histogram: """Histogram:
-Shows how bright or dark an image is by:
-- Counting pixels of each brightness level
-- Showing results in a graph
-- Helping analyze image quality""",
-
-            histogram_equalization: """Histogram Equalization:
-Improves image contrast by:
-- Finding dark and bright areas
-- Spreading out the brightness levels
-- Making details more visible""",
-
-            apply_sobel: """Sobel Edge Detection:
-Finds edges in images by:
-- Looking at how quickly brightness changes
-- Finding vertical and horizontal edges
-- Combining them into a complete edge image""",
-
-            apply_prewitt: """Prewitt Edge Detection:
-Similar to Sobel but simpler:
-- Finds vertical and horizontal edges
-- Less sensitive to small details
-- Good for finding strong edges""",
-
-            apply_kirsch: """Kirsch Edge Detection:
-Finds edges in all directions:
-- Checks 8 different directions
-- Picks the strongest edge
-- Good for finding detailed edges""",
-
-            homogeneity_operator: """Homogeneity Edge Detection:
-Finds edges by:
-- Comparing each pixel to its neighbors
-- Finding areas where pixels are different
-- Marking these areas as edges""",
-
-            difference_operator: """Difference Edge Detection:
-A simple way to find edges:
-- Finds brightest and darkest nearby pixels
-- Calculates their difference
-- Large differences mean edges""",
-
-            difference_of_gaussians: """Difference of Gaussians:
-Finds edges by:
-- Blurring image two different amounts
-- Subtracting the blurred images
-- Finding where they differ most""",
-
-            contrast_based_edge_detection: """Contrast Edge Detection:
-Finds edges where:
-- Bright and dark areas meet
-- Contrast changes significantly
-- Local differences are high""",
-
-            variance_operator: """Variance Edge Detection:
-Finds edges where:
-- Pixel values vary a lot
-- Local area has high variation
-- Changes are significant""",
-
-            range_operator: """Range Edge Detection:
-Simple edge detection that:
-- Finds highest and lowest values nearby
-- Calculates their range
-- Marks high ranges as edges""",
-
-            apply_highpass: """High Pass Filter:
-Makes edges stand out by:
-- Keeping sharp details
-- Removing smooth areas
-- Making edges more visible""",
-
-            apply_lowpass: """Low Pass Filter:
-Smooths the image by:
-- Blurring sharp details
-- Averaging nearby pixels
-- Reducing noise""",
-
-            apply_median: """Median Filter:
-Removes noise while keeping edges:
-- Sorts nearby pixels by brightness
-- Takes the middle value
-- Replaces noisy pixels""",
-
-            invert_image: """Image Inversion:
-Creates a negative by:
-- Making dark areas bright
-- Making bright areas dark
-- Reversing all colors""",
-
-            add_image_and_copy: """Image Addition:
-Combines two images by:
-- Adding their brightness values
-- Making result brighter
-- Useful for blending images""",
-
-            subtract_image_and_copy: """Image Subtraction:
-Shows differences between images by:
-- Subtracting brightness values
-- Showing what changed
-- Useful for finding differences""",
-            
-            manual_segmentation: """Manual Segmentation:
-Divides an image into segments by:
-- Choosing a threshold value
-- Making pixels brighter than threshold white
-- Making pixels darker than threshold black""",
-
-            peak_segmentation: """Peak Segmentation:
-Divides an image into segments by:
-- Finding peaks in the histogram
-- Using these peaks as thresholds""",
-
-            valley_segmentation: """Valley Segmentation:
-Divides an image into segments by:
-- Finding valleys in the histogram
-- Using these valleys as thresholds""",
-
-            adaptive_segmentation: """Adaptive Segmentation:
-Divides an image into segments by:
-- Analyzing the local area around each pixel
-- Adjusting the threshold based on the local area"""
-        }
-
+        self.worker = None  # Thread of the current operation, kept after a cancel until it exits
+        self.cancel_token = None
+        self.worker_queue = queue.Queue()
+        self.history = ImageHistory(HISTORY_BYTE_BUDGET)
+        self.proxy_cache = {}  # id(image) -> (image, downscaled display proxy)
+        self.histogram_cache = {}  # id(image) -> (image, histogram counts)
+        self.profiler = Profiler()  # Timings of every operation run in this session
+        self.result_cache = ResultCache(RESULT_CACHE_BYTES, RESULT_CACHE_DIR)
+        self.pending = None  # LazyImage of the operations recorded in deferred mode
+        self.pending_preview = None  # The same operations on the display proxy
+        self.after_materialize = None  # Called once the pending operations have run
     def save_image(self):
         if self.processed_image:
             file_path = filedialog.asksaveasfilename(
@@ -442,11 +297,50 @@ Divides an image into segments by:
                 filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
             )
             if file_path:
-                try:
-                    self.processed_image.save(file_path)
-                    self.status_var.set(f"Image saved to {file_path}")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to save image: {str(e)}")
+                # Deferred operations are run first
+                self.materialize(lambda: self.write_image(file_path))
+
+    def write_image(self, file_path):
+        try:
+            self.processed_image.save(file_path)
+            self.status_var.set(f"Image saved to {file_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save image: {str(e)}")
+
+    def export_histogram(self):
+        if self.processed_image is None:
+            messagebox.showinfo("Histogram", "Open an image first.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png"), ("SVG files", "*.svg"), ("PDF files", "*.pdf"),
+                       ("All files", "*.*")]
+        )
+        if file_path:
+            self.materialize(lambda: self.write_histogram(file_path))
+
+    def write_histogram(self, file_path):
+        try:
+            # Imports matplotlib on first use only
+            export_histogram(self.processed_image, file_path)
+            self.status_var.set(f"Histogram saved to {file_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save histogram: {str(e)}")
+
+    def export_trace(self):
+        if not self.profiler.records:
+            messagebox.showinfo("Profiling", "No operation has been run yet.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            try:
+                self.profiler.export_chrome_trace(file_path)
+                self.status_var.set(f"Trace saved to {file_path} (open it in Perfetto or chrome://tracing)")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save trace: {str(e)}")
 
     def show_about(self):
         about_text = """Image Processing Tool
@@ -468,10 +362,13 @@ Created for educational purposes."""
         )
         
         if file_path:
+            self.cancel_operation()
+            self.discard_pending()
             try:
                 self.image = Image.open(file_path)
                 self.original_image = self.image.copy()
                 self.processed_image = self.image.copy()
+                self.history.clear()
                 
                 # Display both original and processed images
                 self.display_image(self.original_image, self.original_frame)
@@ -485,22 +382,143 @@ Created for educational purposes."""
                 self.status_var.set(f"Error loading image: {str(e)}")
                 messagebox.showerror("Error", f"Failed to load image: {str(e)}")
 
+    def display_proxy(self, img):
+        """
+        Downscaled copy of an image for the label widgets.
+
+        Proxies are cached per image object, so redisplaying (or previewing an
+        operation on) the same image never rescales it again. The full
+        resolution image itself is never modified.
+        """
+        cached = self.proxy_cache.get(id(img))
+        if cached is not None and cached[0] is img:
+            return cached[1]
+
+        if img.width <= DISPLAY_SIZE[0] and img.height <= DISPLAY_SIZE[1]:
+            proxy = img
+        else:
+            proxy = img.copy()
+            proxy.thumbnail(DISPLAY_SIZE, Image.Resampling.LANCZOS)
+
+        # Only keep proxies of the images that can still be displayed
+        live = (self.original_image, self.processed_image, img)
+        self.proxy_cache = {key: value for key, value in self.proxy_cache.items()
+                            if any(value[0] is image for image in live)}
+        self.proxy_cache[id(img)] = (img, proxy)
+        return proxy
+
     def display_image(self, img, frame):
-        # Calculate scaling factor to fit in frame
-        display_size = (400, 300)
-        img.thumbnail(display_size, Image.Resampling.LANCZOS)
+        # Show the cached display proxy, leaving the working image untouched
+        proxy = self.display_proxy(img)
         
         # Convert image for display
-        tk_image = ImageTk.PhotoImage(img)
+        tk_image = ImageTk.PhotoImage(proxy)
         frame.config(image=tk_image)
         frame.image = tk_image  # Keep a reference
 
+        self.show_histogram(img, frame)
+
+    def cached_histogram_counts(self, img):
+        """
+        Histogram counts of an image, kept per image object.
+
+        The counts come from the shared histogram cache, but keeping them here
+        as well means redrawing the same image never hashes it again.
+        """
+        cached = self.histogram_cache.get(id(img))
+        if cached is not None and cached[0] is img:
+            return cached[1]
+
+        counts = histogram_counts(img)
+
+        live = (self.original_image, self.processed_image, img)
+        self.histogram_cache = {key: value for key, value in self.histogram_cache.items()
+                                if any(value[0] is image for image in live)}
+        self.histogram_cache[id(img)] = (img, counts)
+        return counts
+
+    def show_histogram(self, img, frame):
+        canvas = self.histogram_views[frame]
+        canvas.counts = self.cached_histogram_counts(img)
+        self.draw_histogram(canvas)
+
+    def draw_histogram(self, canvas):
+        canvas.delete("all")
+        if canvas.counts is None:
+            return
+        luminance, channels = canvas.counts
+
+        width = max(canvas.winfo_width(), 256)
+        height = max(canvas.winfo_height(), HISTOGRAM_HEIGHT)
+        peak = max(int(luminance.max()), 1)
+        if channels is not None:
+            peak = max(peak, int(channels.max()))
+        bin_width = width / 256
+
+        def y(count):
+            return height - 2 - count / peak * (height - 6)
+
+        # Luminance as gray bars, RGB channels as outlines on top
+        for value, count in enumerate(luminance):
+            if count:
+                x = value * bin_width
+                canvas.create_rectangle(x, y(count), x + bin_width, height, fill="gray", width=0)
+        if channels is not None:
+            for counts, color in zip(channels, ("red", "green", "blue")):
+                points = []
+                for value, count in enumerate(counts):
+                    points.extend(((value + 0.5) * bin_width, y(count)))
+                canvas.create_line(*points, fill=color)
+
+    def toggle_histograms(self):
+        # The histograms are always up to date; the button only shows or hides them
+        canvases = list(self.histogram_views.values())
+        visible = canvases[0].winfo_ismapped()
+        for canvas in canvases:
+            if visible:
+                canvas.grid_remove()
+            else:
+                canvas.grid()
+        self.status_var.set("Histograms hidden" if visible else "Histograms shown")
+
     def reset_image(self):
         if self.original_image:
+            self.cancel_operation()
+            self.discard_pending()
+            # Resetting is a step of its own, so it can be undone too
+            self.history.push(self.processed_image)
             self.processed_image = self.original_image.copy()
             self.display_image(self.processed_image, self.processed_frame)
+            self.update_history_buttons()
             self.status_var.set("Image reset to original")
 
+    def undo(self):
+        if self.pending is not None and not self.running():
+            self.undo_pending()
+            return
+        if self.processed_image is None or not self.history.can_undo:
+            return
+        self.cancel_operation()
+        # Restores the stored state, no operation is re-run
+        self.processed_image = self.history.undo(self.processed_image)
+        self.display_image(self.processed_image, self.processed_frame)
+        self.update_history_buttons()
+        self.status_var.set("Undone")
+
+    def redo(self):
+        if self.processed_image is None or not self.history.can_redo:
+            return
+        self.cancel_operation()
+        self.processed_image = self.history.redo(self.processed_image)
+        self.display_image(self.processed_image, self.processed_frame)
+        self.update_history_buttons()
+        self.status_var.set("Redone")
+
+    def update_history_buttons(self):
+        can_undo = self.history.can_undo or self.pending is not None
+        self.undo_button.config(state=tk.NORMAL if can_undo else tk.DISABLED)
+        self.redo_button.config(state=tk.NORMAL if self.history.can_redo else tk.DISABLED)
+
     def enable_buttons(self):
         # Enable buttons in the buttons frame
         for widget in self.buttons_frame.winfo_children():
@@ -515,26 +533,245 @@ Created for educational purposes."""
                     if isinstance(button, ttk.Button):
                         button.config(state=tk.NORMAL)
 
-    def process_image(self, operation):
+        # Cancel only makes sense while an operation is running
+        if not self.running():
+            self.cancel_button.config(state=tk.DISABLED)
+        self.update_history_buttons()
+
+    def running(self):
+        """Whether an operation is running that has not been cancelled."""
+        return self.worker is not None and not self.cancel_token.cancelled
+
+    def worker_busy(self):
+        """Whether a worker thread, even a cancelled one, has not exited yet."""
+        if self.worker is None:
+            return False
+        if self.cancel_token.cancelled:
+            self.status_var.set("Waiting for the cancelled operation to stop")
+        else:
+            self.status_var.set("Another operation is still running")
+        return True
+
+    def process_image(self, operation, kwargs=None):
         if self.processed_image:
+            if self.worker_busy():
+                return
+
+            # Store the last operation performed
+            self.last_operation = operation
             try:
-                self.status_var.set(f"Processing image...")
-                self.root.update()
-                
-                # Store the last operation performed
-                self.last_operation = operation
-                
-                result = operation(self.processed_image)
-                
-                if isinstance(result, Image.Image):
-                    self.processed_image = result
-                    self.display_image(self.processed_image, self.processed_frame)
-                    self.status_var.set("Processing complete")
-                else:
-                    self.status_var.set("Operation complete")
+                # Loads the operation's module on first use
+                func = operation.bind(**(kwargs or {}))
             except Exception as e:
                 self.status_var.set(f"Error: {str(e)}")
                 messagebox.showerror("Error", f"Failed to process image: {str(e)}")
+                return
+
+            # Views are drawn by the app itself rather than by the operation
+            if operation.display_only:
+                if operation.name == "show_histogram":
+                    self.toggle_histograms()
+                return
+
+            if self.deferred_var.get():
+                self.defer_operation(operation, kwargs or {})
+                return
+            if self.pending is not None:
+                # Operations left from deferred mode run first
+                self.materialize(lambda: self.process_image(operation, kwargs))
+                return
+
+            # If the image is larger than the display, the worker first runs
+            # the operation on the display proxy for a quick preview
+            proxy = self.display_proxy(self.processed_image)
+            preview = proxy if proxy is not self.processed_image else None
+            self.start_worker(func, preview)
+
+    def start_worker(self, func, preview=None, name=None, params=None):
+        # Run on a worker thread so the window stays responsive
+        self.cancel_token = CancelToken()
+        self.worker = threading.Thread(
+            target=self.run_operation,
+            args=(func, self.processed_image, preview, self.cancel_token, name, params),
+            daemon=True
+        )
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set("Processing image...")
+        self.worker.start()
+        self.root.after(WORKER_POLL_INTERVAL, self.poll_worker, self.cancel_token)
+
+    def defer_operation(self, operation, kwargs):
+        # Record the operation and only run it on the display proxy, which is
+        # small enough to do right away
+        if self.pending is None:
+            self.pending = LazyImage(self.processed_image)
+            proxy = self.display_proxy(self.processed_image)
+            self.pending_preview = self.pending if proxy is self.processed_image else LazyImage(proxy)
+        try:
+            pending = self.pending.then(operation, **kwargs)
+            preview_node = self.pending_preview.then(operation, **kwargs)
+            preview = preview_node.compute(self.profiler)
+        except Exception as e:
+            self.status_var.set(f"Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to process image: {str(e)}")
+            return
+
+        self.pending, self.pending_preview = pending, preview_node
+        if isinstance(preview, Image.Image):
+            self.show_preview(preview)
+        self.update_history_buttons()
+        self.status_var.set(f"{len(self.pending)} operation(s) deferred, "
+                            "shown on the preview until the image is saved")
+
+    def undo_pending(self):
+        # Drop the last deferred operation; its parent's preview is kept computed
+        self.pending = self.pending.parent
+        self.pending_preview = self.pending_preview.parent
+        if self.pending.parent is None:
+            self.discard_pending()
+            self.display_image(self.processed_image, self.processed_frame)
+        else:
+            self.show_preview(self.pending_preview.compute())
+            self.status_var.set(f"{len(self.pending)} operation(s) deferred")
+        self.update_history_buttons()
+
+    def discard_pending(self):
+        self.pending = None
+        self.pending_preview = None
+        self.after_materialize = None
+
+    def materialize(self, then=None):
+        """Run the deferred operations at full resolution, then call `then`."""
+        if self.pending is None:
+            if then is not None:
+                then()
+            return
+        if self.worker_busy():
+            return
+        pending = self.pending
+        self.after_materialize = then
+        self.start_worker(lambda image: pending.compute(self.profiler),
+                          name=f"pipeline ({len(pending)} operations)",
+                          params=[(operation.name, kwargs) for operation, kwargs in pending.steps])
+
+    def toggle_deferred(self):
+        if not self.deferred_var.get():
+            self.materialize()
+
+    def run_operation(self, operation, image, preview, token, name=None, params=None):
+        # Runs on the worker thread: never touch Tk here, only post to the queue
+        def report(fraction):
+            self.worker_queue.put((token, "progress", fraction))
+
+        # Results are reused when the same operation and parameters were
+        # already run on the same pixels (e.g. after undo)
+        def run(target, record):
+            result, cached = self.result_cache.call(operation, target, name, params)
+            if cached:
+                record["name"] += " (cached)"
+            return result
+
+        name = name or operation_name(operation)
+        try:
+            if preview is not None:
+                with progress_context(None, token), \
+                        self.profiler.measure(f"{name} (preview)", preview) as record:
+                    result = run(preview, record)
+                self.worker_queue.put((token, "preview", result))
+            with progress_context(report, token), self.profiler.measure(name, image) as record:
+                result = run(image, record)
+            # Count the histogram here too, so the view updates without blocking Tk
+            counts = histogram_counts(result) if isinstance(result, Image.Image) else None
+            self.worker_queue.put((token, "done", (result, record, counts)))
+        except OperationCancelled:
+            self.worker_queue.put((token, "cancelled", None))
+        except Exception as e:
+            self.worker_queue.put((token, "error", e))
+
+    def poll_worker(self, token):
+        # Each worker has its own polling chain, which keeps running after
+        # the worker is cancelled until its thread has posted its last message
+        if token is not self.cancel_token:
+            return
+        # Drain everything the worker posted since the last poll
+        finished = None
+        while finished is None:
+            try:
+                sender, kind, value = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
+            if sender is not token:
+                continue  # Left over from an earlier operation
+            if token.cancelled and kind in ("progress", "preview"):
+                continue
+            if kind == "progress":
+                self.status_var.set(f"Processing full resolution... {value:.0%}")
+            elif kind == "preview":
+                # Show the preview; processed_image stays the last full result
+                if isinstance(value, Image.Image):
+                    self.show_preview(value)
+            else:
+                finished = (kind, value)
+
+        if finished is None:
+            self.root.after(WORKER_POLL_INTERVAL, self.poll_worker, token)
+            return
+
+        self.worker = None
+        self.cancel_token = None
+        self.cancel_button.config(state=tk.DISABLED)
+
+        kind, result = finished
+        if token.cancelled:
+            # A result that was finished before the cancel was noticed is dropped too
+            self.after_materialize = None
+            self.status_var.set("Operation cancelled")
+        elif kind == "done":
+            result, record, counts = result
+            if isinstance(result, Image.Image):
+                self.history.push(self.processed_image)
+                self.processed_image = result
+                self.histogram_cache[id(result)] = (result, counts)
+                self.display_image(self.processed_image, self.processed_frame)
+                self.status_var.set(f"Processing complete ({format_record(record)})")
+            else:
+                self.status_var.set(f"Operation complete ({format_record(record)})")
+            # Deferred operations that were just run are no longer pending
+            then = self.after_materialize
+            self.discard_pending()
+            self.update_history_buttons()
+            if then is not None:
+                then()
+        elif kind == "cancelled":
+            self.after_materialize = None
+            self.status_var.set("Operation cancelled")
+        else:
+            self.after_materialize = None
+            self.status_var.set(f"Error: {str(result)}")
+            messagebox.showerror("Error", f"Failed to process image: {str(result)}")
+
+    def show_preview(self, preview):
+        tk_image = ImageTk.PhotoImage(self.display_proxy(preview))
+        self.processed_frame.config(image=tk_image)
+        self.processed_frame.image = tk_image
+        self.show_histogram(preview, self.processed_frame)
+        self.status_var.set("Preview ready, processing full resolution...")
+
+    def cancel_operation(self):
+        if not self.running():
+            return
+        # The worker stops at its next progress check and its result is
+        # ignored. The thread is kept until it has exited, so that no new
+        # operation runs next to it.
+        self.cancel_token.cancel()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.after_materialize = None
+        # Drop any preview that was shown for the cancelled operation
+        if self.pending is not None:
+            self.show_preview(self.pending_preview.compute())
+        else:
+            self.display_image(self.processed_image, self.processed_frame)
+        self.status_var.set("Cancelling operation...")
 
     def show_theory(self):
         # If no operation has been performed yet
@@ -557,10 +794,7 @@ Created for educational purposes."""
         text_widget.pack(side="left", fill="both", expand=True)
         
         # Get theory for last operation
-        if self.last_operation in self.theory_map:
-            theory_text = self.theory_map[self.last_operation]
-        else:
-            theory_text = "No theory available for this operation."
+        theory_text = self.last_operation.theory or "No theory available for this operation."
         
         # Insert theory content
         text_widget.insert(tk.END, theory_text)
@@ -0,0 +1,333 @@
+"""
+Headless batch runner for the image processing operations.
+
+Runs an ordered chain of operations over every file matched by the input
+globs and writes the results to an output directory, spreading the files
+across a process pool. Nothing here imports tkinter, so it works without a
+display (for example inside the Docker image).
+
+Example:
+    python batch.py "scans/*.png" -o out/ --workers 8 \\
+        --op convert_to_grayscale --op "apply_median(size=5)" \\
+        --op "adaptive_segmentation(block_size=16)" --trace trace.json
+"""
+import argparse
+import ast
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+from processing.pipeline import run_steps
+from processing.precision import PRECISIONS, set_precision
+from processing.profiling import Profiler
+from processing.registry import get_operation
+from processing.result_cache import ResultCache, file_digest
+from processing.tiling import operation_halo, process_tiled
+
+
+def parse_operation(spec):
+    """
+    Parse an operation spec such as ``apply_median(size=5)``.
+
+    Args:
+        spec (str): Operation name, optionally followed by keyword arguments
+            written as Python literals.
+
+    Returns:
+        tuple: (name, kwargs) pair.
+    """
+    try:
+        node = ast.parse(spec.strip(), mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"Invalid operation spec: {spec!r}")
+
+    if isinstance(node, ast.Name):
+        return node.id, {}
+
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        raise ValueError(f"Invalid operation spec: {spec!r}")
+    if node.args:
+        raise ValueError(f"Operation parameters must be passed by keyword: {spec!r}")
+
+    kwargs = {}
+    for keyword in node.keywords:
+        if keyword.arg is None:
+            raise ValueError(f"Invalid operation spec: {spec!r}")
+        try:
+            kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+        except ValueError:
+            raise ValueError(f"Parameter {keyword.arg!r} must be a literal: {spec!r}")
+
+    return node.func.id, kwargs
+
+
+def resolve_operation(name):
+    """
+    Find the processing function with the given name in the operation registry.
+
+    Args:
+        name (str): Function name, e.g. ``apply_sobel``.
+
+    Returns:
+        callable: The processing function.
+    """
+    operation = get_operation(name)
+    if operation.display_only:
+        raise ValueError(f"Operation {name!r} cannot be used in a batch chain")
+    return operation.function
+
+
+def run_chain(image, chain, profiler=None):
+    """
+    Apply a chain of operations to an image.
+
+    The chain runs as one pipeline: the image is converted to an array once,
+    intermediates stay arrays and consecutive point operations are applied
+    as a single lookup table.
+
+    Args:
+        image (PIL.Image.Image): The input image.
+        chain (list): (name, kwargs) pairs applied in order.
+        profiler (Profiler): Records every pass of the pipeline, if given.
+
+    Returns:
+        PIL.Image.Image: The processed image.
+    """
+    steps = []
+    for name, kwargs in chain:
+        resolve_operation(name)
+        steps.append((get_operation(name), kwargs))
+    result = run_steps(image, steps, profiler)
+    if not isinstance(result, Image.Image):
+        raise TypeError(f"Chain {[name for name, _ in chain]} did not return an image")
+    return result
+
+
+# Results kept in memory by each worker process on top of the cache directory
+WORKER_CACHE_BYTES = 64 * 1024 * 1024
+
+_caches = {}
+
+
+def _worker_cache(directory):
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = ResultCache(WORKER_CACHE_BYTES, directory)
+    return cache
+
+
+def process_file(input_path, output_path, chain, trace=False, cache_dir=None):
+    """
+    Load one file, run the chain on it and save the result.
+
+    With `cache_dir`, results are cached there under the hash of the file's
+    bytes and the chain, so a file that was already processed with the same
+    chain is not even decoded.
+
+    Returns:
+        tuple: (number of pixels processed, profiling records, whether the
+        result came from the cache); the records are empty unless `trace` is
+        set, and the flag is None without a cache.
+    """
+    cache = key = None
+    if cache_dir is not None:
+        cache = _worker_cache(cache_dir)
+        key = cache.key(file_digest(input_path), "chain", chain)
+        result = cache.get(key)
+        if result is not None:
+            result.save(output_path)
+            return result.width * result.height, [], True
+
+    profiler = Profiler() if trace else None
+    with Image.open(input_path) as image:
+        image.load()
+        pixels = image.width * image.height
+        result = run_chain(image, chain, profiler)
+
+    if cache is not None:
+        cache.put(key, result)
+    result.save(output_path)
+    return pixels, profiler.records if trace else [], None if cache is None else False
+
+
+def process_file_tiled(input_path, output_path, chain, memory_limit, trace=False):
+    """
+    Run the chain tile by tile and write a memory-mapped ``.npy`` output.
+
+    When tracing, the whole tiled chain is recorded as one call.
+
+    Returns:
+        tuple: (number of input pixels processed, profiling records, None);
+        tiled results are not cached.
+    """
+    resolved = [(resolve_operation(name), kwargs) for name, kwargs in chain]
+    if not trace:
+        output = process_tiled(input_path, output_path, resolved, memory_limit)
+        return output.shape[0] * output.shape[1], [], None
+
+    profiler = Profiler(trace_memory=False)
+    with profiler.measure("tiled: " + " -> ".join(name for name, _ in chain)) as record:
+        output = process_tiled(input_path, output_path, resolved, memory_limit)
+        record["height"], record["width"] = output.shape[:2]
+        record["mode"] = str(output.dtype)
+    return output.shape[0] * output.shape[1], profiler.records, None
+
+
+def print_profile_summary(records):
+    """Print the total time and throughput of each operation over all files."""
+    totals = {}
+    for record in records:
+        seconds, pixels, calls = totals.get(record["name"], (0.0, 0, 0))
+        totals[record["name"]] = (seconds + record["duration"], pixels + record["pixels"], calls + 1)
+
+    for name, (seconds, pixels, calls) in sorted(totals.items(), key=lambda item: -item[1][0]):
+        rate = f"{pixels / 1e6 / seconds:.2f} MP/sec" if seconds > 0 else "n/a"
+        print(f"  {name}: {seconds:.2f}s over {calls} call{'s' if calls != 1 else ''} ({rate})")
+
+
+def collect_inputs(patterns):
+    """Expand the input globs into a sorted list of unique files."""
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def output_path_for(input_path, output_dir, extension):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, stem + extension)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Run a chain of image processing operations over many files."
+    )
+    parser.add_argument("inputs", nargs="+", help="input file globs (quote them)")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument(
+        "--op", dest="operations", action="append", required=True,
+        help="operation to apply, e.g. 'apply_median(size=5)'; repeat for a chain"
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=os.cpu_count() or 1,
+        help="number of worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--format", default="png",
+        help="output file extension (default: png)"
+    )
+    parser.add_argument(
+        "--memory-limit", type=int, default=None, metavar="MB",
+        help="process each image in tiles using at most this much working memory "
+             "per worker; inputs must be .npy or uncompressed TIFF files (memory mapped) "
+             "and outputs are written as .npy files"
+    )
+    parser.add_argument(
+        "--trace", metavar="JSON",
+        help="profile every operation call and write a Chrome trace (Perfetto) to this file"
+    )
+    parser.add_argument(
+        "--precision", choices=PRECISIONS, default="policy",
+        help="arithmetic of the filters and edge operators: each operation's own "
+             "policy (int16/float32) or float64 throughout (default: policy)"
+    )
+    parser.add_argument(
+        "--cache-dir", metavar="DIR",
+        help="reuse results cached in this directory for inputs already processed "
+             "with the same chain, and cache new ones there (not with --memory-limit)"
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.cache_dir is not None and args.memory_limit is not None:
+        # Tiled outputs can be larger than memory, so they never go through the cache
+        print("Error: --cache-dir cannot be combined with --memory-limit "
+              "(tiled results are not cached)", file=sys.stderr)
+        return 2
+
+    try:
+        chain = []
+        for spec in args.operations:
+            name, kwargs = parse_operation(spec)
+            resolve_operation(name)
+            kwargs = get_operation(name).bind_arguments(kwargs)
+            if args.memory_limit is not None:
+                operation_halo(name, kwargs)
+            chain.append((name, kwargs))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("Error: no input files matched", file=sys.stderr)
+        return 2
+
+    extension = ".npy" if args.memory_limit is not None else "." + args.format.lstrip(".")
+    outputs = [output_path_for(path, args.output, extension) for path in inputs]
+    if len(set(outputs)) != len(outputs):
+        print("Error: several inputs map to the same output file name", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+
+    total_pixels = 0
+    failures = 0
+    cache_hits = cache_misses = 0
+    trace = args.trace is not None
+    profiler = Profiler()
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=set_precision,
+                             initargs=(args.precision,)) as executor:
+        if args.memory_limit is None:
+            futures = {
+                executor.submit(process_file, input_path, output_path, chain, trace,
+                                args.cache_dir): input_path
+                for input_path, output_path in zip(inputs, outputs)
+            }
+        else:
+            memory_limit = args.memory_limit * 1024 * 1024
+            futures = {
+                executor.submit(process_file_tiled, input_path, output_path, chain,
+                                memory_limit, trace): input_path
+                for input_path, output_path in zip(inputs, outputs)
+            }
+        for future in as_completed(futures):
+            try:
+                pixels, records, hit = future.result()
+                total_pixels += pixels
+                profiler.extend(records)
+                if hit is not None:
+                    cache_hits += hit
+                    cache_misses += not hit
+            except Exception as e:
+                failures += 1
+                print(f"Failed: {futures[future]}: {e}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    processed = len(inputs) - failures
+    print(
+        f"Processed {processed}/{len(inputs)} images in {elapsed:.2f}s "
+        f"({processed / elapsed:.2f} images/sec, "
+        f"{total_pixels / 1e6 / elapsed:.2f} MP/sec)"
+    )
+    if cache_hits or cache_misses:
+        print(f"Cache: {cache_hits} hits, {cache_misses} misses")
+
+    if trace:
+        print_profile_summary(profiler.records)
+        profiler.export_chrome_trace(args.trace)
+        print(f"Trace written to {args.trace}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
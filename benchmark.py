@@ -0,0 +1,418 @@
+"""
+Benchmark suite for the image processing operations.
+
+Times every public operation of the modules in the operation registry on
+synthetic L and RGB images of several sizes and reports wall time, MP/sec and
+peak resident memory. Every case runs in a fresh process so that memory peaks
+and caches do not leak from one case into the next.
+
+Results can be saved as JSON and compared against an earlier run; the exit
+status is non-zero when an operation got slower than the allowed threshold.
+
+Example:
+    python benchmark.py -o before.json
+    # ... change something in processing/ ...
+    python benchmark.py -o after.json --baseline before.json --threshold 0.1
+    python benchmark.py --load after.json --baseline before.json
+    python benchmark.py --startup
+    python benchmark.py --accuracy
+"""
+import argparse
+import contextlib
+import fnmatch
+import importlib
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from processing.registry import OPERATIONS, operation_modules
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = [256, 512, 1024, 2048, 4096]
+DEFAULT_MODES = ["L", "RGB"]
+
+# Parameters for operations that have no default for them
+BENCHMARK_KWARGS = {
+    "manual_segmentation": {"threshold": 128},
+}
+
+# Timing differences below this many seconds are treated as noise
+NOISE_FLOOR = 0.001
+
+# Longest acceptable time (seconds) to import the app, i.e. everything loaded
+# before the window appears
+STARTUP_TARGET = 0.5
+
+# Largest difference, in gray levels, allowed between an operation run under
+# its precision policy and the float64 reference, and the sizes checked
+ACCURACY_TOLERANCE = 1
+ACCURACY_SIZES = [512]
+
+# Modules that must not be loaded at startup
+STARTUP_FORBIDDEN_MODULES = ["matplotlib"]
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+
+def list_operations(patterns=None):
+    """
+    Find the operations to benchmark.
+
+    Args:
+        patterns (list): fnmatch patterns on operation names; all operations
+            if omitted.
+
+    Returns:
+        list: (module_name, function_name) pairs.
+    """
+    operations = []
+    for module_name in operation_modules():
+        module = importlib.import_module(module_name)
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if func.__module__ != module_name or name.startswith("_"):
+                continue
+            if name in OPERATIONS and OPERATIONS[name].display_only:
+                continue
+            params = list(inspect.signature(func).parameters.values())
+            if not params or params[0].name != "image":
+                continue
+            # Skip functions that need arguments we have no value for (e.g. output paths)
+            given = BENCHMARK_KWARGS.get(name, {})
+            if any(p.default is p.empty and p.name not in given for p in params[1:]):
+                continue
+            if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+                continue
+            operations.append((module_name, name))
+    return operations
+
+
+def synthetic_image(mode, size, seed=0):
+    """
+    Deterministic test image: smooth gradients with texture and noise.
+
+    Args:
+        mode (str): 'L' or 'RGB'.
+        size (int): Width and height in pixels.
+        seed (int): Noise seed.
+
+    Returns:
+        PIL.Image.Image: The image.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    channels = [
+        0.5 + 0.3 * np.sin(6 * x + 2 * y) + 0.15 * np.cos(25 * x * y),
+        x * 0.8 + 0.1 * np.sin(40 * y),
+        1.0 - y * 0.7 + 0.1 * np.cos(30 * x),
+    ]
+    bands = 1 if mode == "L" else 3
+    planes = [
+        np.clip(channels[c] * 255 + rng.normal(0, 12, (size, size)), 0, 255).astype(np.uint8)
+        for c in range(bands)
+    ]
+    array = planes[0] if mode == "L" else np.dstack(planes)
+    return Image.fromarray(array, mode)
+
+
+def peak_rss_mb():
+    """Peak resident memory of the current process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(module_name, name, mode, size, repeat, max_seconds, precision="policy"):
+    """
+    Time one operation on one synthetic image (run in a fresh process).
+
+    The operation is repeated up to `repeat` times, stopping early once
+    `max_seconds` have been spent; the best time is reported.
+
+    Returns:
+        dict: The benchmark record.
+    """
+    from processing.precision import set_precision
+    from processing.utils import clear_plane_cache
+
+    set_precision(precision)
+
+    func = getattr(importlib.import_module(module_name), name)
+    kwargs = BENCHMARK_KWARGS.get(name, {})
+    image = synthetic_image(mode, size)
+    baseline_rss = peak_rss_mb()
+
+    times = []
+    spent = 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while len(times) < repeat and (not times or spent < max_seconds):
+            clear_plane_cache()
+            start = time.perf_counter()
+            func(image, **kwargs)
+            times.append(time.perf_counter() - start)
+            spent += times[-1]
+
+    best = min(times)
+    return {
+        "operation": name,
+        "module": module_name,
+        "mode": mode,
+        "size": size,
+        "precision": precision,
+        "runs": len(times),
+        "seconds": best,
+        "median_seconds": float(np.median(times)),
+        "mp_per_sec": size * size / 1e6 / best if best > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+    }
+
+
+def run_benchmarks(operations, modes, sizes, repeat=3, max_seconds=10.0, precision="policy"):
+    """
+    Run every (operation, mode, size) case, each in its own process.
+
+    Returns:
+        list: One record per case; failed cases carry an "error" entry.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for module_name, name in operations:
+        for mode in modes:
+            for size in sizes:
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    try:
+                        record = pool.apply(run_case, (module_name, name, mode, size, repeat,
+                                                             max_seconds, precision))
+                    except Exception as e:
+                        record = {"operation": name, "module": module_name, "mode": mode,
+                                  "size": size, "error": f"{type(e).__name__}: {e}"}
+                results.append(record)
+                print_record(record)
+    return results
+
+
+def print_record(record):
+    label = f"{record['operation']:<34} {record['mode']:<4} {record['size']:>5}"
+    if "error" in record:
+        print(f"{label}  FAILED: {record['error']}")
+        return
+    rss = record["peak_rss_mb"]
+    rss = f"{rss:8.1f} MB" if rss is not None else "       n/a"
+    print(f"{label}  {record['seconds'] * 1000:10.2f} ms  {record['mp_per_sec']:9.2f} MP/s  {rss}",
+          flush=True)
+
+
+def case_key(record):
+    # Runs saved before the precision setting existed used the policy
+    return record["operation"], record["mode"], record["size"], record.get("precision", "policy")
+
+
+def compare_results(current, baseline, threshold):
+    """
+    Compare two runs.
+
+    Args:
+        current (list): Records of the new run.
+        baseline (list): Records of the reference run.
+        threshold (float): Allowed slowdown as a fraction (0.1 = 10%).
+
+    Returns:
+        list: (record, baseline_record, ratio) for every regression.
+    """
+    reference = {case_key(r): r for r in baseline if "error" not in r}
+    regressions = []
+    for record in current:
+        old = reference.get(case_key(record))
+        if old is None or "error" in record:
+            continue
+        ratio = record["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        if ratio > 1 + threshold and record["seconds"] - old["seconds"] > NOISE_FLOOR:
+            regressions.append((record, old, ratio))
+    return regressions
+
+
+def measure_startup(runs=5):
+    """
+    Time a cold import of the app in fresh interpreters.
+
+    Returns:
+        tuple: (best import time in seconds, forbidden modules that were loaded).
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded.update(name for name in result["modules"]
+                      if name.split(".")[0] in STARTUP_FORBIDDEN_MODULES)
+    return min(times), sorted(loaded)
+
+
+def check_startup(target=STARTUP_TARGET):
+    """Print the startup time and return 1 if it misses the target or loads forbidden modules."""
+    seconds, loaded = measure_startup()
+    print(f"App import: {seconds * 1000:.0f} ms (target {target * 1000:.0f} ms)")
+    status = 0
+    if seconds > target:
+        print("STARTUP REGRESSION: the app takes too long to import")
+        status = 1
+    if loaded:
+        print(f"STARTUP REGRESSION: loaded at startup: {', '.join(loaded)}")
+        status = 1
+    return status
+
+
+def check_accuracy(patterns=None, modes=DEFAULT_MODES, sizes=ACCURACY_SIZES,
+                   tolerance=ACCURACY_TOLERANCE):
+    """
+    Compare every operation that has a precision policy with its float64 run.
+
+    Args:
+        patterns (list): fnmatch patterns on operation names (default: all).
+        modes (list): Image modes to check.
+        sizes (list): Image sizes to check.
+        tolerance (int): Largest allowed difference in gray levels.
+
+    Returns:
+        int: 1 if some result is further than `tolerance` from the reference, else 0.
+    """
+    from processing.precision import precision
+
+    status = 0
+    for name, operation in OPERATIONS.items():
+        if operation.precision is None:
+            continue
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        kwargs = operation.bind_arguments(BENCHMARK_KWARGS.get(name, {}))
+        for mode in modes:
+            for size in sizes:
+                image = synthetic_image(mode, size)
+                with precision("float64"):
+                    reference = np.asarray(operation(image, **kwargs), dtype=np.int16)
+                result = np.asarray(operation(image, **kwargs), dtype=np.int16)
+                difference = int(np.abs(result - reference).max())
+                changed = np.count_nonzero(result != reference) / result.size
+                print(f"{name:<34} {mode:<4} {size:>5}  {operation.precision:<8} "
+                      f"max difference {difference} ({changed:.3%} of values)")
+                if difference > tolerance:
+                    print(f"ACCURACY REGRESSION: {name} differs from float64 by more than "
+                          f"{tolerance} gray level{'s' if tolerance != 1 else ''}")
+                    status = 1
+    return status
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the image processing operations.")
+    parser.add_argument("--ops", nargs="+", metavar="PATTERN",
+                        help="operations to run (fnmatch patterns, default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help=f"square image sizes in pixels (default: {DEFAULT_SIZES}, "
+                             f"{ACCURACY_SIZES} with --accuracy)")
+    parser.add_argument("--modes", nargs="+", choices=DEFAULT_MODES, default=DEFAULT_MODES,
+                        help="image modes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per case; the best is kept (default: 3)")
+    parser.add_argument("--max-seconds", type=float, default=10.0,
+                        help="stop repeating a case after this long (default: 10)")
+    parser.add_argument("-o", "--output", help="save results as JSON")
+    parser.add_argument("--load", metavar="JSON",
+                        help="compare a saved run instead of running the benchmarks")
+    parser.add_argument("--baseline", metavar="JSON", help="earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed slowdown before failing, as a fraction (default: 0.1)")
+    parser.add_argument("--startup", action="store_true",
+                        help="only check the app import time against its target")
+    parser.add_argument("--precision", choices=["policy", "float64"], default="policy",
+                        help="time the operations under their precision policy or in float64")
+    parser.add_argument("--accuracy", action="store_true",
+                        help="only check that each operation's precision policy stays within "
+                             f"{ACCURACY_TOLERANCE} gray level of float64")
+    parser.add_argument("--startup-target", type=float, default=STARTUP_TARGET, metavar="SECONDS",
+                        help="startup time target (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.startup:
+        return check_startup(args.startup_target)
+    if args.accuracy:
+        return check_accuracy(args.ops, args.modes, args.sizes or ACCURACY_SIZES)
+
+    if args.load:
+        with open(args.load) as f:
+            results = json.load(f)["results"]
+    else:
+        operations = list_operations(args.ops)
+        if not operations:
+            print("Error: no operations matched", file=sys.stderr)
+            return 2
+        results = run_benchmarks(operations, args.modes, args.sizes or DEFAULT_SIZES, args.repeat,
+                                 args.max_seconds, args.precision)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    status = 1 if any("error" in r for r in results) else 0
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        precisions = {case_key(r)[3] for r in results}
+        baseline_precisions = {case_key(r)[3] for r in baseline}
+        if precisions != baseline_precisions:
+            print(f"Error: cannot compare a {'/'.join(sorted(precisions))} run with a "
+                  f"{'/'.join(sorted(baseline_precisions))} baseline (--precision differs)",
+                  file=sys.stderr)
+            return 2
+        regressions = compare_results(results, baseline, args.threshold)
+        for record, old, ratio in regressions:
+            print(f"REGRESSION {record['operation']} {record['mode']} {record['size']}: "
+                  f"{old['seconds'] * 1000:.2f} ms -> {record['seconds'] * 1000:.2f} ms "
+                  f"({(ratio - 1) * 100:+.0f}%)")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions above {args.threshold * 100:.0f}%")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,10 @@
 import numpy as np
-from PIL import Image
+from processing.channels import channel_policy
+from processing.precision import accumulator
+from processing.utils import as_array, ensure_grayscale, like_input
+from processing.buffers import check_gray, output_array, pad_reflect, scratch
+from processing.convolution import convolve, correlate_separable, gaussian_factors, gaussian_kernel
+from processing.local_statistics import local_mean, local_variance, local_min, local_max
 
 def normalize_output(image_array):
     """Normalize the output to 0-255 range"""
@@ -9,196 +14,226 @@ def normalize_output(image_array):
         return np.zeros_like(image_array, dtype=np.uint8)
     return np.uint8(255 * (image_array - min_val) / (max_val - min_val))
 
+# All eight neighbours, as (row, column) offsets plus one
+_NEIGHBOURS = [(k, l) for k in range(3) for l in range(3) if (k, l) != (1, 1)]
+
+def _normalize_into(values, out):
+    """normalize_output of a float array, computed in place and written into `out`."""
+    min_val = values.min()
+    max_val = values.max()
+    if max_val == min_val:
+        out[...] = 0
+        return out
+    values -= min_val
+    np.multiply(values, 255, out=values)
+    values /= max_val - min_val
+    np.copyto(out, values, casting="unsafe")
+    return out
+
+def _neighbour_differences_into(image_array, neighbours, combine, out, pool):
+    """
+    |pixel - neighbour| for the given neighbours, combined with `combine`
+    (np.maximum, or np.add for the mean) in int16 and normalized into `out`
+    as a float32 image with a zero border.
+    """
+    height, width = image_array.shape
+    values = scratch(pool, "neighbours.values", (height, width), np.float32)
+    values[...] = 0
+    if height >= 3 and width >= 3:
+        shape = (height - 2, width - 2)
+        center = image_array[1:-1, 1:-1]
+        total = scratch(pool, "neighbours.total", shape, np.int16)
+        difference = scratch(pool, "neighbours.difference", shape, np.int16)
+        for index, (k, l) in enumerate(neighbours):
+            target = total if index == 0 else difference
+            np.subtract(center, image_array[k:height - 2 + k, l:width - 2 + l], out=target, dtype=np.int16)
+            np.abs(target, out=target)
+            if index:
+                combine(total, difference, out=total)
+        if combine is np.add:
+            # Mean of the differences, rounded down like the original // len()
+            total //= len(neighbours)
+        np.copyto(values[1:-1, 1:-1], total)
+    return _normalize_into(values, out)
+
+
+@channel_policy
 def homogeneity_operator(image):
     """
     Apply the Homogeneity Operator for edge detection.
+
+    Each pixel becomes its largest absolute difference from its eight
+    neighbours (see homogeneity_operator_array).
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
     
     Returns:
-        PIL.Image.Image: The edge-detected image.
+        PIL.Image.Image or numpy.ndarray: The edge-detected image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-
-    # Prepare an array for the output
-    edge_img = np.zeros_like(img_array)
-
-    # Define the neighbor offsets
-    neighbors = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-
-    # Apply the homogeneity operator
-    for y in range(1, height - 1):
-        for x in range(1, width - 1):
-            pixel = img_array[y, x]
-            differences = [abs(pixel - img_array[y + dy, x + dx]) for dx, dy in neighbors]
-            edge_img[y, x] = max(differences)
-
-    # Normalize the output to 0-255 range
-    edge_img = normalize_output(edge_img)
-
-    return Image.fromarray(edge_img)
+    image = ensure_grayscale(image)
+    return like_input(homogeneity_operator_array(as_array(image)), image)
 
+@channel_policy
 def difference_operator(image):
     """
     Apply the Difference Operator for edge detection.
+
+    Each pixel becomes the mean absolute difference from its horizontal and
+    vertical neighbours (see difference_operator_array).
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
     
     Returns:
-        PIL.Image.Image: The edge-detected image.
+        PIL.Image.Image or numpy.ndarray: The edge-detected image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-
-    # Prepare an array for the output
-    edge_img = np.zeros_like(img_array)
-
-    # Define the neighbor offsets for horizontal and vertical differences
-    neighbors = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    image = ensure_grayscale(image)
+    return like_input(difference_operator_array(as_array(image)), image)
 
-    # Apply the difference operator
-    for y in range(1, height-1):
-        for x in range(1, width-1):
-            pixel = img_array[y, x]
-            differences = [abs(pixel - img_array[y + dy, x + dx]) for dx, dy in neighbors]
-            edge_img[y, x] = sum(differences) // len(differences)
-
-    # Normalize the output to 0-255 range
-    edge_img = normalize_output(edge_img)
-
-    return Image.fromarray(edge_img)
+def homogeneity_operator_array(image_array, out=None, pool=None):
+    """
+    homogeneity_operator for a 2-D uint8 array, written into `out`.
 
-def gaussian_kernel(size, sigma):
-    """Create a Gaussian kernel"""
-    kernel = np.zeros((size, size), dtype=np.float32)
-    center = size // 2
-    sum_val = 0.0
-    
-    for i in range(size):
-        for j in range(size):
-            x = i - center
-            y = j - center
-            kernel[i, j] = np.exp(-(x**2 + y**2) / (2 * sigma**2))
-            sum_val += kernel[i, j]
-    
-    # Normalize the kernel
-    for i in range(size):
-        for j in range(size):
-            kernel[i, j] /= sum_val
-    
-    return kernel
+    The largest difference from the eight neighbours is computed for all
+    pixels at once, in int16; the one-pixel border is 0.
 
-def apply_gaussian(image_array, kernel):
-    """Apply Gaussian filter manually"""
-    height, width = image_array.shape
-    k_size = kernel.shape[0]
-    pad = k_size // 2
-    padded = np.pad(image_array, ((pad, pad), (pad, pad)), mode='reflect')
-    output = np.zeros_like(image_array)
-    
-    for i in range(height):
-        for j in range(width):
-            window = padded[i:i + k_size, j:j + k_size]
-            output[i, j] = np.sum(window * kernel)
-    
-    return output
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
 
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return _neighbour_differences_into(image_array, _NEIGHBOURS, np.maximum, out, pool)
+
+def difference_operator_array(image_array, out=None, pool=None):
+    """difference_operator for a 2-D uint8 array, see homogeneity_operator_array."""
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    # Up, down, left and right
+    return _neighbour_differences_into(image_array, [(0, 1), (2, 1), (1, 0), (1, 2)], np.add, out, pool)
+
+@channel_policy
 def difference_of_gaussians(image, sigma1=1.0, sigma2=2.0, size=5):
     """Edge detection using difference of Gaussians"""
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    img_array = np.array(image, dtype=np.float32)
+    img_array = as_array(image, np.float32)
     
     # Create Gaussian kernels
     g1 = gaussian_kernel(size, sigma1)
     g2 = gaussian_kernel(size, sigma2)
     
     # Apply Gaussians
-    smooth1 = apply_gaussian(img_array, g1)
-    smooth2 = apply_gaussian(img_array, g2)
+    dtype = accumulator("float32")
+    smooth1 = convolve(img_array, g1, dtype)
+    smooth2 = convolve(img_array, g2, dtype)
     
     # Calculate difference
     output = np.abs(smooth1 - smooth2)
     
-    return Image.fromarray(normalize_output(output))
+    return like_input(normalize_output(output), image)
+
+def difference_of_gaussians_array(image_array, sigma1=1.0, sigma2=2.0, size=5, out=None, pool=None):
+    """
+    difference_of_gaussians for a 2-D uint8 array, written into `out`.
+
+    The Gaussians are always applied as two 1-D passes, as in
+    filtering.apply_lowpass_array.
 
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        sigma1, sigma2, size: As for difference_of_gaussians.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the temporaries.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    dtype = accumulator("float32")
+    padded = pad_reflect(image_array, size // 2, pool, "dog.padded")
+    smooth1 = correlate_separable(padded, *gaussian_factors(size, sigma1), out.shape, dtype, pool, "dog.1")
+    smooth2 = correlate_separable(padded, *gaussian_factors(size, sigma2), out.shape, dtype, pool, "dog.2")
+    np.subtract(smooth1, smooth2, out=smooth1)
+    np.abs(smooth1, out=smooth1)
+
+    return _normalize_into(smooth1, out)
+
+@channel_policy
 def contrast_based_edge_detection(image, kernel_size=3):
     """Edge detection based on local contrast"""
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-    pad = kernel_size // 2
-    
-    # Create padded image
-    padded = np.pad(img_array, ((pad, pad), (pad, pad)), mode='reflect')
+    image = ensure_grayscale(image)
     
-    # Output array
-    output = np.zeros((height, width), dtype=np.float32)
+    img_array = as_array(image)
     
-    # Apply contrast operation
-    for y in range(height):
-        for x in range(width):
-            window = padded[y:y + kernel_size, x:x + kernel_size]
-            center_value = window[pad, pad]
-            mean_value = np.mean(window)
-            output[y, x] = abs(center_value - mean_value)
+    # Contrast is the distance of each pixel from its local mean
+    mean = local_mean(img_array, kernel_size)
+    output = np.abs(img_array - mean)
     
-    return Image.fromarray(normalize_output(output))
+    return like_input(normalize_output(output), image)
 
+@channel_policy
 def variance_operator(image, kernel_size=3):
     """Edge detection based on local variance"""
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-    pad = kernel_size // 2
+    img_array = as_array(image)
+    output = local_variance(img_array, kernel_size)
     
-    # Create padded image
-    padded = np.pad(img_array, ((pad, pad), (pad, pad)), mode='reflect')
-    
-    # Output array
-    output = np.zeros((height, width), dtype=np.float32)
-    
-    # Apply variance operation
-    for y in range(height):
-        for x in range(width):
-            window = padded[y:y + kernel_size, x:x + kernel_size]
-            output[y, x] = np.var(window)
-    
-    return Image.fromarray(normalize_output(output))
+    return like_input(normalize_output(output), image)
 
+@channel_policy
 def range_operator(image, kernel_size=3):
     """Edge detection based on local range of intensities"""
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-    pad = kernel_size // 2
+    img_array = as_array(image)
     
-    # Create padded image
-    padded = np.pad(img_array, ((pad, pad), (pad, pad)), mode='reflect')
+    # Range is computed in a wider type so max - min cannot wrap around
+    output = local_max(img_array, kernel_size).astype(np.float32) - local_min(img_array, kernel_size)
     
-    # Output array
-    output = np.zeros((height, width), dtype=np.float32)
-    
-    # Apply range operation
-    for y in range(height):
-        for x in range(width):
-            window = padded[y:y + kernel_size, x:x + kernel_size]
-            output[y, x] = np.max(window) - np.min(window)
-    
-    return Image.fromarray(normalize_output(output))
\ No newline at end of file
+    return like_input(normalize_output(output), image)
+
+def contrast_based_edge_detection_array(image_array, kernel_size=3, out=None, pool=None):
+    """
+    contrast_based_edge_detection for a 2-D uint8 array, written into `out`.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        kernel_size (int): Width and height of the window.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the window sums and
+            the temporaries.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    mean = local_mean(image_array, kernel_size, pool)
+    np.subtract(image_array, mean, out=mean)
+    np.abs(mean, out=mean)
+    return _normalize_into(mean, out)
+
+def variance_operator_array(image_array, kernel_size=3, out=None, pool=None):
+    """variance_operator for a 2-D uint8 array, see contrast_based_edge_detection_array."""
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return _normalize_into(local_variance(image_array, kernel_size, pool), out)
+
+def range_operator_array(image_array, kernel_size=3, out=None, pool=None):
+    """range_operator for a 2-D uint8 array, see contrast_based_edge_detection_array."""
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    maxima = local_max(image_array, kernel_size, scratch(pool, "range.max", out.shape, np.uint8), pool)
+    minima = local_min(image_array, kernel_size, scratch(pool, "range.min", out.shape, np.uint8), pool)
+    difference = scratch(pool, "range.difference", out.shape, np.float32)
+    np.subtract(maxima, minima, out=difference, dtype=np.float32)
+    return _normalize_into(difference, out)
@@ -0,0 +1,122 @@
+"""
+Output arrays and scratch buffers for the array-native operators.
+
+Operations with a ``*_array`` variant (see Operation.array_function in the
+registry) take a 2-D uint8 array and write their result into an `out` array
+supplied by the caller. Passing the same BufferPool on every call lets them
+take their padded copies and temporaries from the pool too, so a chain of
+operations over a stream of same-sized frames allocates no pixel memory
+after the first frame.
+"""
+import numpy as np
+
+
+class BufferPool:
+    """
+    Arrays kept for reuse, one per (name, shape, dtype).
+
+    A buffer stays valid until it is requested again under the same name, and
+    its contents are undefined when it is handed out. Pools are not
+    thread-safe: use one per thread.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0  # Buffers created so far, to check that a loop reuses them
+
+    def get(self, name, shape, dtype):
+        """
+        A buffer for temporary values.
+
+        Args:
+            name (str): What it is used for, e.g. "sobel.gx"; buffers that are
+                used at the same time need different names.
+            shape (tuple): Its shape.
+            dtype: Its dtype.
+
+        Returns:
+            numpy.ndarray: The buffer (uninitialized).
+        """
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(shape, dtype)
+            self.allocations += 1
+        return buffer
+
+    @property
+    def nbytes(self):
+        """Memory held by the pool."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Release every buffer (e.g. when the frame size changes)."""
+        self._buffers.clear()
+
+
+def scratch(pool, name, shape, dtype):
+    """A temporary array from the pool, or a new one if there is no pool."""
+    if pool is None:
+        return np.empty(shape, dtype)
+    return pool.get(name, shape, dtype)
+
+
+def output_array(out, shape, dtype=np.uint8):
+    """
+    The array a result is written to.
+
+    Args:
+        out (numpy.ndarray): Array supplied by the caller, or None.
+        shape (tuple): Shape of the result.
+        dtype: dtype of the result.
+
+    Returns:
+        numpy.ndarray: `out`, or a new array if it is None.
+
+    Raises:
+        ValueError: If `out` does not have the result's shape and dtype.
+    """
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != tuple(shape) or out.dtype != dtype:
+        raise ValueError(f"out must be a {np.dtype(dtype)} array of shape {tuple(shape)}, "
+                         f"not {out.dtype} {out.shape}")
+    return out
+
+
+def check_gray(image_array):
+    """Raise ValueError unless the array is what the array-native operators take."""
+    if image_array.ndim != 2 or image_array.dtype != np.uint8:
+        raise ValueError(f"Expected a 2-D uint8 array, got {image_array.dtype} "
+                         f"of shape {image_array.shape}")
+
+
+def pad_reflect(image_array, pad, pool=None, name="padded"):
+    """
+    The image with `pad` mirrored pixels on every side, as
+    ``np.pad(image_array, pad, mode="reflect")`` gives, in a pooled buffer.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        pad (int): Pixels added on each side.
+        pool (BufferPool): Supplies the buffer, if given.
+        name (str): Name of the buffer in the pool.
+
+    Returns:
+        numpy.ndarray: The padded array.
+    """
+    height, width = image_array.shape
+    padded = scratch(pool, name, (height + 2 * pad, width + 2 * pad), image_array.dtype)
+    if pad >= min(height, width):
+        # Mirrored more than once; only happens for tiny images
+        padded[...] = np.pad(image_array, pad, mode="reflect")
+        return padded
+
+    padded[pad:pad + height, pad:pad + width] = image_array
+    if pad:
+        padded[pad:pad + height, :pad] = image_array[:, 1:pad + 1][:, ::-1]
+        padded[pad:pad + height, pad + width:] = image_array[:, width - pad - 1:width - 1][:, ::-1]
+        # Whole rows, copied from rows of the same buffer that do not overlap them
+        padded[:pad] = padded[pad + 1:2 * pad + 1][::-1]
+        padded[pad + height:] = padded[height - 1:height + pad - 1][::-1]
+    return padded
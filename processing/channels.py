@@ -0,0 +1,96 @@
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from processing.profiling import conversion_context, current_conversions
+from processing.progress import current_context, progress_context
+from processing.registry import OPERATIONS
+from processing.utils import as_array, like_input
+
+# Threads used to process the channels of one image at the same time; the
+# NumPy kernels release the GIL, so channels really run in parallel
+CHANNEL_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _channel_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CHANNEL_WORKERS,
+                                           thread_name_prefix="channel")
+        return _executor
+
+
+def is_colour(image):
+    """Whether an image has separate RGB(A) channels to process."""
+    if isinstance(image, np.ndarray):
+        return image.ndim == 3 and image.shape[2] in (3, 4)
+    return image.mode in ("RGB", "RGBA")
+
+
+def apply_per_channel(func, image, *args, **kwargs):
+    """
+    Run a single-channel operation on every colour channel of an image.
+
+    The RGB channels are processed concurrently on a thread pool, each under
+    the caller's progress context (progress is reported as the average over
+    the channels) and counting conversions into the caller's profiled call;
+    an alpha channel is passed through unchanged.
+
+    Args:
+        func (callable): Operation taking and returning a 2-D array.
+        image (PIL.Image.Image or numpy.ndarray): RGB or RGBA input.
+        *args, **kwargs: Passed to `func`.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: Result with the input's channels.
+    """
+    pixels = as_array(image)
+    planes = [np.ascontiguousarray(pixels[:, :, c]) for c in range(3)]
+
+    context = current_context()
+    callback, token = context if context is not None else (None, None)
+    conversions = current_conversions()
+    fractions = [0.0] * len(planes)
+    lock = threading.Lock()
+
+    def run(index):
+        def report(fraction):
+            with lock:
+                fractions[index] = fraction
+                total = sum(fractions) / len(fractions)
+            callback(total)
+
+        with progress_context(report if callback is not None else None, token), \
+                conversion_context(conversions):
+            return np.asarray(func(planes[index], *args, **kwargs))
+
+    executor = _channel_executor()
+    results = [future.result() for future in [executor.submit(run, c) for c in range(len(planes))]]
+
+    if pixels.shape[2] == 4:
+        results.append(pixels[:, :, 3].astype(results[0].dtype))
+    result = np.dstack(results)
+    return like_input(result, image, "RGBA" if pixels.shape[2] == 4 else "RGB")
+
+
+def channel_policy(func):
+    """
+    Decorator applying the operation's channel policy from the registry.
+
+    Operations registered with ``channels="per-channel"`` process RGB(A)
+    inputs channel by channel; all others get the input unchanged (and
+    reduce it to luminance themselves).
+    """
+    @functools.wraps(func)
+    def wrapper(image, *args, **kwargs):
+        operation = OPERATIONS.get(func.__name__)
+        if operation is not None and operation.channels == "per-channel" and is_colour(image):
+            return apply_per_channel(func, image, *args, **kwargs)
+        return func(image, *args, **kwargs)
+    return wrapper
@@ -1,31 +1,135 @@
+from functools import lru_cache
+
+import numpy as np
 from PIL import Image
+from processing.buffers import output_array, scratch
+from processing.point_ops import apply_lut_array
+from processing.profiling import count_conversion
+from processing.utils import as_array, cached_plane
+
+
+def grayscale_lut():
+    """
+    What convert_to_grayscale does to an image that is already gray, as a
+    lookup table (the float weights do not sum to exactly 1, so some values
+    drop by one).
+    """
+    levels = np.arange(256, dtype=np.float64)
+    return (0.299 * levels + 0.587 * levels + 0.114 * levels).astype(np.uint8)
+
+
+# Pixels converted per step by convert_to_grayscale_array
+GRAY_BLOCK = 32768
+
+# 1000 times the weights convert_to_grayscale has always used:
+# int(0.299 * r + 0.587 * g + 0.114 * b)
+_WEIGHTS = (299, 587, 114)
+
+
+@lru_cache(maxsize=1)
+def _integer_sum_drops():
+    """
+    Where int() of the float sum is one less than the exact sum.
+
+    When the weighted sum is exactly an integer, the float64 arithmetic lands
+    on it or just below it, depending on the value. Since 114b = -(299r + 587g)
+    (mod 1000) has at most one solution in 0..255, these cases are determined
+    by r and g alone.
+
+    Returns:
+        numpy.ndarray: uint8 array of 65536 entries indexed by r * 256 + g,
+        1 where the integer sum is rounded down.
+    """
+    r, g = (channel.ravel() for channel in np.meshgrid(np.arange(256), np.arange(256), indexing="ij"))
+    target = -(299 * r + 587 * g) % 1000
+    # 114b = target (mod 1000) <=> 57b = target / 2 (mod 500)
+    b = (target // 2) * pow(57, -1, 500) % 500
+    exact = (target % 2 == 0) & (b < 256)
+    value = 0.299 * r + 0.587 * g + 0.114 * b
+    drops = exact & (value.astype(np.int64) < (299 * r + 587 * g + 114 * b) // 1000)
+    return drops.astype(np.uint8)
 
 
 def convert_to_grayscale(image):
     """
-    Convert an image to grayscale using manual computation of pixel values with standard luminance weights.
-    
+    Convert an image to grayscale using the standard luminance weights.
+
+    Each pixel becomes int(0.299 * r + 0.587 * g + 0.114 * b), computed in
+    integer fixed point by convert_to_grayscale_array. Results for PIL images
+    are kept with the image, so converting the same image again is free.
+
     Args:
-        image: PIL Image object to convert to grayscale.
-        
+        image: PIL Image object or uint8 array to convert to grayscale.
+
     Returns:
-        PIL Image: The grayscale version of the input image.
+        PIL Image: The grayscale version of the input image (an array for array input).
     """
-    # Ensure image is in RGB mode
-    if image.mode != "RGB":
+    if isinstance(image, np.ndarray):
+        return convert_to_grayscale_array(image)
+    return cached_plane(image, "convert_to_grayscale", _convert_image)
+
+
+def _convert_image(image):
+    if image.mode not in ("L", "RGB", "RGBA"):
+        count_conversion("mode")
         image = image.convert("RGB")
-    
-    width, height = image.size
-    
-    # Create a new image for the grayscale result
-    grayscale_img = Image.new("L", (width, height))
-    
-    # Process each pixel
-    for x in range(width):
-        for y in range(height):
-            r, g, b = image.getpixel((x, y))
-            # Calculate grayscale value using standard luminance weights
-            gray = int(0.299 * r + 0.587 * g + 0.114 * b)
-            grayscale_img.putpixel((x, y), gray)
-    
-    return grayscale_img
+    return Image.fromarray(convert_to_grayscale_array(as_array(image)))
+
+
+def convert_to_grayscale_array(image_array, out=None, pool=None):
+    """
+    convert_to_grayscale for a uint8 array, written into `out`.
+
+    RGB(A) pixels are converted with integer arithmetic: (299r + 587g +
+    114b) // 1000, minus the drop from _integer_sum_drops() where the sum is
+    exact. The image is converted a block of rows at a time, so the
+    temporaries stay small.
+
+    Args:
+        image_array (numpy.ndarray): 2-D, RGB or RGBA uint8 array.
+        out (numpy.ndarray): 2-D uint8 array for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    if image_array.dtype != np.uint8 or image_array.ndim not in (2, 3) or (
+            image_array.ndim == 3 and image_array.shape[2] < 3):
+        raise ValueError(f"Expected a 2-D, RGB or RGBA uint8 array, got {image_array.dtype} "
+                         f"of shape {image_array.shape}")
+    height, width = image_array.shape[:2]
+    out = output_array(out, (height, width))
+    if image_array.ndim == 2:
+        return apply_lut_array(image_array, grayscale_lut(), out, pool)
+    if out.size == 0:
+        return out
+
+    rows = max(1, GRAY_BLOCK // width)
+    total = scratch(pool, "gray.total", (rows, width), np.uint32)
+    term = scratch(pool, "gray.term", (rows, width), np.uint32)
+    exact = scratch(pool, "gray.exact", (rows, width), bool)
+    key = scratch(pool, "gray.key", (rows, width), np.intp)
+    drop = scratch(pool, "gray.drop", (rows, width), np.uint8)
+    drops = _integer_sum_drops()
+    for start in range(0, height, rows):
+        stop = min(start + rows, height)
+        count = stop - start
+        r, g, b = (image_array[start:stop, :, c] for c in range(3))
+        block_total, block_term = total[:count], term[:count]
+        np.multiply(r, np.uint32(_WEIGHTS[0]), out=block_total)
+        np.multiply(g, np.uint32(_WEIGHTS[1]), out=block_term)
+        block_total += block_term
+        np.multiply(b, np.uint32(_WEIGHTS[2]), out=block_term)
+        block_total += block_term
+        np.floor_divide(block_total, np.uint32(1000), out=block_term)
+        np.copyto(out[start:stop], block_term, casting="unsafe")
+
+        # Where the sum is an integer, int() of the float sum may be one less
+        block_term *= 1000
+        np.equal(block_total, block_term, out=exact[:count])
+        np.left_shift(r, np.intp(8), out=key[:count])
+        np.bitwise_or(key[:count], g, out=key[:count])
+        np.take(drops, key[:count], out=drop[:count], mode="clip")
+        np.bitwise_and(drop[:count], exact[:count], out=drop[:count])
+        np.subtract(out[start:stop], drop[:count], out=out[start:stop])
+    return out
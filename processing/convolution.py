@@ -0,0 +1,213 @@
+from functools import lru_cache
+
+import numpy as np
+from processing.buffers import scratch
+from processing.progress import report_progress
+
+# Kernels at least this wide/tall are convolved in the frequency domain
+FFT_MIN_SIZE = 31
+
+
+@lru_cache(maxsize=64)
+def gaussian_kernel_1d(size, sigma):
+    """
+    Create a normalized 1-D Gaussian kernel.
+
+    Kernels are cached by (size, sigma); the returned array is read-only.
+
+    Args:
+        size (int): Number of taps.
+        sigma (float): Standard deviation of the Gaussian.
+
+    Returns:
+        numpy.ndarray: float64 kernel summing to 1.
+    """
+    x = np.arange(size, dtype=np.float64) - size // 2
+    kernel = np.exp(-(x ** 2) / (2 * sigma ** 2))
+    kernel /= kernel.sum()
+    kernel.setflags(write=False)
+    return kernel
+
+
+@lru_cache(maxsize=64)
+def gaussian_kernel(size, sigma):
+    """
+    Create a normalized 2-D Gaussian kernel.
+
+    Kernels are cached by (size, sigma); the returned array is read-only.
+
+    Args:
+        size (int): Width and height of the kernel.
+        sigma (float): Standard deviation of the Gaussian.
+
+    Returns:
+        numpy.ndarray: float64 kernel summing to 1.
+    """
+    g = gaussian_kernel_1d(size, sigma)
+    kernel = np.outer(g, g)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def separate_kernel(kernel):
+    """
+    Split a rank-1 kernel into a column and a row vector.
+
+    Args:
+        kernel (numpy.ndarray): 2-D kernel.
+
+    Returns:
+        tuple or None: (column, row) such that ``np.outer(column, row)``
+        reproduces the kernel, or None if the kernel is not separable.
+    """
+    kernel = np.asarray(kernel, dtype=np.float64)
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0:
+        return None
+    column = u[:, 0] * np.sqrt(s[0])
+    row = vt[0] * np.sqrt(s[0])
+    if not np.allclose(np.outer(column, row), kernel, rtol=1e-10, atol=1e-12 * s[0]):
+        return None
+    return column, row
+
+
+def _correlate_axis(padded, taps, axis, length, dtype):
+    """Apply 1-D taps along one axis of an already padded array."""
+    shape = list(padded.shape)
+    shape[axis] = length
+    output = np.empty(shape, dtype=dtype)
+    return _correlate_axis_into(padded, taps, axis, output, np.empty_like(output))
+
+
+def _correlate_axis_into(padded, taps, axis, output, term):
+    """_correlate_axis writing into `output`, with `term` as scratch."""
+    dtype = output.dtype.type
+    length = output.shape[axis]
+    first = True
+    for offset, weight in enumerate(taps):
+        if weight == 0:
+            continue
+        # Each tap is a pass over the whole image, so progress (and a
+        # cancel) is checked once per tap
+        report_progress(offset / len(taps))
+        index = [slice(None), slice(None)]
+        index[axis] = slice(offset, offset + length)
+        if first:
+            np.multiply(padded[tuple(index)], dtype(weight), out=output)
+            first = False
+        else:
+            np.multiply(padded[tuple(index)], dtype(weight), out=term)
+            output += term
+    if first:
+        output[...] = 0
+    return output
+
+
+@lru_cache(maxsize=64)
+def gaussian_factors(size, sigma):
+    """
+    Column and row vectors of gaussian_kernel(size, sigma), as convolve()
+    separates it. Cached; the arrays are read-only.
+    """
+    factors = separate_kernel(gaussian_kernel(size, sigma))
+    for factor in factors:
+        factor.setflags(write=False)
+    return factors
+
+
+def correlate_separable(padded, column, row, shape, dtype, pool=None, name="separable"):
+    """
+    Two-pass correlation of an already padded array with a separable kernel,
+    with every array taken from `pool`.
+
+    Args:
+        padded (numpy.ndarray): Input padded by the kernel radius on each side.
+        column (numpy.ndarray): Taps of the vertical pass.
+        row (numpy.ndarray): Taps of the horizontal pass.
+        shape (tuple): (height, width) of the result.
+        dtype: Accumulation dtype.
+        pool (processing.buffers.BufferPool): Supplies the buffers.
+        name (str): Prefix of the buffer names, so that several results can
+            be held at once.
+
+    Returns:
+        numpy.ndarray: The result, a buffer from the pool.
+    """
+    height, width = shape
+    columns = scratch(pool, name + ".columns", (height, padded.shape[1]), dtype)
+    _correlate_axis_into(padded, column, 0, columns,
+                         scratch(pool, name + ".columns_term", columns.shape, dtype))
+    output = scratch(pool, name + ".output", shape, dtype)
+    return _correlate_axis_into(columns, row, 1, output, scratch(pool, name + ".term", shape, dtype))
+
+
+def _correlate_direct(padded, kernel, height, width, dtype):
+    output = np.zeros((height, width), dtype=dtype)
+    kernel_height, kernel_width = kernel.shape
+    for a in range(kernel_height):
+        report_progress(a / kernel_height)
+        for b in range(kernel_width):
+            if kernel[a, b] != 0:
+                output += padded[a:a + height, b:b + width] * dtype(kernel[a, b])
+    return output
+
+
+def _correlate_fft(padded, kernel, height, width):
+    kernel_height, kernel_width = kernel.shape
+    shape = padded.shape
+    report_progress(0.0)
+    # Correlation is convolution with the flipped kernel; the valid part of
+    # the circular result starts at (kernel_height - 1, kernel_width - 1)
+    spectrum = np.fft.rfft2(padded, shape) * np.fft.rfft2(kernel[::-1, ::-1], shape)
+    full = np.fft.irfft2(spectrum, shape)
+    return full[kernel_height - 1:kernel_height - 1 + height,
+                kernel_width - 1:kernel_width - 1 + width]
+
+
+def convolve(image_array, kernel, dtype=None):
+    """
+    Slide a kernel over an image (correlation, reflect padding at the borders).
+
+    Separable kernels run as two 1-D passes, large kernels go through the FFT
+    and everything else is summed from shifted views of the padded image.
+    Integer accumulation always sums shifted views, which is exact.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel (numpy.ndarray): 2-D kernel.
+        dtype: Accumulation dtype, also the dtype of the result (see
+            processing.precision). By default the sums are float64 and the
+            result has the input's dtype.
+
+    Returns:
+        numpy.ndarray: Filtered array with the same shape as the input.
+    """
+    kernel = np.asarray(kernel, dtype=np.float64)
+    kernel_height, kernel_width = kernel.shape
+    image_height, image_width = image_array.shape
+    work = np.float64 if dtype is None else np.dtype(dtype).type
+    integer = np.issubdtype(work, np.integer)
+    if integer and not np.array_equal(kernel, np.round(kernel)):
+        raise ValueError("Integer accumulation needs an integer kernel")
+
+    # Use reflect padding for better edge handling; integer terms are
+    # widened one view at a time instead of padding a widened copy
+    padded = np.pad(image_array if integer else image_array.astype(work, copy=False),
+                    ((kernel_height // 2, kernel_height // 2),
+                     (kernel_width // 2, kernel_width // 2)),
+                    mode="reflect")
+
+    if integer:
+        output = _correlate_direct(padded, kernel, image_height, image_width, work)
+    elif max(kernel_height, kernel_width) >= FFT_MIN_SIZE:
+        output = _correlate_fft(padded, kernel.astype(work), image_height, image_width)
+    else:
+        factors = separate_kernel(kernel)
+        if factors is not None:
+            column, row = factors
+            output = _correlate_axis(padded, column, 0, image_height, work)
+            output = _correlate_axis(output, row, 1, image_width, work)
+        else:
+            output = _correlate_direct(padded, kernel, image_height, image_width, work)
+
+    return output.astype(image_array.dtype if dtype is None else work, copy=False)
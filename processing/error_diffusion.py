@@ -0,0 +1,140 @@
+import numpy as np
+from PIL import Image
+from processing.progress import progress_step, report_progress
+
+# Diffusion kernels as (dx, dy, weight) taps, relative to the current pixel
+DIFFUSION_KERNELS = {
+    "floyd-steinberg": [(1, 0, 7 / 16), (-1, 1, 3 / 16), (0, 1, 5 / 16), (1, 1, 1 / 16)],
+    "jarvis-judice-ninke": [
+        (1, 0, 7 / 48), (2, 0, 5 / 48),
+        (-2, 1, 3 / 48), (-1, 1, 5 / 48), (0, 1, 7 / 48), (1, 1, 5 / 48), (2, 1, 3 / 48),
+        (-2, 2, 1 / 48), (-1, 2, 3 / 48), (0, 2, 5 / 48), (1, 2, 3 / 48), (2, 2, 1 / 48),
+    ],
+    "stucki": [
+        (1, 0, 8 / 42), (2, 0, 4 / 42),
+        (-2, 1, 2 / 42), (-1, 1, 4 / 42), (0, 1, 8 / 42), (1, 1, 4 / 42), (2, 1, 2 / 42),
+        (-2, 2, 1 / 42), (-1, 2, 2 / 42), (0, 2, 4 / 42), (1, 2, 2 / 42), (2, 2, 1 / 42),
+    ],
+    # Atkinson only diffuses 6/8 of the error
+    "atkinson": [
+        (1, 0, 1 / 8), (2, 0, 1 / 8),
+        (-1, 1, 1 / 8), (0, 1, 1 / 8), (1, 1, 1 / 8),
+        (0, 2, 1 / 8),
+    ],
+}
+
+
+def _split_kernel(kernel):
+    """
+    Separate the taps on the current row (which must be applied pixel by
+    pixel) from the taps on the rows below (which can be applied to a whole
+    row at once, once its errors are known).
+    """
+    if kernel not in DIFFUSION_KERNELS:
+        raise ValueError(f"Unknown diffusion kernel: {kernel}")
+    taps = DIFFUSION_KERNELS[kernel]
+
+    in_row = [(dx, weight) for dx, dy, weight in taps if dy == 0]
+    depth = max(dy for _, dy, _ in taps)
+    # A pixel receives error from its sources in the order they are visited,
+    # which is always by descending dx; keep that order so the float sums
+    # come out exactly as in a plain pixel-by-pixel implementation
+    below = [sorted([(dx, weight) for dx, dy, weight in taps if dy == d], reverse=True)
+             for d in range(1, depth + 1)]
+    return in_row, below
+
+
+def _spread(target, errors, dx, weight, width):
+    """Add errors[x] * weight to target[x + dx] for every valid x."""
+    if dx >= 0:
+        target[dx:] += errors[:width - dx] * weight
+    else:
+        target[:width + dx] += errors[-dx:] * weight
+
+
+def error_diffusion(image_array, threshold=128, kernel="floyd-steinberg", serpentine=False):
+    """
+    Binarize a grayscale array with error diffusion.
+
+    Rows are processed one at a time. Only the current row and the rows still
+    receiving error are held as float buffers; the result is returned packed
+    eight pixels per byte, ready for a mode '1' image.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        threshold (int): Pixels (plus diffused error) at or above this become white.
+        kernel (str): One of DIFFUSION_KERNELS.
+        serpentine (bool): Scan every other row right to left.
+
+    Returns:
+        numpy.ndarray: Packed bits of shape (height, ceil(width / 8)).
+    """
+    in_row, below = _split_kernel(kernel)
+    height, width = image_array.shape
+    depth = len(below)
+
+    packed = np.empty((height, (width + 7) // 8), dtype=np.uint8)
+    # buffers[d] holds row y + d: pixel values plus the error diffused so far
+    buffers = [image_array[d].astype(np.float64) if d < height else np.zeros(width)
+               for d in range(depth + 1)]
+    bits = bytearray(width)
+    errors = [0.0] * width
+
+    step = progress_step(height)
+    for y in range(height):
+        if y % step == 0:
+            report_progress(y / height)
+        values = buffers[0].tolist()
+        reverse = serpentine and y % 2 == 1
+        direction = -1 if reverse else 1
+        columns = range(width - 1, -1, -1) if reverse else range(width)
+
+        for x in columns:
+            old_pixel = values[x]
+            if old_pixel >= threshold:
+                bits[x] = 1
+                error = old_pixel - 255
+            else:
+                bits[x] = 0
+                error = old_pixel
+            errors[x] = error
+
+            # Spread the error along the current row
+            for dx, weight in in_row:
+                nx = x + dx * direction
+                if 0 <= nx < width:
+                    values[nx] += error * weight
+
+        packed[y] = np.packbits(np.frombuffer(bits, dtype=np.uint8))
+
+        # Spread the whole row of errors to the rows below in one go
+        row_errors = np.array(errors)
+        for d, taps in enumerate(below, start=1):
+            for dx, weight in taps:
+                _spread(buffers[d], row_errors, dx * direction, weight, width)
+
+        # Slide the buffer window down by one row (past the bottom of the
+        # image the spent buffer is recycled, it is never read again)
+        next_row = y + depth + 1
+        buffers = buffers[1:] + [image_array[next_row].astype(np.float64)
+                                 if next_row < height else buffers[0]]
+
+    return packed
+
+
+def error_diffusion_image(image_array, threshold=128, kernel="floyd-steinberg", serpentine=False):
+    """
+    Error diffuse a grayscale array straight into a mode '1' image.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        threshold (int): Binarization threshold.
+        kernel (str): One of DIFFUSION_KERNELS.
+        serpentine (bool): Scan every other row right to left.
+
+    Returns:
+        PIL.Image.Image: The binary image.
+    """
+    height, width = image_array.shape
+    packed = error_diffusion(image_array, threshold, kernel, serpentine)
+    return Image.frombytes("1", (width, height), packed.tobytes())
@@ -1,125 +1,161 @@
 import numpy as np
-from PIL import Image
+from processing.buffers import check_gray, output_array, pad_reflect, scratch
+from processing.convolution import convolve, correlate_separable, gaussian_factors, gaussian_kernel
+from processing.gradient import correlate3x3
+from processing.rank_filter import median_filter, rank_filter
+from processing.channels import channel_policy
+from processing.precision import accumulator
+from processing.utils import as_array, ensure_grayscale, like_input
 
-def convolve(image_array, kernel):
-    kernel_height, kernel_width = kernel.shape
-    image_height, image_width = image_array.shape
-    output = np.zeros_like(image_array)
-
-    # Use reflect padding for better edge handling
-    padded_image = np.pad(image_array, 
-                         ((kernel_height // 2, kernel_height // 2),
-                          (kernel_width // 2, kernel_width // 2)), 
-                         mode="reflect")
-
-    for i in range(image_height):
-        for j in range(image_width):
-            region = padded_image[i:i + kernel_height, j:j + kernel_width]
-            output[i, j] = np.sum(region * kernel)
-
-    return output
+# High-pass filter mask (Laplacian)
+HIGHPASS_MASK = np.array([[-1, -1, -1],
+                          [-1,  9, -1],
+                          [-1, -1, -1]])
 
+@channel_policy
 def apply_highpass(image):
     """
     Apply a high-pass filter to an image.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
 
     Returns:
-        PIL.Image.Image: The image with high-pass filter applied.
+        PIL.Image.Image or numpy.ndarray: The image with high-pass filter applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
     # Convert to array
-    image_array = np.array(image, dtype=np.float64)
-    
-    # High-pass filter mask (Laplacian)
-    highpass_mask = np.array([[-1, -1, -1],
-                              [-1,  9, -1],
-                              [-1, -1, -1]])
+    image_array = as_array(image)
     
-    # Apply convolution
-    filtered = convolve(image_array, highpass_mask)
+    # Apply convolution (exact in int16 for 8-bit input)
+    filtered = convolve(image_array, HIGHPASS_MASK, accumulator("integer", image_array.dtype))
     filtered = np.clip(filtered, 0, 255).astype(np.uint8)
     
-    return Image.fromarray(filtered)
+    return like_input(filtered, image)
 
-def apply_lowpass(image):
+@channel_policy
+def apply_lowpass(image, size=5, sigma=1.0):
     """
     Apply a low-pass filter to an image.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
+        size (int): The size of the Gaussian kernel.
+        sigma (float): The standard deviation of the Gaussian kernel.
 
     Returns:
-        PIL.Image.Image: The image with low-pass filter applied.
+        PIL.Image.Image or numpy.ndarray: The image with low-pass filter applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-    image_array = np.array(image, dtype=np.float64)
+    image_array = as_array(image)
     
     # Gaussian kernel
-    size = 5
-    sigma = 1.0
-    kernel = np.zeros((size, size), dtype=np.float64)
-    center = size // 2
-    sum_val = 0.0
-    
-    for i in range(size):
-        for j in range(size):
-            x = i - center
-            y = j - center
-            kernel[i, j] = np.exp(-(x**2 + y**2) / (2 * sigma**2))
-            sum_val += kernel[i, j]
-    
-    # Normalize the kernel
-    for i in range(size):
-        for j in range(size):
-            kernel[i, j] /= sum_val
+    kernel = gaussian_kernel(size, sigma)
     
     # Apply convolution
-    filtered = convolve(image_array, kernel)
+    filtered = convolve(image_array, kernel, accumulator("float32"))
     filtered = np.clip(filtered, 0, 255).astype(np.uint8)
     
-    return Image.fromarray(filtered)
+    return like_input(filtered, image)
 
+@channel_policy
 def apply_median(image, size=5):
     """
     Apply a median filter to an image.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
         size (int): The size of the median filter.
 
     Returns:
-        PIL.Image.Image: The image with median filter applied.
+        PIL.Image.Image or numpy.ndarray: The image with median filter applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-    image_array = np.array(image, dtype=np.float64)
+    image_array = as_array(image, np.uint8)
     
-    # Prepare an array for the output
-    filtered = np.zeros_like(image_array)
+    # Histogram-based median, the cost per pixel does not depend on size
+    filtered = median_filter(image_array, size)
     
-    # Apply median filter
-    pad = size // 2
-    padded_image = np.pad(image_array, pad, mode='reflect')
+    return like_input(filtered, image)
+
+@channel_policy
+def apply_percentile(image, size=5, percentile=10):
+    """
+    Apply a rank (percentile) filter to an image.
     
-    for i in range(height):
-        for j in range(width):
-            window = padded_image[i:i + size, j:j + size]
-            median_value = np.median(window)
-            filtered[i, j] = median_value
+    A low percentile behaves like a softened minimum filter, a high one like
+    a softened maximum filter and 50 is the median.
     
-    filtered = np.clip(filtered, 0, 255).astype(np.uint8)
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
+        size (int): The size of the filter window.
+        percentile (float): The percentile (0-100) picked from each window.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The image with the rank filter applied.
+    """
+    # Convert image to grayscale if it isn't already
+    image = ensure_grayscale(image)
+    
+    image_array = as_array(image, np.uint8)
+    filtered = rank_filter(image_array, size, percentile)
     
-    return Image.fromarray(filtered)
\ No newline at end of file
+    return like_input(filtered, image)
+
+
+def apply_highpass_array(image_array, out=None, pool=None):
+    """
+    apply_highpass for a 2-D uint8 array, written into `out`.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the temporaries.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    dtype = accumulator("integer")
+    padded = pad_reflect(image_array, 1, pool, "highpass.padded")
+    filtered = correlate3x3(padded, HIGHPASS_MASK, scratch(pool, "highpass.output", out.shape, dtype),
+                            scratch(pool, "highpass.term", out.shape, dtype))
+    np.clip(filtered, 0, 255, out=filtered)
+    np.copyto(out, filtered, casting="unsafe")
+    return out
+
+
+def apply_lowpass_array(image_array, size=5, sigma=1.0, out=None, pool=None):
+    """
+    apply_lowpass for a 2-D uint8 array, see apply_highpass_array.
+
+    The Gaussian is always applied as two 1-D passes (apply_lowpass switches
+    to the FFT for kernels of FFT_MIN_SIZE and up, which may round differently).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    padded = pad_reflect(image_array, size // 2, pool, "lowpass.padded")
+    column, row = gaussian_factors(size, sigma)
+    filtered = correlate_separable(padded, column, row, out.shape, accumulator("float32"),
+                                   pool, "lowpass")
+    np.clip(filtered, 0, 255, out=filtered)
+    np.copyto(out, filtered, casting="unsafe")
+    return out
+
+
+def apply_median_array(image_array, size=5, out=None, pool=None):
+    """apply_median for a 2-D uint8 array, see apply_highpass_array."""
+    return median_filter(image_array, size, out, pool)
+
+
+def apply_percentile_array(image_array, size=5, percentile=10, out=None, pool=None):
+    """apply_percentile for a 2-D uint8 array, see apply_highpass_array."""
+    return rank_filter(image_array, size, percentile, out, pool)
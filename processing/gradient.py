@@ -0,0 +1,316 @@
+import numpy as np
+from processing.buffers import scratch
+from processing.progress import report_progress
+
+SOBEL_X = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
+SOBEL_Y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+
+PREWITT_X = np.array([[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]])
+PREWITT_Y = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1]])
+
+GRADIENT_KERNELS = {
+    "sobel": (SOBEL_X, SOBEL_Y),
+    "prewitt": (PREWITT_X, PREWITT_Y),
+}
+
+# Kirsch compass masks (8 directions)
+KIRSCH_KERNELS = np.array([
+    [[ 5,  5,  5], [-3,  0, -3], [-3, -3, -3]],  # North
+    [[ 5,  5, -3], [ 5,  0, -3], [-3, -3, -3]],  # North East
+    [[ 5, -3, -3], [ 5,  0, -3], [ 5, -3, -3]],  # East
+    [[-3, -3, -3], [ 5,  0, -3], [ 5,  5, -3]],  # South East
+    [[-3, -3, -3], [-3,  0, -3], [ 5,  5,  5]],  # South
+    [[-3, -3, -3], [-3,  0,  5], [-3,  5,  5]],  # South West
+    [[-3, -3,  5], [-3,  0,  5], [-3, -3,  5]],  # West
+    [[-3,  5,  5], [-3,  0,  5], [-3, -3, -3]],  # North West
+])
+KIRSCH_DIRECTIONS = ["North", "North East", "East", "South East",
+                     "South", "South West", "West", "North West"]
+
+# Positions of the 8 neighbours, clockwise from the top-left corner
+_RING = [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0)]
+
+
+def _shifted_views(image_array):
+    """
+    The 3x3 neighbourhood of every interior pixel as nine shifted views.
+
+    views[k][l] holds the pixel at offset (k - 1, l - 1) for every interior
+    pixel, without copying the image.
+    """
+    height, width = image_array.shape
+    return [[image_array[k:height - 2 + k, l:width - 2 + l] for l in range(3)]
+            for k in range(3)]
+
+
+def _weighted_sum(views, kernel, dtype):
+    output = None
+    for k in range(3):
+        for l in range(3):
+            weight = kernel[k][l]
+            if weight == 0:
+                continue
+            term = views[k][l].astype(dtype) if weight == 1 else views[k][l] * dtype(weight)
+            if output is None:
+                output = term
+            else:
+                output += term
+    return output
+
+
+def correlate3x3(image_array, kernel, output, term):
+    """
+    Correlation of the interior pixels with a 3x3 kernel, written into `output`.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array (at least 3x3).
+        kernel (sequence): 3x3 kernel with at least one non-zero weight.
+        output (numpy.ndarray): Array of shape (height - 2, width - 2); its
+            dtype is the accumulation dtype.
+        term (numpy.ndarray): Scratch array like `output`.
+
+    Returns:
+        numpy.ndarray: `output`.
+    """
+    views = _shifted_views(image_array)
+    weight_type = output.dtype.type
+    first = True
+    for k in range(3):
+        for l in range(3):
+            weight = kernel[k][l]
+            if weight == 0:
+                continue
+            if first:
+                np.multiply(views[k][l], weight_type(weight), out=output)
+                first = False
+            elif weight == 1:
+                np.add(output, views[k][l], out=output)
+            elif weight == -1:
+                np.subtract(output, views[k][l], out=output)
+            else:
+                np.multiply(views[k][l], weight_type(weight), out=term)
+                output += term
+    return output
+
+
+def directional_responses(image_array, kernels, dtype=np.float64):
+    """
+    Responses of several 3x3 kernels, computed from one set of shifted views.
+
+    Like the original operators, the one-pixel image border is left at zero.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernels (sequence): 3x3 kernels, applied as correlations.
+        dtype: Accumulation dtype.
+
+    Returns:
+        numpy.ndarray: Array of shape (len(kernels), height, width).
+    """
+    height, width = image_array.shape
+    responses = np.zeros((len(kernels), height, width), dtype=dtype)
+    if height < 3 or width < 3:
+        return responses
+
+    views = _shifted_views(image_array)
+    for index, kernel in enumerate(kernels):
+        responses[index, 1:-1, 1:-1] = _weighted_sum(views, kernel, dtype)
+    return responses
+
+
+def gradient(image_array, operator="sobel", return_components=False, return_orientation=False,
+             dtype=np.float64):
+    """
+    Gradient magnitude of an image using a pair of x/y kernels.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        operator (str): "sobel" or "prewitt".
+        return_components (bool): Also return the gx and gy planes.
+        return_orientation (bool): Also return the gradient orientation in
+            radians (``arctan2(gy, gx)``).
+        dtype: Accumulation dtype of gx and gy. For an integer dtype the
+            squares are summed in int32 and the magnitude is float32.
+
+    Returns:
+        numpy.ndarray or tuple: The magnitude, followed by gx, gy and/or the
+        orientation when requested.
+    """
+    if operator not in GRADIENT_KERNELS:
+        raise ValueError(f"Unknown gradient operator: {operator}")
+
+    gradient_x, gradient_y = directional_responses(image_array, GRADIENT_KERNELS[operator], dtype)
+    if np.issubdtype(dtype, np.integer):
+        # The sum of squares is exact in int32 and below 2**24, so float32
+        # holds it exactly too
+        squares = np.square(gradient_x, dtype=np.int32)
+        squares += np.square(gradient_y, dtype=np.int32)
+        magnitude = np.sqrt(squares, dtype=np.float32)
+    else:
+        magnitude = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
+
+    result = [magnitude]
+    if return_components:
+        result += [gradient_x, gradient_y]
+    if return_orientation:
+        result.append(np.arctan2(gradient_y, gradient_x))
+    return tuple(result) if len(result) > 1 else magnitude
+
+
+def _kirsch_max(image_array, best, dtype, pool=None, direction=None):
+    """
+    Strongest Kirsch response of every interior pixel, written into `best`.
+
+    Every mask is 5 on three consecutive neighbours and -3 on the other five,
+    so each response is 8 * (sum of three neighbours) - 3 * (sum of all
+    eight). The ring sum is shared by all directions and the three-neighbour
+    sum is rolled around the ring (one pixel added, one removed per
+    direction); only the running maximum is kept.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array, at least 3x3.
+        best (numpy.ndarray): Array of dtype `dtype` and the interior's shape.
+        dtype: Accumulation dtype.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+        direction (numpy.ndarray): If given, uint8 array of the interior's
+            shape receiving the index (into KIRSCH_DIRECTIONS) of the first
+            strongest direction.
+
+    Returns:
+        numpy.ndarray: `best`.
+    """
+    shape = best.shape
+    views = _shifted_views(image_array)
+    ring = [views[k][l] for k, l in _RING]
+    total = scratch(pool, "kirsch.total", shape, dtype)
+    triple = scratch(pool, "kirsch.triple", shape, dtype)
+    response = scratch(pool, "kirsch.response", shape, dtype)
+    stronger = scratch(pool, "kirsch.stronger", shape, bool) if direction is not None else None
+
+    np.add(ring[0], ring[1], out=triple, dtype=dtype)
+    triple += ring[2]
+    np.add(triple, ring[3], out=total)
+    for value in ring[4:]:
+        total += value
+    total *= 3
+
+    for index in range(8):
+        report_progress(index / 8)
+        # Direction `index` weights the neighbours start..start + 2 of the ring
+        start = -index % 8
+        if index:
+            triple -= ring[(start + 3) % 8]
+            triple += ring[start]
+        np.multiply(triple, dtype(8), out=response)
+        response -= total
+        if not index:
+            np.copyto(best, response)
+            if direction is not None:
+                direction[...] = 0
+            continue
+        if direction is not None:
+            np.greater(response, best, out=stronger)
+            direction[stronger] = index
+        np.maximum(best, response, out=best)
+    return best
+
+
+def kirsch_compass(image_array, return_direction=False, dtype=np.float64):
+    """
+    Strongest Kirsch response of every pixel (never below zero).
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        return_direction (bool): Also return the index (into
+            KIRSCH_DIRECTIONS) of the strongest direction.
+        dtype: Accumulation dtype (responses of 8-bit input fit in int16).
+
+    Returns:
+        numpy.ndarray or tuple: The magnitude (zero on the one-pixel border),
+        and the uint8 direction map when requested.
+    """
+    height, width = image_array.shape
+    magnitude = np.zeros((height, width), dtype=dtype)
+    direction = np.zeros((height, width), dtype=np.uint8) if return_direction else None
+    if height >= 3 and width >= 3:
+        _kirsch_max(image_array, magnitude[1:-1, 1:-1], dtype,
+                    direction=None if direction is None else direction[1:-1, 1:-1])
+        np.maximum(magnitude, 0, out=magnitude)
+    if return_direction:
+        return magnitude, direction
+    return magnitude
+
+
+def gradient_magnitude_into(image_array, operator, out, dtype, pool=None):
+    """
+    gradient() clipped to 0..255, written into a uint8 array.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        operator (str): "sobel" or "prewitt".
+        out (numpy.ndarray): uint8 array of the image's shape.
+        dtype: Accumulation dtype, as for gradient().
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: `out`.
+    """
+    if operator not in GRADIENT_KERNELS:
+        raise ValueError(f"Unknown gradient operator: {operator}")
+    if not _clear_border(out):
+        return out
+
+    shape = (out.shape[0] - 2, out.shape[1] - 2)
+    kernel_x, kernel_y = GRADIENT_KERNELS[operator]
+    term = scratch(pool, "gradient.term", shape, dtype)
+    gradient_x = correlate3x3(image_array, kernel_x, scratch(pool, "gradient.x", shape, dtype), term)
+    gradient_y = correlate3x3(image_array, kernel_y, scratch(pool, "gradient.y", shape, dtype), term)
+    if np.issubdtype(dtype, np.integer):
+        squares = scratch(pool, "gradient.squares", shape, np.int32)
+        square_y = scratch(pool, "gradient.square_y", shape, np.int32)
+        np.multiply(gradient_x, gradient_x, out=squares, dtype=np.int32)
+        np.multiply(gradient_y, gradient_y, out=square_y, dtype=np.int32)
+        squares += square_y
+        magnitude = scratch(pool, "gradient.magnitude", shape, np.float32)
+        np.sqrt(squares, out=magnitude, dtype=np.float32)
+    else:
+        np.multiply(gradient_x, gradient_x, out=gradient_x)
+        np.multiply(gradient_y, gradient_y, out=gradient_y)
+        gradient_x += gradient_y
+        magnitude = np.sqrt(gradient_x, out=gradient_x)
+    np.minimum(magnitude, 255, out=magnitude)
+    np.copyto(out[1:-1, 1:-1], magnitude, casting="unsafe")
+    return out
+
+
+def kirsch_compass_into(image_array, out, dtype, pool=None):
+    """
+    kirsch_compass() clipped to 0..255, written into a uint8 array.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        out (numpy.ndarray): uint8 array of the image's shape.
+        dtype: Accumulation dtype.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: `out`.
+    """
+    if not _clear_border(out):
+        return out
+
+    best = scratch(pool, "kirsch.best", (out.shape[0] - 2, out.shape[1] - 2), dtype)
+    _kirsch_max(image_array, best, dtype, pool)
+    np.clip(best, 0, 255, out=best)
+    np.copyto(out[1:-1, 1:-1], best, casting="unsafe")
+    return out
+
+
+def _clear_border(out):
+    """Zero the one-pixel border of `out`; False if there is no interior."""
+    if out.shape[0] < 3 or out.shape[1] < 3:
+        out[...] = 0
+        return False
+    out[0] = out[-1] = 0
+    out[:, 0] = out[:, -1] = 0
+    return True
@@ -1,83 +1,107 @@
-from PIL import Image
+import logging
+
+import numpy as np
+from processing.buffers import check_gray, output_array
+from processing.error_diffusion import error_diffusion, error_diffusion_image
+from processing.point_ops import apply_lut, apply_lut_array, threshold_lut
+from processing.utils import as_array, ensure_grayscale
+
+logger = logging.getLogger(__name__)
 
 def simple_halftone(image):
     """
     Apply a simple halftone effect using threshold-based binarization.
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
 
     Returns:
-        PIL.Image.Image: The halftone image.
+        PIL.Image.Image or numpy.ndarray: The halftone image.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-
     # Calculate a threshold based on the average intensity
-    pixel_values = [image.getpixel((x, y)) for x in range(width) for y in range(height)]
-    threshold = sum(pixel_values) // len(pixel_values)
+    img_array = as_array(image)
+    threshold = int(img_array.sum(dtype=np.int64)) // img_array.size
     print(f"Threshold for halftone: {threshold}")
 
-    # Create a new image for the halftone result
-    halftone_img = Image.new("1", (width, height))  # '1' mode for binary images
-
-    # Apply threshold-based halftoning
-    for x in range(width):
-        for y in range(height):
-            gray = image.getpixel((x, y))
-            value = 255 if gray > threshold else 0
-            halftone_img.putpixel((x, y), value)
+    # Binary arrays are returned as booleans, like a mode '1' image converts to
+    if isinstance(image, np.ndarray):
+        return img_array > threshold
 
-    return halftone_img
+    # Apply threshold-based halftoning straight into a '1' mode image
+    return apply_lut(image, threshold_lut(threshold), mode="1")
 
 
-def error_diffusion_halftoning(image, threshold=128):
+def error_diffusion_halftoning(image, threshold=128, kernel="floyd-steinberg", serpentine=False):
     """
-    Apply an advanced halftone effect using Floyd-Steinberg error diffusion.
+    Apply an advanced halftone effect using error diffusion.
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
         threshold (int): The threshold value for binarization.
+        kernel (str): The diffusion kernel: "floyd-steinberg", "jarvis-judice-ninke",
+            "stucki" or "atkinson".
+        serpentine (bool): Alternate the scan direction on every row.
 
     Returns:
-        PIL.Image.Image: The halftone image.
+        PIL.Image.Image or numpy.ndarray: The halftone image.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
+
+    img_array = as_array(image)
+    if isinstance(image, np.ndarray):
+        packed = error_diffusion(img_array, threshold, kernel, serpentine)
+        return np.unpackbits(packed, axis=1, count=img_array.shape[1]).astype(bool)
+
+    # Diffuse row by row and write the packed result into a mode '1' image
+    return error_diffusion_image(img_array, threshold, kernel, serpentine)
+
+
+def simple_halftone_array(image_array, out=None, pool=None):
+    """
+    simple_halftone for a 2-D uint8 array, written into `out`.
 
-    width, height = image.size
+    The result is 0 or 255 per pixel, like the mode '1' image converted to
+    'L'. The threshold is logged at debug level instead of printed.
 
-    # Convert image to a list of lists for manipulation
-    img_array = [[image.getpixel((x, y)) for x in range(width)] for y in range(height)]
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
 
-    # Create a binary array for the halftone result
-    halftone_array = [[0 for _ in range(width)] for _ in range(height)]
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    threshold = int(image_array.sum(dtype=np.int64)) // image_array.size
+    logger.debug("Threshold for halftone: %d", threshold)
+    return apply_lut_array(image_array, threshold_lut(threshold), out, pool)
 
-    # Floyd-Steinberg error diffusion kernel
-    diffusion_kernel = [(1, 0, 7 / 16), (-1, 1, 3 / 16), (0, 1, 5 / 16), (1, 1, 1 / 16)]
 
-    # Apply error diffusion
-    for y in range(height):
-        for x in range(width):
-            old_pixel = img_array[y][x]
-            new_pixel = 255 if old_pixel >= threshold else 0
-            halftone_array[y][x] = new_pixel
-            error = old_pixel - new_pixel
+def error_diffusion_halftoning_array(image_array, threshold=128, kernel="floyd-steinberg", serpentine=False,
+                                     out=None, pool=None):
+    """
+    error_diffusion_halftoning for a 2-D uint8 array, written into `out` as 0 or 255.
 
-            # Spread the error to neighboring pixels
-            for dx, dy, weight in diffusion_kernel:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < width and 0 <= ny < height:
-                    img_array[ny][nx] += error * weight
+    The diffusion itself runs pixel by pixel and keeps its own row buffers,
+    so unlike the other variants it still allocates while it runs.
 
-    # Create a new image for the halftone result
-    halftone_img = Image.new("1", (width, height))
-    for y in range(height):
-        for x in range(width):
-            halftone_img.putpixel((x, y), halftone_array[y][x])
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        threshold, kernel, serpentine: As for error_diffusion_halftoning.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Unused, accepted like the other variants.
 
-    return halftone_img
\ No newline at end of file
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    packed = error_diffusion(image_array, threshold, kernel, serpentine)
+    for y in range(out.shape[0]):
+        out[y] = np.unpackbits(packed[y], count=out.shape[1])
+    out *= 255
+    return out
@@ -1,36 +1,156 @@
+import numpy as np
 from PIL import Image
-import matplotlib.pyplot as plt
+from processing.profiling import count_conversion
+from processing.point_ops import apply_lut, equalization_lut
+from processing.utils import as_array, cached_plane, ensure_grayscale
+
+def count_values(image):
+    """
+    Count the pixels of every value in every channel, without memoizing.
+    
+    8-bit L, RGB and RGBA data is counted by PIL in C, several times faster
+    than np.bincount.
+    
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image (8 bits per channel).
+    
+    Returns:
+        numpy.ndarray: int64 array of shape (channels, 256).
+    """
+    if not isinstance(image, np.ndarray):
+        if image.mode in ('L', 'RGB', 'RGBA'):
+            return np.array(image.histogram(), dtype=np.int64).reshape(-1, 256)
+        image = as_array(image)
+    
+    bands = 1 if image.ndim == 2 else image.shape[2]
+    if image.dtype == np.uint8 and bands == 1 and image.flags.c_contiguous:
+        # Wraps the array's memory instead of copying it
+        counts = Image.frombuffer("L", image.shape[::-1], image, "raw", "L", 0, 1).histogram()
+        return np.array(counts, dtype=np.int64).reshape(1, 256)
+    if image.dtype == np.uint8 and bands in (1, 3, 4):
+        counts = Image.fromarray(np.ascontiguousarray(image)).histogram()
+        return np.array(counts, dtype=np.int64).reshape(bands, 256)
+    pixels = image.reshape(image.shape[0] * image.shape[1], -1)
+    return np.stack([np.bincount(pixels[:, c], minlength=256) for c in range(bands)]).astype(np.int64)
+
+def _count_channels(image):
+    if image.mode == '1':
+        count_conversion("mode")
+        image = image.convert('L')
+    counts = count_values(image)
+    counts.setflags(write=False)
+    return counts
+
+def channel_histograms(image):
+    """
+    Count the pixels of every value in every channel of an image.
+    
+    Results for PIL images are kept with the image object (see
+    cached_plane), so equalization, segmentation and the histogram view
+    share one count per image; arrays are counted on every call.
+    
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image (8 bits per channel).
+    
+    Returns:
+        numpy.ndarray: Read-only int64 array of shape (channels, 256).
+    """
+    if isinstance(image, np.ndarray):
+        counts = count_values(image)
+        counts.setflags(write=False)
+        return counts
+    return cached_plane(image, "histogram", _count_channels)
 
 def calculate_histogram(image):
     """
     Calculate the histogram of a grayscale image.
     
+    Images in other modes are converted to grayscale first.
+    
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+    
+    Returns:
+        numpy.ndarray: Histogram values (frequency of each grayscale value),
+        read-only and shared with other callers.
+    """
+    # The grayscale plane of a PIL image is shared, and so is its histogram
+    return channel_histograms(ensure_grayscale(image))[0]
+
+def cumulative_histogram(image):
+    """
+    Cumulative histogram (unnormalized CDF) of a grayscale image.
+    
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input image.
     
     Returns:
-        list: Histogram values (frequency of each grayscale value).
+        numpy.ndarray: int64 array of 256 running totals.
     """
-    width, height = image.size
+    return np.cumsum(calculate_histogram(image))
 
-    # Initialize a list to count frequencies of each intensity (0-255)
-    histogram = [0] * 256
+def normalized_histogram(image):
+    """
+    Histogram of a grayscale image scaled to sum to 1.
+    
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+    
+    Returns:
+        numpy.ndarray: float64 array of 256 pixel fractions.
+    """
+    histogram = calculate_histogram(image)
+    return histogram / histogram.sum()
 
-    # Count pixel intensities
-    for x in range(width):
-        for y in range(height):
-            gray = image.getpixel((x, y))
-            histogram[gray] += 1
+def histogram_mean(histogram):
+    """
+    Average pixel value (rounded down) from a histogram, without touching the image.
+    
+    Args:
+        histogram (sequence): 256 pixel counts.
+    
+    Returns:
+        int: The mean intensity.
+    """
+    histogram = np.asarray(histogram, dtype=np.int64)
+    return int(np.dot(np.arange(256), histogram)) // int(histogram.sum())
 
-    return histogram
+def export_histogram(image, path):
+    """
+    Save a plot of the histogram of an image (PNG, SVG, PDF, ...).
+    
+    matplotlib is only imported here, so it is not needed to use or display
+    histograms otherwise.
+    
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+        path (str): Output file; the format follows its extension.
+    """
+    from matplotlib.figure import Figure
+    
+    histogram = calculate_histogram(image)
+    
+    figure = Figure(figsize=(10, 5))
+    axes = figure.add_subplot()
+    axes.bar(range(256), histogram, color="gray")
+    axes.set_title("Image Histogram")
+    axes.set_xlabel("Grayscale Value")
+    axes.set_ylabel("Frequency")
+    axes.grid(axis="y")
+    figure.tight_layout()
+    figure.savefig(path)
 
 def show_histogram(image):
     """
-    Calculate and plot the histogram of a grayscale image.
+    Calculate and plot the histogram of a grayscale image in a matplotlib window.
+    
+    The app draws histograms itself; this is for use from scripts.
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
     """
+    import matplotlib.pyplot as plt
+    
     histogram = calculate_histogram(image)
     
     plt.figure(figsize=(10, 5))
@@ -47,42 +167,16 @@ def histogram_equalization(image):
     Perform histogram equalization on a grayscale image.
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
     
     Returns:
-        PIL.Image.Image: The histogram-equalized image.
+        PIL.Image.Image or numpy.ndarray: The histogram-equalized image.
     """
     # Convert the image to grayscale if not already
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-
     # Calculate the histogram
     histogram = calculate_histogram(image)
 
-    # Calculate the cumulative distribution function (CDF)
-    cdf = [0] * 256
-    cdf[0] = histogram[0]
-    for i in range(1, 256):
-        cdf[i] = cdf[i - 1] + histogram[i]
-
-    # Normalize the CDF to create a lookup table for pixel intensity mapping:
-    # 1. (cdf[i] - cdf_min): Shifts CDF values to start from 0
-    # 2. * 255: Scales to full pixel intensity range (0-255)
-    # 3. // (cdf_max - cdf_min): Normalizes by the CDF range
-    # This creates a mapping where index = input pixel value, value = equalized output pixel value
-    cdf_min = min(cdf)
-    cdf_max = max(cdf)
-    cdf_normalized = [(cdf[i] - cdf_min) * 255 // (cdf_max - cdf_min) for i in range(256)]
-
-    # Create a new image for the equalized result
-    equalized_img = Image.new("L", (width, height))
-
-    # Apply the equalized histogram to the image
-    for x in range(width):
-        for y in range(height):
-            gray = image.getpixel((x, y))
-            equalized_img.putpixel((x, y), cdf_normalized[gray])
-
-    return equalized_img
\ No newline at end of file
+    # Map every pixel through the equalization lookup table in one pass
+    return apply_lut(image, equalization_lut(histogram))
@@ -1,149 +1,175 @@
 import numpy as np
-from PIL import Image
-
-def calculate_histogram(image):
-    """
-    Calculate the histogram of a grayscale image.
-    
-    Args:
-        image (PIL.Image.Image): The input grayscale image.
-    
-    Returns:
-        list: Histogram values (frequency of each grayscale value).
-    """
-    width, height = image.size
-    histogram = [0] * 256
-
-    for x in range(width):
-        for y in range(height):
-            gray = image.getpixel((x, y))
-            histogram[gray] += 1
-
-    return histogram
+from processing.buffers import check_gray, output_array, scratch
+from processing.histogram import calculate_histogram
+from processing.histogram_thresholding import peak_lut, valley_lut
+from processing.local_statistics import window_sum_stripes
+from processing.point_ops import apply_lut, threshold_lut
+from processing.utils import as_array, ensure_grayscale, like_input
 
 def manual_segmentation(image, threshold):
     """
     Segment the image using a manual threshold.
     
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
         threshold (int): The threshold value for segmentation.
     
     Returns:
-        PIL.Image.Image: The segmented image.
+        PIL.Image.Image or numpy.ndarray: The segmented image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    width, height = image.size
-    img_array = np.array(image, dtype=np.uint8)
-    segmented = np.zeros_like(img_array)
-
-    for x in range(width):
-        for y in range(height):
-            if img_array[y, x] > threshold:
-                segmented[y, x] = 255
-            else:
-                segmented[y, x] = 0
-
-    return Image.fromarray(segmented)
+    return apply_lut(image, threshold_lut(threshold))
 
-def peak_segmentation(image):
+def peak_segmentation(image, sigma=2.0):
     """
     Segment the image using peak detection.
     
+    The threshold lies halfway between the two highest peaks of the smoothed
+    histogram.
+    
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        sigma (float): Histogram smoothing in bins (0 for none).
     
     Returns:
-        PIL.Image.Image: The segmented image.
+        PIL.Image.Image or numpy.ndarray: The segmented image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    histogram = calculate_histogram(image)
-    peaks = []
+    return apply_lut(image, peak_lut(calculate_histogram(image), sigma))
 
-    # find peaks
-    for i in range(1, 255):
-        if histogram[i-1] < histogram[i] > histogram[i+1]:
-            peaks.append(i)
-    
-    # avg image intensity if peaks less than two
-    if len(peaks) < 2:
-        threshold = sum(sum(image.getpixel((x, y)) for x in range(image.width)) for y in range(image.height)) // (image.width * image.height)
-    else:
-        peaks.sort(key=lambda x: histogram[x], reverse=True)
-        peak1, peak2 = sorted(peaks[:2])
-        threshold = (peak1 + peak2) // 2
-    
-    return manual_segmentation(image, threshold)
-
-def valley_segmentation(image):
+def valley_segmentation(image, sigma=2.0):
     """
     Segment the image using valley detection.
     
+    The threshold is the deepest point of the smoothed histogram between its
+    two highest peaks.
+    
     Args:
-        image (PIL.Image.Image): The input grayscale image.
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        sigma (float): Histogram smoothing in bins (0 for none).
     
     Returns:
-        PIL.Image.Image: The segmented image.
+        PIL.Image.Image or numpy.ndarray: The segmented image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
+    image = ensure_grayscale(image)
     
-    histogram = calculate_histogram(image)
-    valleys = []
+    return apply_lut(image, valley_lut(calculate_histogram(image), sigma))
 
-    # find valleys
-    for i in range(1, 255):
-        if histogram[i-1] > histogram[i] < histogram[i+1]:
-            valleys.append(i)
-    
-    # use the deepest valley as threshold
-    if not valleys:
-        threshold = sum(sum(image.getpixel((x, y)) for x in range(image.width)) for y in range(image.height)) // (image.width * image.height)
-    else:
-        threshold = min(valleys, key=lambda x: histogram[x])
-    
-    return manual_segmentation(image, threshold)
+ADAPTIVE_METHODS = ("mean", "niblack", "sauvola")
+
+def adaptive_threshold(image, window_size=25, method="sauvola", c=0.0, k=0.2, r=128.0):
+    """
+    Segment the image with a threshold computed from a sliding window around
+    every pixel.
+
+    The local mean m and standard deviation s come from window sums of the
+    image and of its square, so the cost per pixel is the same for any
+    window size. Thresholds:
+
+    - "mean":    T = m - c
+    - "niblack": T = m - k * s
+    - "sauvola": T = m * (1 + k * (s / r - 1))
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        window_size (int): Width and height of the window (odd sizes center it).
+        method (str): One of "mean", "niblack" or "sauvola".
+        c (float): Offset subtracted from the mean ("mean" method).
+        k (float): Weight of the standard deviation ("niblack" and "sauvola").
+        r (float): Dynamic range of the standard deviation ("sauvola").
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The segmented image, 255 where a
+        pixel is brighter than its threshold and 0 elsewhere.
+    """
+    if method not in ADAPTIVE_METHODS:
+        raise ValueError(f"Unknown adaptive threshold method {method!r}, expected one of {ADAPTIVE_METHODS}")
+    image = ensure_grayscale(image)
+
+    img_array = as_array(image, np.uint8)
+    result = _adaptive_threshold_into(img_array, window_size, method, c, k, r, np.empty_like(img_array))
+    return like_input(result, image)
+
+def _adaptive_threshold_into(img_array, window_size, method, c, k, r, result, pool=None):
+    """adaptive_threshold of a uint8 array, written into `result`."""
+    width = img_array.shape[1]
+    n = window_size * window_size
+    # float32 holds the window sums exactly up to 256x256 windows
+    dtype = np.float32 if window_size <= 256 else np.float64
+    stripes = window_sum_stripes(img_array, window_size, squares=method != "mean", pool=pool)
+
+    for y0, y1, sums, sq_sums in stripes:
+        shape = (y1 - y0, width)
+        pixels = scratch(pool, "adaptive.pixels", shape, dtype)
+        np.copyto(pixels, img_array[y0:y1])
+        threshold = scratch(pool, "adaptive.threshold", shape, dtype)
+        np.copyto(threshold, sums, casting="unsafe")
+        if method == "mean":
+            # pixel > sums / n - c, without dividing every sum
+            pixels *= n
+            threshold -= dtype(n * c)
+        else:
+            mean = threshold
+            mean *= dtype(1.0 / n)
+            std = scratch(pool, "adaptive.std", shape, dtype)
+            np.copyto(std, sq_sums, casting="unsafe")
+            std *= dtype(1.0 / n)
+            square = scratch(pool, "adaptive.square", shape, dtype)
+            std -= np.multiply(mean, mean, out=square)
+            np.maximum(std, 0, out=std)
+            np.sqrt(std, out=std)
+            if method == "niblack":
+                std *= dtype(k)
+                np.subtract(mean, std, out=threshold)
+            else:
+                std *= dtype(k / r)
+                std += dtype(1.0 - k)
+                np.multiply(mean, std, out=threshold)
+
+        np.greater(pixels, threshold, out=result[y0:y1])
+        result[y0:y1] *= 255
+
+    return result
+
+def adaptive_threshold_array(image_array, window_size=25, method="sauvola", c=0.0, k=0.2, r=128.0,
+                             out=None, pool=None):
+    """
+    adaptive_threshold for a 2-D uint8 array, written into `out`.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        window_size, method, c, k, r: As for adaptive_threshold.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the stripe arrays.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    if method not in ADAPTIVE_METHODS:
+        raise ValueError(f"Unknown adaptive threshold method {method!r}, expected one of {ADAPTIVE_METHODS}")
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return _adaptive_threshold_into(image_array, window_size, method, c, k, r, out, pool)
 
 def adaptive_segmentation(image, block_size=16):
     """
     Segment the image using adaptive thresholding.
-    
+
+    Each pixel is compared with the mean of the block_size x block_size
+    window centered on it, so the threshold changes smoothly across the image.
+
     Args:
-        image (PIL.Image.Image): The input grayscale image.
-        block_size (int): The size of the blocks for local thresholding.
-    
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        block_size (int): The size of the window for local thresholding.
+
     Returns:
-        PIL.Image.Image: The segmented image.
+        PIL.Image.Image or numpy.ndarray: The segmented image.
     """
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.uint8)
-    result = np.zeros_like(img_array)
-
-    # Ensure block_size is not larger than image dimensions
-    block_size = min(block_size, width, height)
-
-    for i in range(0, height, block_size):
-        for j in range(0, width, block_size):
-            # Calculate block boundaries
-            block_end_i = min(i + block_size, height)
-            block_end_j = min(j + block_size, width)
-            
-            # Extract current block
-            block = img_array[i:block_end_i, j:block_end_j]
-            
-            # Calculate mean threshold for the block
-            threshold = np.mean(block)
-            
-            # Apply thresholding to the block
-            mask = block > threshold
-            result[i:block_end_i, j:block_end_j][mask] = 255
-            result[i:block_end_i, j:block_end_j][~mask] = 0
-    
-    return Image.fromarray(result)
\ No newline at end of file
+    return adaptive_threshold(image, window_size=block_size, method="mean")
+
+def adaptive_segmentation_array(image_array, block_size=16, out=None, pool=None):
+    """adaptive_segmentation for a 2-D uint8 array, see adaptive_threshold_array."""
+    return adaptive_threshold_array(image_array, window_size=block_size, method="mean", out=out, pool=pool)
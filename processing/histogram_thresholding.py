@@ -0,0 +1,298 @@
+"""
+Global thresholds computed from the 256-bin histogram alone.
+
+Every threshold here only looks at the histogram, which is memoized per
+image, so choosing it costs the same for any image size. Applying it is one
+lookup-table pass. A threshold t splits the values into 0..t and t+1..255,
+the same as manual_segmentation.
+"""
+import numpy as np
+from processing.histogram import calculate_histogram, histogram_mean
+from processing.point_ops import apply_lut
+from processing.utils import ensure_grayscale
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+# Ways to turn thresholds into an image: "binary" (0/255, one threshold only),
+# "labels" (class index 0..k-1) or "levels" (k evenly spaced gray levels)
+OUTPUTS = ("binary", "labels", "levels")
+
+
+def otsu_threshold(histogram):
+    """
+    Otsu's threshold: the split with the largest between-class variance.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+
+    Returns:
+        int: The threshold; the histogram mean if there is nothing to split.
+    """
+    p = np.asarray(histogram, dtype=np.float64)
+    p = p / p.sum()
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * _LEVELS)
+    mu_total = mu[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu_total * omega - mu) ** 2 / (omega * (1.0 - omega))
+    between[~((omega > 0) & (omega < 1))] = -np.inf
+    if not np.isfinite(between).any():
+        return histogram_mean(histogram)
+    return int(np.argmax(between))
+
+
+def multi_otsu_thresholds(histogram, classes=3):
+    """
+    Multi-level Otsu: the classes - 1 thresholds with the largest
+    between-class variance.
+
+    Found exactly by dynamic programming over the class boundaries, in
+    O(classes * 256**2) whatever the image size.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+        classes (int): Number of classes (2 gives Otsu's threshold).
+
+    Returns:
+        list: classes - 1 increasing thresholds.
+
+    Raises:
+        ValueError: If the image has fewer distinct values than classes.
+    """
+    counts = np.asarray(histogram, dtype=np.float64)
+    if classes < 2:
+        raise ValueError("Multi-level Otsu needs at least 2 classes")
+    if np.count_nonzero(counts) < classes:
+        raise ValueError(f"The image has fewer than {classes} distinct values")
+
+    # Bins a..b-1 form a class; its share of the between-class variance is
+    # (sum of values)**2 / (pixel count), up to constant terms
+    weight = np.concatenate([[0.0], np.cumsum(counts)])
+    moment = np.concatenate([[0.0], np.cumsum(counts * _LEVELS)])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = weight[None, :] - weight[:, None]
+        score = (moment[None, :] - moment[:, None]) ** 2 / w
+    score[~(w > 0)] = -np.inf
+
+    best = score[0]
+    choices = []
+    for _ in range(classes - 1):
+        candidates = best[:, None] + score
+        choices.append(np.argmax(candidates, axis=0))
+        best = candidates[choices[-1], np.arange(257)]
+
+    boundaries = []
+    end = 256
+    for choice in reversed(choices):
+        end = int(choice[end])
+        boundaries.append(end)
+    return [b - 1 for b in reversed(boundaries)]
+
+
+def kapur_threshold(histogram):
+    """
+    Kapur's threshold: the split that maximizes the summed entropy of the
+    background and foreground histograms.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+
+    Returns:
+        int: The threshold; the histogram mean if there is nothing to split.
+    """
+    p = np.asarray(histogram, dtype=np.float64)
+    p = p / p.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plogp = np.where(p > 0, p * np.log(p), 0.0)
+        P = np.cumsum(p)
+        E = np.cumsum(plogp)
+        # Entropy of p_i / P over a class is log(P) - sum(p_i log p_i) / P
+        background = np.log(P) - E / P
+        foreground = np.log(1.0 - P) - (E[-1] - E) / (1.0 - P)
+        total = background + foreground
+    total[~((P > 0) & (P < 1))] = -np.inf
+    if not np.isfinite(total).any():
+        return histogram_mean(histogram)
+    return int(np.argmax(total))
+
+
+def smooth_histogram(histogram, sigma=2.0):
+    """
+    Gaussian-smoothed histogram, so noise does not create extra peaks and valleys.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+        sigma (float): Standard deviation of the Gaussian in bins; 0 leaves
+            the histogram unchanged.
+
+    Returns:
+        numpy.ndarray: float64 array of 256 smoothed counts.
+    """
+    counts = np.asarray(histogram, dtype=np.float64)
+    if sigma <= 0:
+        return counts.copy()
+    radius = max(1, int(3 * sigma + 0.5))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    padded = np.pad(counts, radius, mode="reflect")
+    return np.convolve(padded, kernel, mode="valid")
+
+
+def _main_peaks(smoothed):
+    """The two highest local maxima of a smoothed histogram, in value order."""
+    # >= on the left so a flat-topped peak is counted once
+    is_peak = (smoothed[1:-1] >= smoothed[:-2]) & (smoothed[1:-1] > smoothed[2:])
+    peaks = np.flatnonzero(is_peak) + 1
+    if len(peaks) < 2:
+        return None
+    highest = peaks[np.argsort(smoothed[peaks], kind="stable")[::-1][:2]]
+    return sorted(int(p) for p in highest)
+
+
+def peak_threshold(histogram, sigma=2.0):
+    """
+    Threshold halfway between the two highest peaks of the smoothed histogram.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+        sigma (float): Smoothing, see smooth_histogram.
+
+    Returns:
+        int: The threshold; the histogram mean if there are fewer than two peaks.
+    """
+    peaks = _main_peaks(smooth_histogram(histogram, sigma))
+    if peaks is None:
+        return histogram_mean(histogram)
+    return (peaks[0] + peaks[1]) // 2
+
+
+def valley_threshold(histogram, sigma=2.0):
+    """
+    Threshold at the deepest point of the smoothed histogram between its two
+    highest peaks.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+        sigma (float): Smoothing, see smooth_histogram.
+
+    Returns:
+        int: The threshold; the histogram mean if there are fewer than two peaks.
+    """
+    smoothed = smooth_histogram(histogram, sigma)
+    peaks = _main_peaks(smoothed)
+    if peaks is None:
+        return histogram_mean(histogram)
+    return peaks[0] + int(np.argmin(smoothed[peaks[0]:peaks[1] + 1]))
+
+
+def thresholds_lut(thresholds, output="binary"):
+    """
+    Lookup table that classifies values by one or more thresholds.
+
+    Args:
+        thresholds (sequence): Increasing thresholds; a value belongs to the
+            class of the number of thresholds it is above.
+        output (str): "binary" (0/255, one threshold only), "labels" (class
+            index) or "levels" (class spread evenly over 0..255).
+
+    Returns:
+        numpy.ndarray: uint8 lookup table.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output {output!r}, expected one of {OUTPUTS}")
+    thresholds = np.asarray(thresholds, dtype=np.int64).reshape(-1)
+    if output == "binary" and len(thresholds) != 1:
+        raise ValueError("Binary output needs exactly one threshold")
+
+    labels = np.searchsorted(thresholds, np.arange(256), side="left")
+    if output == "labels":
+        return labels.astype(np.uint8)
+    return (labels * 255 // len(thresholds)).astype(np.uint8)
+
+
+def apply_thresholds(image, thresholds, output="binary"):
+    """
+    Segment a grayscale image by thresholds in one lookup pass.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+        thresholds (int or sequence): One threshold or several increasing ones.
+        output (str): See thresholds_lut.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The binary mask or label image.
+    """
+    return apply_lut(ensure_grayscale(image), thresholds_lut(thresholds, output))
+
+
+def otsu_lut(histogram, output="binary"):
+    """Lookup table segmenting an image with this histogram by Otsu's threshold."""
+    return thresholds_lut([otsu_threshold(histogram)], output)
+
+
+def multi_otsu_lut(histogram, classes=3, output="levels"):
+    """Lookup table segmenting an image with this histogram by multi-level Otsu."""
+    return thresholds_lut(multi_otsu_thresholds(histogram, classes), output)
+
+
+def kapur_lut(histogram, output="binary"):
+    """Lookup table segmenting an image with this histogram by Kapur's threshold."""
+    return thresholds_lut([kapur_threshold(histogram)], output)
+
+
+def peak_lut(histogram, sigma=2.0):
+    """Binary lookup table thresholding halfway between the main histogram peaks."""
+    return thresholds_lut([peak_threshold(histogram, sigma)])
+
+
+def valley_lut(histogram, sigma=2.0):
+    """Binary lookup table thresholding at the main histogram valley."""
+    return thresholds_lut([valley_threshold(histogram, sigma)])
+
+
+def otsu_segmentation(image, output="binary"):
+    """
+    Segment the image with Otsu's threshold.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        output (str): "binary", "labels" or "levels", see thresholds_lut.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The segmented image.
+    """
+    image = ensure_grayscale(image)
+    return apply_lut(image, otsu_lut(calculate_histogram(image), output))
+
+
+def multi_otsu_segmentation(image, classes=3, output="levels"):
+    """
+    Segment the image into several classes with multi-level Otsu thresholds.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        classes (int): Number of classes.
+        output (str): "labels" or "levels", see thresholds_lut ("binary" for 2 classes).
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The label image.
+    """
+    image = ensure_grayscale(image)
+    return apply_lut(image, multi_otsu_lut(calculate_histogram(image), classes, output))
+
+
+def kapur_segmentation(image, output="binary"):
+    """
+    Segment the image with Kapur's maximum-entropy threshold.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input grayscale image.
+        output (str): "binary", "labels" or "levels", see thresholds_lut.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The segmented image.
+    """
+    image = ensure_grayscale(image)
+    return apply_lut(image, kapur_lut(calculate_histogram(image), output))
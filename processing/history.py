@@ -0,0 +1,194 @@
+import itertools
+import os
+import shutil
+import tempfile
+import zlib
+
+from PIL import Image
+from processing.utils import raw_nbytes
+
+# Number of most recent undo states kept uncompressed for an instant step back
+RAW_SNAPSHOTS = 1
+
+
+class _Snapshot:
+    """
+    One stored image state: raw, zlib-compressed in memory, or spilled to disk.
+    """
+
+    def __init__(self, image):
+        self.mode = image.mode
+        self.size = image.size
+        self.palette = image.getpalette() if image.mode == 'P' else None
+        self.image = image
+        self.raw_nbytes = raw_nbytes(image)
+        self.data = None
+        self.path = None
+
+    @property
+    def nbytes(self):
+        """Bytes of memory held by this snapshot."""
+        if self.image is not None:
+            return self.raw_nbytes
+        if self.data is not None:
+            return len(self.data)
+        return 0
+
+    def compress(self):
+        if self.image is not None:
+            self.data = zlib.compress(self.image.tobytes(), 1)
+            self.image = None
+
+    def spill(self, directory):
+        self.compress()
+        if self.data is not None:
+            fd, self.path = tempfile.mkstemp(suffix=".snapshot", dir=directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.data)
+            self.data = None
+
+    def restore(self):
+        if self.image is not None:
+            return self.image
+
+        if self.data is not None:
+            data = self.data
+        else:
+            with open(self.path, "rb") as f:
+                data = f.read()
+
+        image = Image.frombytes(self.mode, self.size, zlib.decompress(data))
+        if self.palette is not None:
+            image.putpalette(self.palette)
+        return image
+
+    def discard(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.image = self.data = self.path = None
+
+
+class ImageHistory:
+    """
+    Undo/redo stacks of image states with a memory budget.
+
+    The most recent states are kept as they are; older ones are compressed.
+    When the compressed states still exceed the budget, the oldest ones are
+    spilled to a temporary directory (or dropped if spilling is disabled).
+    Stepping back or forward only restores a stored state, it never re-runs
+    an operation.
+    """
+
+    def __init__(self, byte_budget=256 * 1024 * 1024, spill_to_disk=True):
+        """
+        Args:
+            byte_budget (int): Maximum memory, in bytes, held by stored states.
+            spill_to_disk (bool): Move states over the budget to disk instead
+                of forgetting them.
+        """
+        self.byte_budget = byte_budget
+        self.spill_to_disk = spill_to_disk
+        self._undo = []
+        self._redo = []
+        self._spill_dir = None
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    @property
+    def nbytes(self):
+        """Memory currently held by all stored states."""
+        return sum(snapshot.nbytes for snapshot in self._undo + self._redo)
+
+    def push(self, image):
+        """
+        Record the state that is about to be replaced by a new result.
+
+        Args:
+            image (PIL.Image.Image): The current image, before the operation.
+        """
+        for snapshot in self._redo:
+            snapshot.discard()
+        self._redo = []
+        self._undo.append(_Snapshot(image))
+        self._enforce_budget()
+
+    def undo(self, current):
+        """
+        Step back one state.
+
+        Args:
+            current (PIL.Image.Image): The image currently shown, kept for redo.
+
+        Returns:
+            PIL.Image.Image: The previous image, or None if there is none.
+        """
+        if not self._undo:
+            return None
+        snapshot = self._undo.pop()
+        self._redo.append(_Snapshot(current))
+        image = snapshot.restore()
+        snapshot.discard()
+        self._enforce_budget()
+        return image
+
+    def redo(self, current):
+        """
+        Step forward one state.
+
+        Args:
+            current (PIL.Image.Image): The image currently shown, kept for undo.
+
+        Returns:
+            PIL.Image.Image: The next image, or None if there is none.
+        """
+        if not self._redo:
+            return None
+        snapshot = self._redo.pop()
+        self._undo.append(_Snapshot(current))
+        image = snapshot.restore()
+        snapshot.discard()
+        self._enforce_budget()
+        return image
+
+    def clear(self):
+        """Forget every stored state and remove spilled files."""
+        for snapshot in self._undo + self._redo:
+            snapshot.discard()
+        self._undo = []
+        self._redo = []
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def _enforce_budget(self):
+        # Compress everything but the states next to the current one
+        for snapshot in self._undo[:-RAW_SNAPSHOTS] + self._redo[:-RAW_SNAPSHOTS]:
+            snapshot.compress()
+
+        # Then move out the states furthest from the current one (the
+        # bottoms of both stacks, taken in turn starting with the deeper
+        # one) until the budget is met
+        total = self.nbytes
+        stacks = sorted([self._undo, self._redo], key=len, reverse=True)
+        bottoms = [snapshot for pair in itertools.zip_longest(*stacks)
+                   for snapshot in pair if snapshot is not None]
+        for snapshot in bottoms:
+            if total <= self.byte_budget:
+                break
+            held = snapshot.nbytes
+            if held == 0:
+                continue  # Already on disk
+            if self.spill_to_disk:
+                if self._spill_dir is None:
+                    self._spill_dir = tempfile.mkdtemp(prefix="image-history-")
+                snapshot.spill(self._spill_dir)
+            else:
+                snapshot.discard()
+                (self._undo if snapshot in self._undo else self._redo).remove(snapshot)
+            total -= held - snapshot.nbytes
@@ -1,113 +1,57 @@
 import numpy as np
-from PIL import Image
+from processing.profiling import count_conversion
+from processing.point_ops import add_copy_lut, apply_lut, invert_lut, subtract_copy_lut
+from processing.utils import ensure_grayscale
 
 def add_image_and_copy(image):
     """
     Add the image with itself and return the result.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
     
     Returns:
-        PIL.Image.Image: The image with the addition operation applied.
+        PIL.Image.Image or numpy.ndarray: The image with the addition operation applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
-    
-    # Add the image with itself
-    result = np.zeros_like(img_array)
-    for y in range(height):
-        for x in range(width):
-            result[y, x] = img_array[y, x] + img_array[y, x]
+    image = ensure_grayscale(image)
     
-    # Clip values to valid range
-    for y in range(height):
-        for x in range(width):
-            if result[y, x] > 255:
-                result[y, x] = 255
-            elif result[y, x] < 0:
-                result[y, x] = 0
-    
-    return Image.fromarray(result.astype(np.uint8))
+    # x + x, clipped to 255, as a lookup table
+    return apply_lut(image, add_copy_lut())
 
 def subtract_image_and_copy(image):
     """
     Subtract the original image from a brighter version and return the result.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
     
     Returns:
-        PIL.Image.Image: The image with the subtraction operation applied.
+        PIL.Image.Image or numpy.ndarray: The image with the subtraction operation applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
-    img_array = np.array(image, dtype=np.float32)
+    image = ensure_grayscale(image)
     
-    # Create a brighter version by multiplying
-    bright_version = np.zeros_like(img_array)
-    for y in range(height):
-        for x in range(width):
-            bright_version[y, x] = img_array[y, x] * 1.5
-    
-    # Subtract the original from the bright version
-    result = np.zeros_like(img_array)
-    for y in range(height):
-        for x in range(width):
-            result[y, x] = bright_version[y, x] - img_array[y, x]
-    
-    # Clip values to valid range
-    for y in range(height):
-        for x in range(width):
-            if result[y, x] > 255:
-                result[y, x] = 255
-            elif result[y, x] < 0:
-                result[y, x] = 0
-    
-    return Image.fromarray(result.astype(np.uint8))
+    # 1.5 * x - x, clipped to the valid range, as a lookup table
+    return apply_lut(image, subtract_copy_lut())
 
 def invert_image(image):
     """
     Invert the colors of the image and return the result.
     
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
     
     Returns:
-        PIL.Image.Image: The image with the inversion operation applied.
+        PIL.Image.Image or numpy.ndarray: The image with the inversion operation applied.
     """
     # Handle both RGB and grayscale images
-    if image.mode == 'RGB':
-        width, height = image.size
-        img_array = np.array(image)
-        inverted = np.zeros_like(img_array)
-        
-        # Invert each channel
-        for y in range(height):
-            for x in range(width):
-                for c in range(3):  # RGB channels
-                    inverted[y, x, c] = 255 - img_array[y, x, c]
-        
-        return Image.fromarray(inverted.astype(np.uint8), 'RGB')
-    else:
-        # Convert to grayscale if not already
-        if image.mode != 'L':
-            image = image.convert('L')
-        
-        width, height = image.size
-        img_array = np.array(image)
-        inverted = np.zeros_like(img_array)
-        
-        # Invert the grayscale image
-        for y in range(height):
-            for x in range(width):
-                inverted[y, x] = 255 - img_array[y, x]
-        
-        return Image.fromarray(inverted.astype(np.uint8), 'L')
\ No newline at end of file
+    if isinstance(image, np.ndarray):
+        if image.ndim == 3 and image.shape[2] != 3:
+            image = ensure_grayscale(image)
+    elif image.mode != 'RGB' and image.mode != 'L':
+        count_conversion("mode")
+        image = image.convert('L')
+    
+    # The same table is applied to every channel
+    return apply_lut(image, invert_lut())
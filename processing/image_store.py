@@ -0,0 +1,168 @@
+import struct
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# TIFF tags needed to map uncompressed strips
+_TIFF_TAGS = {
+    256: "width", 257: "height", 258: "bits", 259: "compression",
+    262: "photometric", 273: "strip_offsets", 277: "samples",
+    279: "strip_byte_counts", 284: "planar", 317: "predictor", 339: "sample_format",
+}
+_TIFF_TYPES = {3: ("H", 2), 4: ("I", 4)}
+
+
+def open_npy(path, writable=False):
+    """
+    Memory map a ``.npy`` file.
+
+    Args:
+        path (str): Path to the file.
+        writable (bool): Map read-write instead of read-only.
+
+    Returns:
+        numpy.memmap: Array backed by the file; nothing is read until used.
+    """
+    return np.load(path, mmap_mode="r+" if writable else "r")
+
+
+def open_raw(path, height, width, bands=1, dtype=np.uint8, offset=0, planar=True):
+    """
+    Memory map a headerless raw image.
+
+    Args:
+        path (str): Path to the file.
+        height (int): Image height.
+        width (int): Image width.
+        bands (int): Number of channels.
+        dtype: Sample type, including byte order (e.g. '>u2').
+        offset (int): Bytes to skip at the start of the file.
+        planar (bool): Channels are stored one full plane after another
+            (otherwise samples are interleaved per pixel).
+
+    Returns:
+        numpy.ndarray: (height, width) or (height, width, bands) view of the
+        file; planar data is exposed through a transposed view, not copied.
+    """
+    if bands == 1:
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(height, width))
+    if planar:
+        planes = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(bands, height, width))
+        return planes.transpose(1, 2, 0)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(height, width, bands))
+
+
+def _read_tiff_tags(f):
+    byte_order = f.read(2)
+    if byte_order == b"II":
+        endian = "<"
+    elif byte_order == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Not a TIFF file")
+    magic, ifd_offset = struct.unpack(endian + "HI", f.read(6))
+    if magic != 42:
+        raise ValueError("Not a classic TIFF file")
+
+    f.seek(ifd_offset)
+    (count,) = struct.unpack(endian + "H", f.read(2))
+    tags = {}
+    for _ in range(count):
+        tag, kind, n, value = struct.unpack(endian + "HHI4s", f.read(12))
+        if tag not in _TIFF_TAGS or kind not in _TIFF_TYPES:
+            continue
+        code, size = _TIFF_TYPES[kind]
+        if n * size <= 4:
+            data = value[:n * size]
+        else:
+            position = f.tell()
+            f.seek(struct.unpack(endian + "I", value)[0])
+            data = f.read(n * size)
+            f.seek(position)
+        tags[_TIFF_TAGS[tag]] = struct.unpack(endian + code * n, data)
+    return endian, tags
+
+
+def open_tiff(path):
+    """
+    Memory map an uncompressed, strip-organised TIFF.
+
+    Only the first image of the file is mapped. The strips must be stored
+    back to back (as most writers do).
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        numpy.ndarray: (height, width) or (height, width, bands) view of the pixels.
+    """
+    with open(path, "rb") as f:
+        endian, tags = _read_tiff_tags(f)
+
+    def tag(name, default=None):
+        return tags.get(name, (default,))[0]
+
+    if tag("compression", 1) != 1 or tag("predictor", 1) != 1:
+        raise ValueError("TIFF is compressed and cannot be memory mapped")
+    if "strip_offsets" not in tags:
+        raise ValueError("TIFF is not organised in strips")
+    if tag("photometric") not in (1, 2) or tag("sample_format", 1) != 1:
+        raise ValueError("Only unsigned grayscale and RGB TIFFs can be memory mapped")
+
+    bits = tag("bits", 1)
+    if bits not in (8, 16):
+        raise ValueError(f"Unsupported TIFF bit depth: {bits}")
+
+    offsets = tags["strip_offsets"]
+    counts = tags["strip_byte_counts"]
+    for i in range(len(offsets) - 1):
+        if offsets[i] + counts[i] != offsets[i + 1]:
+            raise ValueError("TIFF strips are not contiguous")
+
+    dtype = np.dtype(endian + ("u1" if bits == 8 else "u2"))
+    return open_raw(path, tag("height"), tag("width"), bands=tag("samples", 1), dtype=dtype,
+                    offset=offsets[0], planar=tag("planar", 1) == 2)
+
+
+def open_image(path):
+    """
+    Open an image as an array, memory mapping it when the format allows.
+
+    ``.npy`` files and uncompressed strip TIFFs are mapped without reading
+    them; anything else is decoded with PIL into memory.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        numpy.ndarray: The pixels.
+    """
+    lower = path.lower()
+    if lower.endswith(".npy"):
+        return open_npy(path)
+    if lower.endswith((".tif", ".tiff")):
+        try:
+            return open_tiff(path)
+        except ValueError:
+            pass
+    with Image.open(path) as image:
+        return np.asarray(image)
+
+
+def scratch_array(shape, dtype=np.uint8, directory=None):
+    """
+    Array backed by an anonymous temporary file instead of the heap.
+
+    The file is deleted as soon as the array is no longer referenced.
+
+    Args:
+        shape (tuple): Array shape.
+        dtype: Array dtype.
+        directory (str): Where to create the file (default: system temp dir).
+
+    Returns:
+        numpy.memmap: Writable zero-initialised array.
+    """
+    return np.memmap(tempfile.TemporaryFile(dir=directory), dtype=dtype, mode="w+", shape=shape)
+
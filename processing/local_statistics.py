@@ -0,0 +1,282 @@
+import numpy as np
+from processing.buffers import output_array, pad_reflect, scratch
+from processing.progress import report_progress
+
+# Rows summed at a time by window_sums, so the running sums stay in cache
+SUM_STRIPE_ROWS = 256
+
+
+def _running_extreme_axis(source, kernel_size, axis, output, func, pool=None):
+    """
+    Running max/min along one axis using the van Herk/Gil-Werman scheme: block-wise
+    prefix and suffix extrema give every window in two comparisons, whatever
+    the window size. `output` has the window count along `axis`.
+    """
+    k = kernel_size
+    size = source.shape[axis]
+    blocks = -(-size // k)
+    shape = list(source.shape)
+    shape[axis] = blocks * k
+    if blocks * k == size and source.flags.c_contiguous:
+        extended = source
+    else:
+        # Values past the end are never part of a valid window
+        extended = scratch(pool, "extreme.extended", shape, source.dtype)
+        if axis == 0:
+            extended[:size] = source
+            extended[size:] = source[-1:]
+        else:
+            extended[:, :size] = source
+            extended[:, size:] = source[:, -1:]
+
+    # Blocks of k values along the axis, and the same blocks reversed
+    block_shape = (blocks, k, shape[1]) if axis == 0 else (shape[0], blocks, k)
+    block_axis = axis + 1
+    reverse = tuple(slice(None, None, -1) if i == block_axis else slice(None) for i in range(3))
+    prefix = scratch(pool, "extreme.prefix", shape, source.dtype)
+    suffix = scratch(pool, "extreme.suffix", shape, source.dtype)
+    shaped = extended.reshape(block_shape)
+    func.accumulate(shaped, axis=block_axis, out=prefix.reshape(block_shape))
+    func.accumulate(shaped[reverse], axis=block_axis, out=suffix.reshape(block_shape)[reverse])
+
+    length = output.shape[axis]
+    if axis == 0:
+        return func(suffix[:length], prefix[k - 1:k - 1 + length], out=output)
+    return func(suffix[:, :length], prefix[:, k - 1:k - 1 + length], out=output)
+
+
+def _running_extreme(image_array, kernel_size, func, out=None, pool=None):
+    height, width = image_array.shape
+    padded = pad_reflect(image_array, kernel_size // 2, pool, "extreme.padded")
+    # Separable: extreme over rows first, then over columns
+    rows = scratch(pool, "extreme.rows", (height, padded.shape[1]), image_array.dtype)
+    _running_extreme_axis(padded, kernel_size, 0, rows, func, pool)
+    report_progress(0.5)
+    out = output_array(out, (height, width), image_array.dtype)
+    return _running_extreme_axis(rows, kernel_size, 1, out, func, pool)
+
+
+def _sum_dtype(dtype, kernel_size, squared):
+    """
+    Narrowest accumulator that gives exact window sums.
+
+    Running sums are allowed to wrap around: a window sum is a difference of
+    running sums, which is exact modulo 2**32 as long as the true window sum
+    fits in 32 bits.
+    """
+    if dtype == np.uint8:
+        peak = 255 * 255 if squared else 255
+        if kernel_size * kernel_size * peak < 2 ** 32:
+            return np.uint32
+    if np.issubdtype(dtype, np.integer):
+        return np.int64
+    return np.float64
+
+
+def _stripe_sums(padded, y0, y1, kernel_size, width, acc_dtype, squared, out=None, pool=None):
+    """Window sums of output rows y0..y1 from the reflect-padded image, written into `out`."""
+    k = kernel_size
+    count = y1 - y0
+    block = padded[y0:y1 + k - 1]
+    if squared:
+        squares = scratch(pool, "sums.squares", block.shape, acc_dtype)
+        np.multiply(block, block, out=squares, dtype=acc_dtype)
+        block = squares
+
+    # Running sums down the columns; adding row by row is several times
+    # faster than np.cumsum along axis 0
+    running = scratch(pool, "sums.running", (block.shape[0] + 1, block.shape[1]), acc_dtype)
+    running[0] = 0
+    for i in range(block.shape[0]):
+        np.add(running[i], block[i], out=running[i + 1])
+    columns = scratch(pool, "sums.columns", (count, block.shape[1]), acc_dtype)
+    np.subtract(running[k:k + count], running[:count], out=columns)
+
+    # Running sums along the rows: the window ending at column x + k - 1
+    # is running[x + k - 1] minus running[x - 1] (zero for x = 0)
+    running = scratch(pool, "sums.row_running", columns.shape, acc_dtype)
+    np.cumsum(columns, axis=1, out=running)
+    out = output_array(out, (count, width), acc_dtype)
+    out[:, 0] = running[:, k - 1]
+    np.subtract(running[:, k:k + width - 1], running[:, :width - 1], out=out[:, 1:])
+    return out
+
+
+def window_sum_stripes(image_array, kernel_size, squares=False, rows=SUM_STRIPE_ROWS, pool=None):
+    """
+    Window sums of an image, a stripe of rows at a time.
+
+    Lets callers finish their per-pixel work on a stripe while it is still in
+    cache instead of building full-size intermediate arrays.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        squares (bool): Also yield the window sums of the squared pixels.
+        rows (int): Output rows per stripe.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the stripe arrays, which are reused for the next stripe.
+
+    Yields:
+        tuple: (y0, y1, sums, square_sums) for output rows y0..y1;
+        square_sums is None unless `squares` is set.
+    """
+    height, width = image_array.shape
+    k = kernel_size
+    acc_dtype = _sum_dtype(image_array.dtype, k, False)
+    sq_dtype = _sum_dtype(image_array.dtype, k, True)
+    padded = pad_reflect(image_array, k // 2, pool, "sums.padded")
+
+    for y0 in range(0, height, rows):
+        report_progress(y0 / height)
+        y1 = min(y0 + rows, height)
+        shape = (y1 - y0, width)
+        sums = _stripe_sums(padded, y0, y1, k, width, acc_dtype, False,
+                            scratch(pool, "sums.stripe", shape, acc_dtype), pool)
+        sq_sums = None
+        if squares:
+            sq_sums = _stripe_sums(padded, y0, y1, k, width, sq_dtype, True,
+                                   scratch(pool, "sums.square_stripe", shape, sq_dtype), pool)
+        yield y0, y1, sums, sq_sums
+
+
+def window_sums(image_array, kernel_size, squared=False, out=None, pool=None):
+    """
+    Sum of the kernel_size x kernel_size window around every pixel.
+
+    Uses running sums down the columns and then along the rows (a separable
+    summed-area table), so the cost per pixel does not depend on the window
+    size. The image is processed in stripes of rows to stay in cache, and
+    8-bit input is summed in 32 bits. Borders are reflect padded.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        squared (bool): Sum the squares of the pixels instead.
+        out (numpy.ndarray): Array for the result, with the dtype described below.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the temporaries.
+
+    Returns:
+        numpy.ndarray: Exact window sums (uint32 or int64 for integer input,
+        float64 otherwise), same shape as the input.
+    """
+    height, width = image_array.shape
+    acc_dtype = _sum_dtype(image_array.dtype, kernel_size, squared)
+    padded = pad_reflect(image_array, kernel_size // 2, pool, "sums.padded")
+    sums = output_array(out, (height, width), acc_dtype)
+    for y0 in range(0, height, SUM_STRIPE_ROWS):
+        report_progress(y0 / height)
+        y1 = min(y0 + SUM_STRIPE_ROWS, height)
+        _stripe_sums(padded, y0, y1, kernel_size, width, acc_dtype, squared, sums[y0:y1], pool)
+    return sums
+
+
+def local_mean(image_array, kernel_size=3, pool=None):
+    """
+    Mean of the kernel_size x kernel_size window around every pixel.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        pool (processing.buffers.BufferPool): Supplies the result and the
+            temporaries; the result is then a pool buffer.
+
+    Returns:
+        numpy.ndarray: float64 array of local means, same shape as the input.
+    """
+    sums = _pooled_sums(image_array, kernel_size, False, pool)
+    mean = scratch(pool, "local.mean", image_array.shape, np.float64)
+    return np.divide(sums, float(kernel_size * kernel_size), out=mean)
+
+
+def local_mean_variance(image_array, kernel_size=3, pool=None):
+    """
+    Mean and (population) variance of the window around every pixel.
+
+    Both come from summed-area tables of the image and of its square, so the
+    cost per pixel does not depend on the window size.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        pool (processing.buffers.BufferPool): Supplies the results and the
+            temporaries; the results are then pool buffers.
+
+    Returns:
+        tuple: (mean, variance) float64 arrays, same shape as the input.
+    """
+    n = kernel_size * kernel_size
+    shape = image_array.shape
+    sums = _pooled_sums(image_array, kernel_size, False, pool)
+    sq_sums = _pooled_sums(image_array, kernel_size, True, pool)
+    if np.issubdtype(sums.dtype, np.integer):
+        sums = _widened(sums, scratch(pool, "local.sums64", shape, np.int64))
+        sq_sums = _widened(sq_sums, scratch(pool, "local.square_sums64", shape, np.int64))
+
+    mean = np.divide(sums, float(n), out=scratch(pool, "local.mean", shape, np.float64))
+    # n * sum(x^2) - sum(x)^2 is exact for integer input
+    sq_sums *= n
+    sq_sums -= np.multiply(sums, sums, out=scratch(pool, "local.product", shape, sums.dtype))
+    variance = np.divide(sq_sums, float(n * n), out=scratch(pool, "local.variance", shape, np.float64))
+    np.maximum(variance, 0, out=variance)
+    return mean, variance
+
+
+def local_variance(image_array, kernel_size=3, pool=None):
+    """
+    Population variance of the window around every pixel.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        pool (processing.buffers.BufferPool): As for local_mean_variance.
+
+    Returns:
+        numpy.ndarray: float64 array of local variances.
+    """
+    return local_mean_variance(image_array, kernel_size, pool)[1]
+
+
+def _pooled_sums(image_array, kernel_size, squared, pool):
+    acc_dtype = _sum_dtype(image_array.dtype, kernel_size, squared)
+    name = "local.square_sums" if squared else "local.sums"
+    out = scratch(pool, name, image_array.shape, acc_dtype)
+    return window_sums(image_array, kernel_size, squared, out, pool)
+
+
+def _widened(values, out):
+    np.copyto(out, values)
+    return out
+
+
+def local_min(image_array, kernel_size=3, out=None, pool=None):
+    """
+    Minimum of the window around every pixel.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        out (numpy.ndarray): Array of the input's shape and dtype for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: Array of local minima with the input dtype.
+    """
+    return _running_extreme(image_array, kernel_size, np.minimum, out, pool)
+
+
+def local_max(image_array, kernel_size=3, out=None, pool=None):
+    """
+    Maximum of the window around every pixel.
+
+    Args:
+        image_array (numpy.ndarray): 2-D input array.
+        kernel_size (int): Width and height of the window.
+        out (numpy.ndarray): Array of the input's shape and dtype for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: Array of local maxima with the input dtype.
+    """
+    return _running_extreme(image_array, kernel_size, np.maximum, out, pool)
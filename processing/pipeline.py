@@ -0,0 +1,251 @@
+"""
+Deferred evaluation of operation chains.
+
+A LazyImage is a source image plus the operations to apply to it. Adding an
+operation only records it; pixels are computed when compute() is called,
+e.g. when the result is displayed or saved. The whole chain is then run in
+one go:
+
+- the source is converted to an array once and intermediates stay arrays,
+  so operations do not each convert to and from PIL images;
+- consecutive point operations on grayscale data (inversion, thresholds,
+  equalization, ...) are merged into a single lookup table and applied in
+  one pass; histogram-based ones get their histogram by pushing the input
+  histogram through the preceding tables instead of rescanning the pixels;
+- identical operations added twice to the same image share one node, and
+  computed nodes keep their result, so extending or branching a computed
+  chain only runs the new operations.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+from processing.histogram import count_values
+from processing.point_ops import apply_lut, compose_luts, identity_lut
+from processing.profiling import count_conversion
+from processing.progress import current_context, progress_context
+from processing.registry import get_operation
+from processing.utils import as_array, ensure_grayscale, like_input
+
+# PIL modes whose pixels map directly onto the arrays the operations take;
+# chains on other modes are run step by step on PIL images
+ARRAY_MODES = ("1", "L", "RGB", "RGBA")
+
+
+class LazyImage:
+    """An image defined by a source and a chain of operations, computed on demand."""
+
+    def __init__(self, source, parent=None, operation=None, kwargs=None):
+        """
+        Args:
+            source (PIL.Image.Image or numpy.ndarray): The input image.
+            parent (LazyImage): The image the operation is applied to (None
+                for the source itself).
+            operation (registry.Operation): The last operation of the chain.
+            kwargs (dict): Its bound keyword arguments.
+        """
+        self.source = source
+        self.parent = parent
+        self.operation = operation
+        self.kwargs = kwargs or {}
+        self.last_plan = None  # Passes run by the last compute(), for display and tests
+        self._children = {}
+        self._value = None
+
+    def then(self, operation, **kwargs):
+        """
+        Record an operation on this image.
+
+        Args:
+            operation (registry.Operation or str): The operation or its name.
+            **kwargs: Its parameters; validated now, defaults filled in.
+
+        Returns:
+            LazyImage: The (not yet computed) result. Adding the same
+            operation with the same parameters twice returns the same node.
+        """
+        if isinstance(operation, str):
+            operation = get_operation(operation)
+        if operation.display_only:
+            raise ValueError(f"Operation {operation.name!r} does not produce an image")
+        kwargs = operation.bind_arguments(kwargs)
+        key = (operation.name, tuple(sorted(kwargs.items())))
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = LazyImage(self.source, self, operation, kwargs)
+        return child
+
+    @property
+    def steps(self):
+        """(operation, kwargs) pairs from the source to this image."""
+        steps = []
+        node = self
+        while node.parent is not None:
+            steps.append((node.operation, node.kwargs))
+            node = node.parent
+        return steps[::-1]
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def computed(self):
+        """Whether the pixels are already available without running anything."""
+        return self.parent is None or self._value is not None
+
+    def compute(self, profiler=None):
+        """
+        Run the pending operations.
+
+        Args:
+            profiler (Profiler): Records every pass, if given.
+
+        Returns:
+            PIL.Image.Image or numpy.ndarray: The result, in the same form as
+            the source (arrays are read-only, as they are kept for reuse).
+        """
+        if self.parent is None:
+            self.last_plan = []
+            return self.source
+        if not isinstance(self.source, np.ndarray) and self.source.mode not in ARRAY_MODES:
+            self.last_plan = [operation.name for operation, _ in self.steps]
+            return run_steps(self.source, self.steps, profiler)
+
+        # Start from the nearest node that has been computed already
+        pending = []
+        node = self
+        while node.parent is not None and node._value is None:
+            pending.append((node.operation, node.kwargs))
+            node = node.parent
+        start = node.source if node.parent is None else node._value
+
+        self.last_plan = []
+        # Freeze a view: an operation may return its input unchanged, and the
+        # caller's source array must stay writeable
+        self._value = _evaluate(start, pending[::-1], profiler, self.last_plan).view()
+        self._value.setflags(write=False)
+        return _to_image(self._value, self.source)
+
+    def release(self):
+        """Forget the computed pixels of this node and everything derived from it."""
+        self._value = None
+        for child in self._children.values():
+            child.release()
+
+
+def run_steps(image, steps, profiler=None):
+    """
+    Apply a chain of operations, merging conversions and point operations.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+        steps (list): (registry.Operation, kwargs) pairs, applied in order.
+        profiler (Profiler): Records every pass, if given.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The result, in the same form as the input.
+    """
+    steps = [(operation, operation.bind_arguments(kwargs)) for operation, kwargs in steps]
+    if not isinstance(image, np.ndarray) and image.mode not in ARRAY_MODES:
+        for index, (operation, kwargs) in enumerate(steps):
+            with _stage_progress(index, len(steps)):
+                image = _call(operation.name, operation.function, image, kwargs, profiler)
+        return image
+    return _to_image(_evaluate(image, steps, profiler), image)
+
+
+def _to_image(value, source):
+    if isinstance(source, np.ndarray):
+        return value
+    return like_input(value, source)
+
+
+def _mode(image):
+    if not isinstance(image, np.ndarray):
+        return image.mode
+    if image.ndim == 2:
+        return "L"
+    return {3: "RGB", 4: "RGBA"}.get(image.shape[2])
+
+
+def _operand(image, operation):
+    """The input of the next pass as an array, converted the cheapest way."""
+    if (operation.lut is not None and operation.channels == "luminance"
+            and _mode(image) in ("RGB", "RGBA") and _mode(image) not in operation.modes):
+        # Point operations reduce colour input to luminance before their
+        # lookup; on a PIL image, PIL does that in C
+        image = ensure_grayscale(image)
+    value = as_array(image)
+    if value.dtype == bool:
+        # Binary results are passed on as 0/255, as a mode '1' image converts to 'L'
+        count_conversion("mode")
+        value = np.where(value, 255, 0).astype(np.uint8)
+    return value
+
+
+def _evaluate(image, steps, profiler=None, plan=None):
+    """
+    Run steps on an image, keeping intermediates as arrays.
+
+    Returns:
+        numpy.ndarray: The result. `plan`, if given, collects the name of every pass.
+    """
+    value = image
+    index = 0
+    while index < len(steps):
+        value = _operand(value, steps[index][0])
+
+        run = []
+        while (index + len(run) < len(steps) and steps[index + len(run)][0].lut is not None
+               and value.ndim == 2 and value.dtype == np.uint8):
+            run.append(steps[index + len(run)])
+
+        with _stage_progress(index, len(steps)):
+            if run:
+                name = "+".join(operation.name for operation, _ in run)
+                value = _call(name, _apply_point_ops, value, {"steps": run}, profiler)
+                index += len(run)
+            else:
+                operation, kwargs = steps[index]
+                name = operation.name
+                value = np.asarray(_call(name, operation.function, value, kwargs, profiler))
+                index += 1
+        if plan is not None:
+            plan.append(name)
+    return as_array(value)
+
+
+def _apply_point_ops(value, steps):
+    """Apply consecutive point operations to a grayscale array as one lookup table."""
+    histogram = None
+    lut = identity_lut()
+
+    def input_histogram():
+        # Histogram of the values the current step sees: the source histogram
+        # pushed through the tables of the steps before it
+        nonlocal histogram
+        if histogram is None:
+            histogram = count_values(value)[0]
+        return np.bincount(lut, weights=histogram, minlength=256).astype(np.int64)
+
+    for operation, kwargs in steps:
+        lut = compose_luts(lut, operation.lut(input_histogram, **kwargs))
+    return apply_lut(value, lut)
+
+
+def _call(name, func, image, kwargs, profiler):
+    if profiler is None:
+        return func(image, **kwargs)
+    with profiler.measure(name, image):
+        return func(image, **kwargs)
+
+
+@contextmanager
+def _stage_progress(index, count):
+    """Report a pass's progress as its share of the whole chain."""
+    context = current_context()
+    if context is None or context[0] is None:
+        yield
+        return
+    callback, token = context
+    with progress_context(lambda fraction: callback((index + fraction) / count), token):
+        yield
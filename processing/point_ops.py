@@ -0,0 +1,167 @@
+import numpy as np
+from processing.buffers import output_array, scratch
+from processing.progress import progress_step, report_progress
+
+# All point operations work on 8-bit values, so each one is a 256-entry
+# lookup table (index = input value, value = output value)
+_LEVELS = np.arange(256)
+
+# Pixels mapped per step by apply_lut_array; the index buffer stays in cache
+LUT_BLOCK = 32768
+
+
+def identity_lut():
+    """Lookup table that leaves every value unchanged."""
+    return _LEVELS.astype(np.uint8)
+
+
+def invert_lut():
+    """Lookup table for the negative image (255 - value)."""
+    return (255 - _LEVELS).astype(np.uint8)
+
+
+def threshold_lut(threshold):
+    """
+    Lookup table for binarization.
+
+    Args:
+        threshold (int): Values strictly above it become 255, the rest 0.
+
+    Returns:
+        numpy.ndarray: uint8 lookup table.
+    """
+    return np.where(_LEVELS > threshold, 255, 0).astype(np.uint8)
+
+
+def add_copy_lut():
+    """Lookup table for adding an image to itself (clipped to 255)."""
+    return np.minimum(_LEVELS * 2, 255).astype(np.uint8)
+
+
+def subtract_copy_lut():
+    """Lookup table for subtracting an image from a 1.5x brighter copy of itself."""
+    levels = _LEVELS.astype(np.float32)
+    return np.clip(levels * 1.5 - levels, 0, 255).astype(np.uint8)
+
+
+def equalization_lut(histogram):
+    """
+    Lookup table that equalizes an image with the given histogram.
+
+    Args:
+        histogram (sequence): 256 pixel counts.
+
+    Returns:
+        numpy.ndarray: uint8 lookup table.
+    """
+    # Normalize the CDF to create a lookup table for pixel intensity mapping:
+    # 1. (cdf[i] - cdf_min): Shifts CDF values to start from 0
+    # 2. * 255: Scales to full pixel intensity range (0-255)
+    # 3. // (cdf_max - cdf_min): Normalizes by the CDF range
+    cdf = np.cumsum(np.asarray(histogram, dtype=np.int64))
+    cdf_min = cdf.min()
+    cdf_max = cdf.max()
+    if cdf_max == cdf_min:
+        return identity_lut()
+    return ((cdf - cdf_min) * 255 // (cdf_max - cdf_min)).astype(np.uint8)
+
+
+def compose_luts(*luts):
+    """
+    Fuse several lookup tables into one.
+
+    Args:
+        *luts: Lookup tables in the order they would be applied.
+
+    Returns:
+        numpy.ndarray: A single lookup table with the same effect.
+    """
+    result = identity_lut()
+    for lut in luts:
+        result = np.asarray(lut, dtype=np.uint8)[result]
+    return result
+
+
+def apply_lut(image, lut, mode=None):
+    """
+    Map every pixel through a lookup table in one bulk pass.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): 8-bit image ('L', 'RGB' or
+            'RGBA'; the alpha channel is left untouched) or uint8 array.
+        lut (numpy.ndarray): 256-entry lookup table.
+        mode (str): Output mode for PIL images; only '1' is supported besides
+            the input mode, and only for 'L' input.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The mapped image, same type as the input.
+    """
+    lut = np.asarray(lut, dtype=np.uint8)
+
+    if isinstance(image, np.ndarray):
+        if image.dtype == np.uint8:
+            return apply_lut_array(image, lut)
+        return lut[image]
+
+    # point() maps the whole image in one short C pass, so a cancel is only
+    # checked before it (the array path checks once per block of rows)
+    report_progress(0.0)
+    table = lut.tolist()
+    if image.mode == 'L':
+        return image.point(table, mode) if mode else image.point(table)
+    if image.mode == 'RGB':
+        return image.point(table * 3)
+    if image.mode == 'RGBA':
+        return image.point(table * 3 + list(range(256)))
+    raise ValueError(f"Point operations are not supported for mode {image.mode}")
+
+
+def apply_lut_array(image_array, lut, out=None, pool=None):
+    """
+    Map a uint8 array through a lookup table into `out`.
+
+    The pixels are widened into a small index buffer a block of rows at a
+    time and looked up with np.take, which is faster than fancy indexing (or
+    PIL's point()) and allocates nothing when `out` and `pool` are given.
+
+    Args:
+        image_array (numpy.ndarray): uint8 array of any shape.
+        lut (numpy.ndarray): 256-entry lookup table.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the index buffer.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    out = output_array(out, image_array.shape)
+    lut = np.asarray(lut, dtype=np.uint8)
+    if image_array.size == 0:
+        return out
+    height = image_array.shape[0]
+    rows = max(1, LUT_BLOCK * height // image_array.size)
+    index = scratch(pool, "lut.index", (rows,) + image_array.shape[1:], np.intp)
+    step = progress_step(height // rows) * rows
+    for start in range(0, height, rows):
+        if start % step == 0:
+            report_progress(start / height)
+        stop = min(start + rows, height)
+        block = index[:stop - start]
+        np.copyto(block, image_array[start:stop])
+        # Indices are already in range; "clip" lets np.take write straight into out
+        np.take(lut, block, out=out[start:stop], mode="clip")
+    return out
+
+
+def apply_point_ops(image, *luts, mode=None):
+    """
+    Apply consecutive point operations as a single lookup.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+        *luts: Lookup tables in the order they would be applied.
+        mode (str): Output mode, see apply_lut.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The mapped image.
+    """
+    return apply_lut(image, compose_luts(*luts), mode)
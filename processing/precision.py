@@ -0,0 +1,73 @@
+"""
+Numeric types the filters and edge operators compute in.
+
+Each such operation declares a policy (the registry's `precision`):
+
+- "integer": integer kernels on 8-bit data, accumulated in int16 (squares
+  in int32). Exact, with a quarter of the memory traffic of float64.
+- "float32": real-valued work such as Gaussian smoothing, within one gray
+  level of float64 after rounding to 8 bits.
+
+Setting the precision to "float64" runs every operation in float64, the
+reference the policies are checked against (``benchmark.py --accuracy``).
+The setting is process-wide, so it also applies to the threads that
+process colour channels.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+PRECISIONS = ("policy", "float64")
+
+_precision = "policy"
+
+
+def set_precision(precision):
+    """
+    Choose how operations compute.
+
+    Args:
+        precision (str): "policy" (each operation's own policy) or "float64".
+    """
+    global _precision
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    _precision = precision
+
+
+def get_precision():
+    """The current precision setting."""
+    return _precision
+
+
+@contextmanager
+def precision(name):
+    """Run the ``with`` block at the given precision setting."""
+    previous = _precision
+    set_precision(name)
+    try:
+        yield
+    finally:
+        set_precision(previous)
+
+
+def accumulator(policy, dtype=np.uint8):
+    """
+    dtype to accumulate in under a policy and the current setting.
+
+    Args:
+        policy (str): "integer" (kernels whose absolute weights sum to at
+            most 128, so 8-bit sums fit in int16) or "float32".
+        dtype: dtype of the input data; integer accumulation is only used
+            for 8-bit input.
+
+    Returns:
+        numpy dtype class, e.g. np.int16.
+    """
+    if _precision == "float64":
+        return np.float64
+    if policy == "integer":
+        return np.int16 if np.dtype(dtype) == np.uint8 else np.float64
+    if policy == "float32":
+        return np.float32
+    raise ValueError(f"Unknown precision policy {policy!r}")
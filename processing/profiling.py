@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+_state = threading.local()
+
+# Counts may be updated from several threads (see conversion_context)
+_conversions_lock = threading.Lock()
+
+# tracemalloc keeps one peak for the whole process; every measure in progress
+# has an entry holding the highest peak seen before someone reset it
+_active_peaks = []
+_memory_lock = threading.Lock()
+
+
+def count_conversion(kind):
+    """
+    Record a mode or format conversion made by the operation being profiled.
+
+    Does nothing outside of a profiled call, so helpers can call it
+    unconditionally.
+
+    Args:
+        kind (str): What was converted, e.g. 'mode', 'to_array' or 'to_image'.
+    """
+    counts = getattr(_state, "conversions", None)
+    if counts is not None:
+        with _conversions_lock:
+            counts[kind] = counts.get(kind, 0) + 1
+
+
+def current_conversions():
+    """The conversion counts of the profiled call running in this thread, or None."""
+    return getattr(_state, "conversions", None)
+
+
+@contextmanager
+def conversion_context(counts):
+    """
+    Count the conversions made in this thread into `counts` (from
+    current_conversions() in the thread that started the work).
+    """
+    previous = getattr(_state, "conversions", None)
+    _state.conversions = counts
+    try:
+        yield
+    finally:
+        _state.conversions = previous
+
+
+def _reset_peak():
+    """tracemalloc.reset_peak(), keeping the peak so far for the measures in progress."""
+    peak = tracemalloc.get_traced_memory()[1]
+    for entry in _active_peaks:
+        entry[0] = max(entry[0], peak)
+    tracemalloc.reset_peak()
+
+
+def operation_name(func):
+    """Readable name of an operation, looking through functools.partial."""
+    func = getattr(func, "func", func)
+    return getattr(func, "__name__", repr(func))
+
+
+def image_info(image):
+    """(width, height, mode) of a PIL image or array."""
+    if isinstance(image, np.ndarray):
+        mode = str(image.dtype) if image.ndim == 2 else f"{image.dtype}x{image.shape[2]}"
+        return image.shape[1], image.shape[0], mode
+    return image.width, image.height, image.mode
+
+
+class Profiler:
+    """
+    Records timing, throughput, memory and conversions of operation calls.
+
+    Records are plain dicts, so they can be sent between processes and merged
+    into one trace.
+    """
+
+    def __init__(self, trace_memory=True):
+        """
+        Args:
+            trace_memory (bool): Measure the peak memory allocated by each call
+                with tracemalloc (slows down pure-Python loops noticeably).
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name, image=None):
+        """
+        Record the code run inside the ``with`` block as one call.
+
+        Args:
+            name (str): Name in the records.
+            image (PIL.Image.Image or numpy.ndarray): The input, for size and
+                throughput; the yielded record's "width", "height" and "mode"
+                can also be filled in by the caller.
+
+        Yields:
+            dict: The record being made.
+        """
+        record = {"name": name, "pid": os.getpid(), "tid": threading.get_ident()}
+        if image is not None:
+            record["width"], record["height"], record["mode"] = image_info(image)
+
+        owns_tracing = False
+        if self.trace_memory:
+            with _memory_lock:
+                owns_tracing = not tracemalloc.is_tracing()
+                if owns_tracing:
+                    tracemalloc.start()
+                _reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                peak_entry = [baseline]
+                _active_peaks.append(peak_entry)
+
+        previous = getattr(_state, "conversions", None)
+        _state.conversions = conversions = {}
+        record["start"] = time.time()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _state.conversions = previous
+            if previous is not None:
+                # A nested call's conversions also belong to the enclosing one
+                with _conversions_lock:
+                    for kind, count in conversions.items():
+                        previous[kind] = previous.get(kind, 0) + count
+            if self.trace_memory:
+                with _memory_lock:
+                    peak = max(peak_entry[0], tracemalloc.get_traced_memory()[1])
+                    _active_peaks.remove(peak_entry)
+                    record["peak_bytes"] = max(peak - baseline, 0)
+                    if owns_tracing:
+                        tracemalloc.stop()
+
+            pixels = record.get("width", 0) * record.get("height", 0)
+            record["pixels"] = pixels
+            record["duration"] = duration
+            record["pixels_per_sec"] = pixels / duration if duration > 0 else None
+            record["conversions"] = conversions
+            with self._lock:
+                self.records.append(record)
+
+    def run(self, func, image, *args, name=None, **kwargs):
+        """
+        Call ``func(image, *args, **kwargs)`` and record how it went.
+
+        Args:
+            func (callable): The operation.
+            image (PIL.Image.Image or numpy.ndarray): Its input.
+            name (str): Name in the records (default: the function name).
+
+        Returns:
+            The operation's result. Exceptions are recorded and re-raised.
+        """
+        with self.measure(name or operation_name(func), image):
+            return func(image, *args, **kwargs)
+
+    @property
+    def last(self):
+        """The most recent record, or None."""
+        with self._lock:
+            return self.records[-1] if self.records else None
+
+    def extend(self, records):
+        """Add records made elsewhere (e.g. in worker processes)."""
+        with self._lock:
+            self.records.extend(records)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def chrome_trace(self):
+        """
+        The records as a Chrome trace (also readable by Perfetto).
+
+        Returns:
+            dict: Trace in the Trace Event format, one complete event per call.
+        """
+        with self._lock:
+            records = list(self.records)
+        origin = min((r["start"] for r in records), default=0.0)
+
+        events = []
+        for r in records:
+            args = {key: value for key, value in r.items()
+                    if key not in ("name", "start", "duration", "pid", "tid")}
+            events.append({
+                "name": r["name"],
+                "cat": "operation",
+                "ph": "X",
+                "ts": (r["start"] - origin) * 1e6,
+                "dur": r["duration"] * 1e6,
+                "pid": r["pid"],
+                "tid": r["tid"],
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """Write the Chrome trace to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def format_record(record):
+    """
+    One-line summary of a record for status bars and logs.
+
+    Args:
+        record (dict): A Profiler record.
+
+    Returns:
+        str: e.g. ``apply_sobel: 12.3 ms, 1920x1080 L, 168.6 MP/s, peak 31.6 MB, 2 conversions``
+    """
+    parts = [
+        f"{record['name']}: {record['duration'] * 1000:.1f} ms",
+        f"{record.get('width', 0)}x{record.get('height', 0)} {record.get('mode', '')}".rstrip(),
+    ]
+    if record.get("pixels_per_sec"):
+        parts.append(f"{record['pixels_per_sec'] / 1e6:.1f} MP/s")
+    if "peak_bytes" in record:
+        parts.append(f"peak {record['peak_bytes'] / (1024 * 1024):.1f} MB")
+    conversions = sum(record["conversions"].values())
+    parts.append(f"{conversions} conversion{'s' if conversions != 1 else ''}")
+    return ", ".join(parts)
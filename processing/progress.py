@@ -0,0 +1,83 @@
+import threading
+from contextlib import contextmanager
+
+_state = threading.local()
+
+
+class OperationCancelled(Exception):
+    """Raised inside an operation when its cancel token has been triggered."""
+
+
+class CancelToken:
+    """Flag shared between the caller and a running operation."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+@contextmanager
+def progress_context(callback=None, token=None):
+    """
+    Run operations with a progress callback and/or cancel token attached.
+
+    Operations do not take these as arguments; they call report_progress()
+    and check_cancelled(), which look up the context of the current thread.
+
+    Args:
+        callback (callable): Called as ``callback(fraction)`` with a value in [0, 1].
+        token (CancelToken): Token checked by check_cancelled().
+    """
+    previous = getattr(_state, "context", None)
+    _state.context = (callback, token)
+    try:
+        yield
+    finally:
+        _state.context = previous
+
+
+def current_context():
+    """
+    The (callback, token) pair attached to the current thread, or None.
+
+    Lets work handed to other threads run under the caller's context.
+    """
+    return getattr(_state, "context", None)
+
+
+def check_cancelled():
+    """Raise OperationCancelled if the current operation has been cancelled."""
+    context = getattr(_state, "context", None)
+    if context is not None and context[1] is not None and context[1].cancelled:
+        raise OperationCancelled("Operation cancelled")
+
+
+def report_progress(fraction):
+    """
+    Report how far the current operation is, and stop it if it was cancelled.
+
+    Does nothing outside of a progress_context, so operations can call it
+    unconditionally.
+
+    Args:
+        fraction (float): Completed fraction, between 0 and 1.
+    """
+    context = getattr(_state, "context", None)
+    if context is None:
+        return
+    callback, token = context
+    if token is not None and token.cancelled:
+        raise OperationCancelled("Operation cancelled")
+    if callback is not None:
+        callback(min(max(fraction, 0.0), 1.0))
+
+
+def progress_step(total, updates=100):
+    """Number of loop iterations between two progress reports."""
+    return max(1, total // updates)
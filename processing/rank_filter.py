@@ -0,0 +1,190 @@
+from functools import lru_cache
+
+import numpy as np
+from processing.buffers import output_array, pad_reflect, scratch
+from processing.progress import progress_step, report_progress
+
+# Two-level histograms: 16 coarse bins of 16 fine bins each
+COARSE_BINS = 16
+FINE_BINS = 16
+
+
+def _window_rows(padded, size, ranks, outputs, pool=None):
+    """
+    Run the column-histogram rank filter over every output row.
+
+    Each padded column keeps a 256-bin histogram of the `size` pixels above
+    the current output row; moving down a row adds one pixel and removes one
+    per column. The window histogram of every output pixel is then a
+    difference of prefix sums over the column histograms, so the work per
+    pixel is fixed by the number of bins, not by the window radius. All
+    arrays are taken from `pool`, each rank's result is written to its output.
+    """
+    height, width = outputs[0].shape
+    padded_width = padded.shape[1]
+
+    # Window counts never exceed size * size, so wrap-around arithmetic in a
+    # narrow unsigned type still gives exact differences of prefix sums, and
+    # cumulative counts within a window fit in it
+    count_dtype = np.uint16 if size * size < 2 ** 16 else np.uint32
+    fine = scratch(pool, "rank.fine", (padded_width + 1, 256), count_dtype)
+    fine[...] = 0
+    column_hist = fine[1:].reshape(-1)
+    column_offsets = _steps(padded_width, 256)
+    index = scratch(pool, "rank.index", (padded_width,), np.intp)
+    counts = scratch(pool, "rank.counts", (padded_width,), count_dtype)
+
+    def update(values, ufunc):
+        # column_hist[columns, values] += 1 (or -= 1); every column appears once
+        np.add(column_offsets, values, out=index)
+        np.take(column_hist, index, out=counts, mode="clip")
+        ufunc(counts, 1, out=counts)
+        np.put(column_hist, index, counts, mode="clip")
+
+    for r in range(size):
+        update(padded[r], np.add)
+
+    prefix = scratch(pool, "rank.prefix", fine.shape, count_dtype)
+    coarse_prefix = scratch(pool, "rank.coarse_prefix", (padded_width + 1, COARSE_BINS), count_dtype)
+    coarse = scratch(pool, "rank.coarse", (width, COARSE_BINS), count_dtype)
+    coarse_cdf = scratch(pool, "rank.coarse_cdf", (width, COARSE_BINS), count_dtype)
+    greater = scratch(pool, "rank.greater", (width, COARSE_BINS), bool)
+    bucket = scratch(pool, "rank.bucket", (width,), np.intp)
+    position = scratch(pool, "rank.position", (width,), np.intp)
+    rows = scratch(pool, "rank.rows", (width,), np.intp)
+    below = scratch(pool, "rank.below", (width,), count_dtype)
+    bucket_count = scratch(pool, "rank.bucket_count", (width,), count_dtype)
+    window = scratch(pool, "rank.window", (width, FINE_BINS), count_dtype)
+    window_top = scratch(pool, "rank.window_top", (width, FINE_BINS), count_dtype)
+    fine_cdf = scratch(pool, "rank.fine_cdf", (width, FINE_BINS), count_dtype)
+    # Rows of fine_prefix are (padded column, coarse bin) pairs
+    fine_prefix = prefix.reshape(-1, FINE_BINS)
+    cdf_rows = _steps(width, COARSE_BINS)
+    top_rows = _steps(width, COARSE_BINS, size)
+    bottom_rows = _steps(width, COARSE_BINS)
+
+    step = progress_step(height)
+    for y in range(height):
+        if y % step == 0:
+            report_progress(y / height)
+        if y > 0:
+            update(padded[y - 1], np.subtract)
+            update(padded[y + size - 1], np.add)
+
+        np.cumsum(fine, axis=0, dtype=count_dtype, out=prefix)
+        np.add.reduceat(prefix, _steps(COARSE_BINS, FINE_BINS), axis=1, out=coarse_prefix)
+        np.subtract(coarse_prefix[size:size + width], coarse_prefix[:width], out=coarse)
+        np.cumsum(coarse, axis=1, out=coarse_cdf)
+
+        for rank, output in zip(ranks, outputs):
+            # Find the coarse bin holding the rank, then search its fine bins
+            np.greater(coarse_cdf, rank, out=greater)
+            np.argmax(greater, axis=1, out=bucket)
+            # Pixels below the bucket: its cumulative count minus its own
+            np.add(cdf_rows, bucket, out=rows)
+            np.take(coarse_cdf, rows, out=below, mode="clip")
+            np.take(coarse, rows, out=bucket_count, mode="clip")
+            below -= bucket_count
+            np.add(top_rows, bucket, out=rows)
+            np.take(fine_prefix, rows, axis=0, out=window_top, mode="clip")
+            np.add(bottom_rows, bucket, out=rows)
+            np.take(fine_prefix, rows, axis=0, out=window, mode="clip")
+            np.subtract(window_top, window, out=window)
+            np.cumsum(window, axis=1, out=fine_cdf)
+            fine_cdf += below[:, None]
+            np.greater(fine_cdf, rank, out=greater)
+            np.argmax(greater, axis=1, out=position)
+            bucket *= FINE_BINS
+            bucket += position
+            np.copyto(output[y], bucket, casting="unsafe")
+
+    return outputs
+
+
+@lru_cache(maxsize=32)
+def _steps(count, step, start=0):
+    """Read-only ``np.arange(start, start + count) * step``."""
+    steps = np.arange(start, start + count) * step
+    steps.setflags(write=False)
+    return steps
+
+
+def _prepare(image_array, size, pool=None):
+    if image_array.dtype != np.uint8 or image_array.ndim != 2:
+        raise ValueError("Rank filters need a 2-D uint8 array")
+    if size < 1:
+        raise ValueError("Filter size must be at least 1")
+    return pad_reflect(image_array, size // 2, pool, "rank.padded")
+
+
+def percentile_rank(size, percentile):
+    """
+    Index (0-based, in sorted order) of the given percentile in a size x size window.
+
+    Args:
+        size (int): Width and height of the window.
+        percentile (float): Percentile between 0 and 100.
+
+    Returns:
+        int: Rank of the selected pixel.
+    """
+    if not 0 <= percentile <= 100:
+        raise ValueError("Percentile must be between 0 and 100")
+    count = size * size
+    return int(np.floor(percentile / 100.0 * (count - 1) + 0.5))
+
+
+def rank_filter(image_array, size, percentile, out=None, pool=None):
+    """
+    Replace every pixel by a percentile of its size x size neighbourhood.
+
+    Uses running column histograms, so the cost per pixel does not grow with
+    the window size. Borders are reflect padded.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        size (int): Width and height of the window.
+        percentile (float): 0 gives a minimum filter, 50 the median, 100 the maximum.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the histograms.
+
+    Returns:
+        numpy.ndarray: Filtered uint8 array (`out` if given).
+    """
+    padded = _prepare(image_array, size, pool)
+    out = output_array(out, image_array.shape)
+    return _window_rows(padded, size, [percentile_rank(size, percentile)], [out], pool)[0]
+
+
+def median_filter(image_array, size, out=None, pool=None):
+    """
+    Median of the size x size neighbourhood of every pixel.
+
+    For even window sizes the two middle values are averaged (and rounded
+    down), as ``np.median`` followed by a cast to uint8 would.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        size (int): Width and height of the window.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the padded copy and
+            the histograms.
+
+    Returns:
+        numpy.ndarray: Filtered uint8 array (`out` if given).
+    """
+    padded = _prepare(image_array, size, pool)
+    out = output_array(out, image_array.shape)
+    count = size * size
+
+    if count % 2:
+        return _window_rows(padded, size, [count // 2], [out], pool)[0]
+
+    lower = scratch(pool, "median.lower", image_array.shape, np.uint8)
+    _window_rows(padded, size, [count // 2 - 1, count // 2], [lower, out], pool)
+    total = scratch(pool, "median.total", image_array.shape, np.uint16)
+    np.add(lower, out, out=total, dtype=np.uint16)
+    total >>= 1
+    np.copyto(out, total, casting="unsafe")
+    return out
@@ -0,0 +1,618 @@
+"""
+Declarative list of the image processing operations.
+
+Every operation is described once here: its name, button label, category,
+parameters with their ranges, the modes it handles natively, how far around a
+pixel it looks and its theory text. The GUI, batch.py, the benchmarks and the
+tiling engine all read from this list. Operation modules are only imported
+when an operation is first called.
+"""
+import functools
+import importlib
+
+# Order of the categories in the GUI; "Basic" operations are listed as plain buttons
+CATEGORIES = [
+    "Basic",
+    "Edge Detection",
+    "Advanced Edge Detection",
+    "Filtering",
+    "Image Segmentation",
+    "Image Operations",
+]
+
+# Marks a parameter that has no default value
+REQUIRED = object()
+
+
+class Parameter:
+    """One keyword parameter of an operation."""
+
+    def __init__(self, name, type=int, default=REQUIRED, min=None, max=None, choices=None, label=None):
+        """
+        Args:
+            name (str): Keyword name.
+            type (type): int, float, str or bool.
+            default: Default value; REQUIRED if the caller must give one.
+            min, max: Inclusive range for numeric parameters.
+            choices (sequence): Allowed values for str parameters.
+            label (str): Name shown to users (default: derived from `name`).
+        """
+        self.name = name
+        self.type = type
+        self.default = default
+        self.min = min
+        self.max = max
+        self.choices = tuple(choices) if choices is not None else None
+        self.label = label or name.replace("_", " ").capitalize()
+
+    @property
+    def required(self):
+        return self.default is REQUIRED
+
+    def parse(self, text):
+        """Convert user input (e.g. from a text field) and validate it."""
+        text = text.strip()
+        if self.type is bool:
+            if text.lower() not in ("true", "false"):
+                raise ValueError(f"{self.label} must be true or false")
+            value = text.lower() == "true"
+        else:
+            try:
+                value = self.type(text)
+            except ValueError:
+                raise ValueError(f"{self.label} must be a valid {self.type.__name__}")
+        return self.validate(value)
+
+    def validate(self, value):
+        """
+        Check a value against the parameter's type and range.
+
+        Returns:
+            The value, with ints accepted for float parameters.
+        """
+        if self.type is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, self.type) or (self.type is int and isinstance(value, bool)):
+            raise ValueError(f"{self.label} must be of type {self.type.__name__}")
+        if self.min is not None and value < self.min:
+            raise ValueError(f"{self.label} must be at least {self.min}")
+        if self.max is not None and value > self.max:
+            raise ValueError(f"{self.label} must be at most {self.max}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{self.label} must be one of: {', '.join(map(str, self.choices))}")
+        return value
+
+
+class Operation:
+    """Description of one operation, with its function loaded on first use."""
+
+    def __init__(self, name, label, category, module, params=(), modes=("L",), radius=0,
+                 tileable=False, channels="luminance", lut=None, precision=None, temporaries=1,
+                 theory="", display_only=False, gui=True):
+        """
+        Args:
+            name (str): Function name, also used in batch specs.
+            label (str): Button label.
+            category (str): One of CATEGORIES.
+            module (str): Module defining the function.
+            params (sequence): Parameter objects.
+            modes (tuple): Image modes handled natively; other inputs are
+                converted (usually to 'L') by the operation.
+            radius (int or callable): How far, in pixels, an output pixel
+                looks around its position; a callable gets the bound keyword
+                arguments.
+            tileable (bool): Whether the output only depends on the
+                neighbourhood within `radius` (no global statistics), so the
+                operation can be run tile by tile.
+            channels (str): What happens to colour input: "luminance" reduces
+                it to gray first, "per-channel" processes R, G and B
+                separately (in parallel) and keeps alpha.
+            lut (callable): For point operations, builds the lookup table the
+                operation applies to a grayscale input; called with a function
+                returning the input's histogram and the keyword arguments.
+                Lets pipelines merge consecutive point operations.
+            precision (str): Precision policy of the arithmetic ("integer"
+                or "float32", see processing.precision); None when the
+                operation does not have one.
+            temporaries (int): Image-sized working arrays the operation
+                allocates, counted in its working dtype (the accumulator of
+                its precision policy, bytes without one); sizes tiles.
+            theory (str): Explanation shown in the GUI.
+            display_only (bool): Shows something instead of returning an image.
+            gui (bool): Whether the GUI shows a button for it.
+        """
+        self.name = name
+        self.label = label
+        self.category = category
+        self.module = module
+        self.params = tuple(params)
+        self.modes = modes
+        self.radius = radius
+        self.tileable = tileable
+        self.channels = channels
+        self.lut = lut
+        self.precision = precision
+        self.temporaries = temporaries
+        self.theory = theory
+        self.display_only = display_only
+        self.gui = gui
+
+    @property
+    def function(self):
+        """The processing function, importing its module if needed."""
+        return getattr(importlib.import_module(self.module), self.name)
+
+    @property
+    def array_function(self):
+        """
+        The array-native variant, or None if the operation has none.
+
+        It is called as ``func(image_array, out=None, pool=None, **kwargs)``
+        with a 2-D uint8 array and writes the result into `out` (a uint8
+        array of the same shape), taking its temporaries from `pool` (a
+        processing.buffers.BufferPool). It is the module's
+        ``<name>_array`` function or, for point operations, the lookup table
+        applied with apply_lut_array.
+        """
+        func = getattr(importlib.import_module(self.module), self.name + "_array", None)
+        if func is None and self.lut is not None:
+            func = functools.partial(_apply_point_operation, self)
+        return func
+
+    def call_array(self, image_array, out=None, pool=None, **kwargs):
+        """Run the array-native variant with validated arguments (see array_function)."""
+        func = self.array_function
+        if func is None:
+            raise ValueError(f"Operation {self.name!r} has no array variant")
+        return func(image_array, out=out, pool=pool, **self.bind_arguments(kwargs))
+
+    @property
+    def needs_input(self):
+        """Whether some parameter has no default and must be asked for."""
+        return any(param.required for param in self.params)
+
+    def bind_arguments(self, kwargs=None):
+        """
+        Validate keyword arguments and fill in the defaults.
+
+        Returns:
+            dict: Complete keyword arguments for the function.
+        """
+        kwargs = dict(kwargs or {})
+        bound = {}
+        for param in self.params:
+            if param.name in kwargs:
+                bound[param.name] = param.validate(kwargs.pop(param.name))
+            elif param.required:
+                raise ValueError(f"Operation {self.name!r} needs the parameter {param.name!r}")
+            else:
+                bound[param.name] = param.default
+        if kwargs:
+            raise ValueError(f"Operation {self.name!r} has no parameter {next(iter(kwargs))!r}")
+        return bound
+
+    def bind(self, **kwargs):
+        """The function with validated arguments applied, ready to call on an image."""
+        return functools.partial(self.function, **self.bind_arguments(kwargs))
+
+    def __call__(self, image, **kwargs):
+        return self.function(image, **self.bind_arguments(kwargs))
+
+    def neighbourhood(self, kwargs=None):
+        """Radius, in pixels, of the neighbourhood read for each output pixel."""
+        if callable(self.radius):
+            return self.radius(**self.bind_arguments(kwargs))
+        return self.radius
+
+
+def _window(size_param):
+    """Radius of a square window whose width is given by a parameter."""
+    return lambda **kwargs: kwargs[size_param] // 2
+
+
+def _lut(module, name, histogram=False):
+    """
+    Lookup-table builder calling `name` from `module` (imported on first use),
+    with the input histogram as first argument if `histogram` is set.
+    """
+    def build(input_histogram, **kwargs):
+        func = getattr(importlib.import_module(module), name)
+        if histogram:
+            return func(input_histogram(), **kwargs)
+        return func(**kwargs)
+    return build
+
+
+def _apply_point_operation(operation, image_array, out=None, pool=None, **kwargs):
+    """Array variant of a point operation: its lookup table applied to the array."""
+    from processing.buffers import check_gray
+    from processing.histogram import count_values
+    from processing.point_ops import apply_lut_array
+
+    check_gray(image_array)
+    lut = operation.lut(lambda: count_values(image_array)[0], **kwargs)
+    return apply_lut_array(image_array, lut, out, pool)
+
+
+# Modes handled natively by operations that work channel by channel
+_COLOUR = ("L", "RGB", "RGBA")
+
+_THRESHOLD = Parameter("threshold", int, 128, 0, 255)
+_WINDOW_SIZE = Parameter("size", int, 5, 1, 101, label="Window size")
+_SIGMA = Parameter("sigma", float, 2.0, 0, 32, label="Histogram smoothing")
+_OUTPUT = Parameter("output", str, "binary", choices=["binary", "labels", "levels"])
+_KERNEL_SIZE = Parameter("kernel_size", int, 3, 1, 101, label="Window size")
+
+_OPERATIONS = [
+    Operation(
+        "convert_to_grayscale", "Grayscale", "Basic", "processing.color",
+        modes=("RGB", "RGBA"), tileable=True, temporaries=2,
+        lut=_lut("processing.color", "grayscale_lut"),
+        theory="""Grayscale Conversion:
+Converts a color image to black and white by:
+- Taking the red, green, and blue colors
+- Mixing them with specific weights (59% green, 30% red, 11% blue)
+- Creating a single gray value""",
+    ),
+    Operation(
+        "calculate_threshold", "Threshold", "Basic", "processing.threshold",
+        theory="""Thresholding:
+Makes a black and white image by:
+- Choosing a threshold value
+- Making pixels brighter than threshold white
+- Making pixels darker than threshold black""",
+    ),
+    Operation(
+        "simple_halftone", "Simple Halftone", "Basic", "processing.halftone",
+        theory="""Simple Halftoning:
+Creates a newspaper-like effect by:
+- Breaking image into small squares
+- Making each square either black or white
+- Creating the illusion of gray shades""",
+    ),
+    Operation(
+        "error_diffusion_halftoning", "Advanced Halftone", "Basic", "processing.halftone",
+        params=[
+            _THRESHOLD,
+            Parameter("kernel", str, "floyd-steinberg",
+                      choices=["floyd-steinberg", "jarvis-judice-ninke", "stucki", "atkinson"]),
+            Parameter("serpentine", bool, False),
+        ],
+        theory="""Error Diffusion Halftoning:
+An advanced newspaper-like effect that:
+- Processes image pixel by pixel
+- Spreads errors to nearby pixels
+- Creates smoother patterns than simple halftoning""",
+    ),
+    Operation(
+        "show_histogram", "Histogram", "Basic", "processing.histogram",
+        display_only=True,
+        theory="""Histogram:
+Shows how bright or dark an image is by:
+- Counting pixels of each brightness level
+- Showing results in a graph
+- Helping analyze image quality""",
+    ),
+    Operation(
+        "histogram_equalization", "Histogram Equalization", "Basic", "processing.histogram",
+        lut=_lut("processing.point_ops", "equalization_lut", histogram=True),
+        theory="""Histogram Equalization:
+Improves image contrast by:
+- Finding dark and bright areas
+- Spreading out the brightness levels
+- Making details more visible""",
+    ),
+    Operation(
+        "apply_sobel", "Sobel", "Edge Detection", "processing.simple_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        radius=1, tileable=True, temporaries=6,
+        precision="integer",
+        theory="""Sobel Edge Detection:
+Finds edges in images by:
+- Looking at how quickly brightness changes
+- Finding vertical and horizontal edges
+- Combining them into a complete edge image""",
+    ),
+    Operation(
+        "apply_prewitt", "Prewitt", "Edge Detection", "processing.simple_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        radius=1, tileable=True, temporaries=6,
+        precision="integer",
+        theory="""Prewitt Edge Detection:
+Similar to Sobel but simpler:
+- Finds vertical and horizontal edges
+- Less sensitive to small details
+- Good for finding strong edges""",
+    ),
+    Operation(
+        "apply_kirsch", "Kirsch", "Edge Detection", "processing.simple_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        radius=1, tileable=True, temporaries=5,
+        precision="integer",
+        theory="""Kirsch Edge Detection:
+Finds edges in all directions:
+- Checks 8 different directions
+- Picks the strongest edge
+- Good for finding detailed edges""",
+    ),
+    Operation(
+        "edge_detection", "Edge Detection", "Edge Detection", "processing.simple_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        params=[Parameter("method", str, "sobel", choices=["sobel", "prewitt", "kirsch"])],
+        radius=1, tileable=True, temporaries=6, gui=False,
+        precision="integer",
+        theory="""Edge Detection:
+Runs the Sobel, Prewitt or Kirsch operator, chosen by name.""",
+    ),
+    Operation(
+        "homogeneity_operator", "Homogeneity", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        radius=1,
+        theory="""Homogeneity Edge Detection:
+Finds edges by:
+- Comparing each pixel to its neighbors
+- Finding areas where pixels are different
+- Marking these areas as edges""",
+    ),
+    Operation(
+        "difference_operator", "Difference", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        radius=1,
+        theory="""Difference Edge Detection:
+A simple way to find edges:
+- Finds brightest and darkest nearby pixels
+- Calculates their difference
+- Large differences mean edges""",
+    ),
+    Operation(
+        "difference_of_gaussians", "DoG", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        params=[
+            Parameter("sigma1", float, 1.0, 0.1, 20.0),
+            Parameter("sigma2", float, 2.0, 0.1, 20.0),
+            Parameter("size", int, 5, 1, 101, label="Kernel size"),
+        ],
+        radius=_window("size"),
+        precision="float32",
+        theory="""Difference of Gaussians:
+Finds edges by:
+- Blurring image two different amounts
+- Subtracting the blurred images
+- Finding where they differ most""",
+    ),
+    Operation(
+        "contrast_based_edge_detection", "Contrast", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        params=[_KERNEL_SIZE], radius=_window("kernel_size"),
+        theory="""Contrast Edge Detection:
+Finds edges where:
+- Bright and dark areas meet
+- Contrast changes significantly
+- Local differences are high""",
+    ),
+    Operation(
+        "variance_operator", "Variance", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        params=[_KERNEL_SIZE], radius=_window("kernel_size"),
+        theory="""Variance Edge Detection:
+Finds edges where:
+- Pixel values vary a lot
+- Local area has high variation
+- Changes are significant""",
+    ),
+    Operation(
+        "range_operator", "Range", "Advanced Edge Detection",
+        "processing.advanced_edge_detection",
+        modes=_COLOUR, channels="per-channel",
+        params=[_KERNEL_SIZE], radius=_window("kernel_size"),
+        theory="""Range Edge Detection:
+Simple edge detection that:
+- Finds highest and lowest values nearby
+- Calculates their range
+- Marks high ranges as edges""",
+    ),
+    Operation(
+        "apply_highpass", "High Pass", "Filtering", "processing.filtering",
+        modes=_COLOUR, channels="per-channel",
+        radius=1, tileable=True, temporaries=3,
+        precision="integer",
+        theory="""High Pass Filter:
+Makes edges stand out by:
+- Keeping sharp details
+- Removing smooth areas
+- Making edges more visible""",
+    ),
+    Operation(
+        "apply_lowpass", "Low Pass", "Filtering", "processing.filtering",
+        modes=_COLOUR, channels="per-channel",
+        params=[_WINDOW_SIZE, Parameter("sigma", float, 1.0, 0.1, 20.0)],
+        radius=_window("size"), tileable=True, temporaries=4,
+        precision="float32",
+        theory="""Low Pass Filter:
+Smooths the image by:
+- Blurring sharp details
+- Averaging nearby pixels
+- Reducing noise""",
+    ),
+    Operation(
+        "apply_median", "Median", "Filtering", "processing.filtering",
+        modes=_COLOUR, channels="per-channel",
+        params=[_WINDOW_SIZE], radius=_window("size"), tileable=True, temporaries=5,
+        theory="""Median Filter:
+Removes noise while keeping edges:
+- Sorts nearby pixels by brightness
+- Takes the middle value
+- Replaces noisy pixels""",
+    ),
+    Operation(
+        "apply_percentile", "Percentile", "Filtering", "processing.filtering",
+        modes=_COLOUR, channels="per-channel",
+        params=[_WINDOW_SIZE, Parameter("percentile", float, 10.0, 0, 100)],
+        radius=_window("size"), tileable=True, temporaries=5,
+        theory="""Percentile Filter:
+Generalizes the median filter:
+- Sorts nearby pixels by brightness
+- Takes the value at the chosen percentile
+- Low percentiles darken and remove bright specks, high ones do the opposite""",
+    ),
+    Operation(
+        "manual_segmentation", "Manual", "Image Segmentation",
+        "processing.histogram_based_segmentation",
+        params=[Parameter("threshold", int, REQUIRED, 0, 255)], tileable=True, temporaries=2,
+        lut=_lut("processing.point_ops", "threshold_lut"),
+        theory="""Manual Segmentation:
+Divides an image into segments by:
+- Choosing a threshold value
+- Making pixels brighter than threshold white
+- Making pixels darker than threshold black""",
+    ),
+    Operation(
+        "peak_segmentation", "Peak", "Image Segmentation",
+        "processing.histogram_based_segmentation",
+        params=[_SIGMA],
+        lut=_lut("processing.histogram_thresholding", "peak_lut", histogram=True),
+        theory="""Peak Segmentation:
+Divides an image into segments by:
+- Smoothing the histogram so noise does not create peaks
+- Finding its two highest peaks
+- Thresholding halfway between them""",
+    ),
+    Operation(
+        "valley_segmentation", "Valley", "Image Segmentation",
+        "processing.histogram_based_segmentation",
+        params=[_SIGMA],
+        lut=_lut("processing.histogram_thresholding", "valley_lut", histogram=True),
+        theory="""Valley Segmentation:
+Divides an image into segments by:
+- Smoothing the histogram so noise does not create valleys
+- Finding the deepest valley between its two highest peaks
+- Using this valley as the threshold""",
+    ),
+    Operation(
+        "otsu_segmentation", "Otsu", "Image Segmentation",
+        "processing.histogram_thresholding",
+        params=[_OUTPUT],
+        lut=_lut("processing.histogram_thresholding", "otsu_lut", histogram=True),
+        theory="""Otsu Thresholding:
+Picks the global threshold from the histogram by:
+- Trying every split of the 256 gray levels into two classes
+- Keeping the split with the largest between-class variance
+- Costs the same for any image size once the histogram is known""",
+    ),
+    Operation(
+        "multi_otsu_segmentation", "Multi-Otsu", "Image Segmentation",
+        "processing.histogram_thresholding",
+        params=[
+            Parameter("classes", int, 3, 2, 8),
+            Parameter("output", str, "levels", choices=["binary", "labels", "levels"]),
+        ],
+        lut=_lut("processing.histogram_thresholding", "multi_otsu_lut", histogram=True),
+        theory="""Multi-level Otsu Thresholding:
+Splits the gray levels into several classes by:
+- Choosing the thresholds with the largest between-class variance
+- Searching all of them exactly with dynamic programming on the histogram
+- Showing each class as its own gray level""",
+    ),
+    Operation(
+        "kapur_segmentation", "Kapur", "Image Segmentation",
+        "processing.histogram_thresholding",
+        params=[_OUTPUT],
+        lut=_lut("processing.histogram_thresholding", "kapur_lut", histogram=True),
+        theory="""Kapur (Maximum Entropy) Thresholding:
+Picks the global threshold from the histogram by:
+- Treating background and foreground as two probability distributions
+- Keeping the split where their summed entropy is largest
+- Works well when the object is small compared to the background""",
+    ),
+    Operation(
+        "adaptive_segmentation", "Adaptive", "Image Segmentation",
+        "processing.histogram_based_segmentation",
+        params=[Parameter("block_size", int, 16, 1, 1024)],
+        radius=_window("block_size"), tileable=True, temporaries=17,
+        theory="""Adaptive Segmentation:
+Divides an image into segments by:
+- Analyzing the local area around each pixel
+- Adjusting the threshold based on the local area""",
+    ),
+    Operation(
+        "adaptive_threshold", "Sauvola", "Image Segmentation",
+        "processing.histogram_based_segmentation",
+        params=[
+            Parameter("window_size", int, 25, 1, 1001, label="Window size"),
+            Parameter("method", str, "sauvola", choices=["mean", "niblack", "sauvola"]),
+            Parameter("c", float, 0.0, -255, 255, label="Offset C"),
+            Parameter("k", float, 0.2, -1, 1, label="Weight k"),
+            Parameter("r", float, 128.0, 1, 255, label="Range R"),
+        ],
+        radius=_window("window_size"), tileable=True, temporaries=27,
+        theory="""Local Adaptive Thresholding:
+Thresholds each pixel against the window around it:
+- Mean-C: local mean minus a constant
+- Niblack: local mean minus k standard deviations
+- Sauvola: mean scaled by the local contrast, suited to document scans
+- Window sums make the cost independent of the window size""",
+    ),
+    Operation(
+        "invert_image", "Invert", "Image Operations", "processing.image_operations",
+        modes=("L", "RGB"), tileable=True, temporaries=2,
+        lut=_lut("processing.point_ops", "invert_lut"),
+        theory="""Image Inversion:
+Creates a negative by:
+- Making dark areas bright
+- Making bright areas dark
+- Reversing all colors""",
+    ),
+    Operation(
+        "add_image_and_copy", "Add & Copy", "Image Operations", "processing.image_operations",
+        tileable=True, temporaries=2,
+        lut=_lut("processing.point_ops", "add_copy_lut"),
+        theory="""Image Addition:
+Combines two images by:
+- Adding their brightness values
+- Making result brighter
+- Useful for blending images""",
+    ),
+    Operation(
+        "subtract_image_and_copy", "Sub & Copy", "Image Operations", "processing.image_operations",
+        tileable=True, temporaries=2,
+        lut=_lut("processing.point_ops", "subtract_copy_lut"),
+        theory="""Image Subtraction:
+Shows differences between images by:
+- Subtracting brightness values
+- Showing what changed
+- Useful for finding differences""",
+    ),
+]
+
+OPERATIONS = {operation.name: operation for operation in _OPERATIONS}
+
+
+def get_operation(name):
+    """
+    Look up an operation by name.
+
+    Args:
+        name (str): Function name, e.g. ``apply_sobel``.
+
+    Returns:
+        Operation: Its description.
+    """
+    try:
+        return OPERATIONS[name]
+    except KeyError:
+        raise ValueError(f"Unknown operation: {name!r}")
+
+
+def operations_in(category, gui_only=True):
+    """Operations of a category, in registration order."""
+    return [op for op in _OPERATIONS if op.category == category and (op.gui or not gui_only)]
+
+
+def operation_modules():
+    """Modules that define registered operations, in registration order."""
+    return list(dict.fromkeys(op.module for op in _OPERATIONS))
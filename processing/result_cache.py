@@ -0,0 +1,296 @@
+"""
+Cache of operation results, keyed by input content and parameters.
+
+Running the same operation with the same parameters on the same pixels
+always gives the same result, so results are stored under a hash of
+(input content, operation, parameters). The in-memory tier is an LRU bounded
+by the bytes it holds; an optional directory adds a persistent tier that
+survives restarts and is shared by processes (e.g. batch workers).
+"""
+import functools
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from processing.precision import get_precision
+from processing.profiling import operation_name
+from processing.utils import image_digest, raw_nbytes
+
+# Part of every key; bump it when operations change their results, so
+# entries written by older versions are not used
+CACHE_VERSION = 1
+
+_ENTRY_SUFFIX = ".entry"
+
+
+def file_digest(path):
+    """
+    Content hash of a file, for caching results without decoding the file.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(functools.partial(f.read, 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        header = {"kind": "array", "dtype": value.dtype.str, "shape": list(value.shape)}
+        payload = np.ascontiguousarray(value).tobytes()
+    else:
+        header = {"kind": "image", "mode": value.mode, "size": list(value.size),
+                  "palette": value.getpalette() if value.mode == "P" else None}
+        payload = value.tobytes()
+    header = json.dumps(header).encode()
+    return struct.pack("<I", len(header)) + header + zlib.compress(payload, 1)
+
+
+def _decode(data):
+    (length,) = struct.unpack_from("<I", data)
+    header = json.loads(data[4:4 + length])
+    payload = zlib.decompress(data[4 + length:])
+    if header["kind"] == "array":
+        value = np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+        value.setflags(write=False)
+        return value
+    image = Image.frombytes(header["mode"], tuple(header["size"]), payload)
+    if header["palette"] is not None:
+        image.putpalette(header["palette"])
+    return image
+
+
+class ResultCache:
+    """
+    Two-tier cache of images and arrays: a byte-bounded LRU in memory and an
+    optional directory on disk.
+
+    Cached values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, byte_budget=256 * 1024 * 1024, directory=None, disk_budget=2 * 1024 ** 3):
+        """
+        Args:
+            byte_budget (int): Maximum bytes of results kept in memory.
+            directory (str): Directory for the persistent tier; memory only if None.
+            disk_budget (int): Maximum bytes of (compressed) entries on disk;
+                the least recently used ones are deleted beyond it.
+        """
+        self.byte_budget = byte_budget
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(digest, operation, params=None):
+        """
+        Cache key of a result (at the current precision setting).
+
+        Args:
+            digest (str): Content hash of the input (image_digest or file_digest).
+            operation (str): Operation name.
+            params: Parameters, e.g. a kwargs dict or a list of chain steps;
+                anything with a stable repr once dicts are sorted.
+
+        Returns:
+            str: Hex key.
+        """
+        description = json.dumps([CACHE_VERSION, get_precision(), digest, operation, params],
+                                 sort_keys=True, default=repr)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    @property
+    def nbytes(self):
+        """Bytes of results held in memory."""
+        return self._nbytes
+
+    def stats(self):
+        """Hit and miss counters and the size of the memory tier."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+            }
+
+    def get(self, key):
+        """
+        Look up a result.
+
+        Returns:
+            The cached image or array, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """
+        Store a result (PIL images and arrays only; other values are ignored).
+        """
+        if not isinstance(value, (Image.Image, np.ndarray)):
+            return
+        with self._lock:
+            self._remember(key, value)
+        if self.directory is not None:
+            self._write(key, value)
+
+    def call(self, func, image, name=None, params=None):
+        """
+        ``func(image)`` from the cache, computed and stored on a miss.
+
+        Args:
+            func (callable): The operation; for a functools.partial the name
+                and keyword arguments make up the key.
+            image (PIL.Image.Image or numpy.ndarray): Its input.
+            name (str): Operation name (default: from `func`).
+            params: Parameters for the key (default: the partial's keywords).
+
+        Returns:
+            tuple: (result, whether it came from the cache). Calls that cannot
+            be keyed (not a partial and no `params`) are just run.
+        """
+        if params is None:
+            if not isinstance(func, functools.partial) or func.args:
+                return func(image), False
+            params = func.keywords
+        key = self.key(image_digest(image), name or operation_name(func), params)
+        result = self.get(key)
+        if result is not None:
+            return result, True
+        result = func(image)
+        self.put(key, result)
+        return result, False
+
+    def clear(self, disk=False):
+        """Forget the results in memory (and on disk if `disk` is set) and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = self.misses = self.disk_hits = 0
+        if disk and self.directory is not None:
+            for path in self._entry_paths():
+                os.remove(path)
+            self._disk_bytes = 0
+
+    def _remember(self, key, value):
+        size = raw_nbytes(value)
+        if size > self.byte_budget:
+            return
+        if key in self._entries:
+            self._nbytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._nbytes += size
+        while self._nbytes > self.byte_budget:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._nbytes -= evicted
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def _entry_paths(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith(_ENTRY_SUFFIX)]
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            value = _decode(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, zlib.error):
+            # Damaged entry: drop it and compute the result again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # Most recently used
+        except OSError:
+            pass
+        return value
+
+    def _write(self, key, value):
+        data = _encode(value)
+        # Written under a temporary name and renamed, so other processes
+        # never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)  # Entry written before for the same key
+        except OSError:
+            replaced = 0
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(os.path.getsize(path) for path in self._entry_paths())
+            else:
+                self._disk_bytes += len(data) - replaced
+            if self._disk_bytes > self.disk_budget:
+                self._enforce_disk_budget()
+
+    def _enforce_disk_budget(self):
+        entries = []
+        for path in self._entry_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
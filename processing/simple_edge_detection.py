@@ -1,6 +1,11 @@
 import numpy as np
-from PIL import Image
+from processing.buffers import check_gray, output_array
+from processing.gradient import gradient, gradient_magnitude_into, kirsch_compass_into
+from processing.channels import channel_policy
+from processing.precision import accumulator
+from processing.utils import as_array, ensure_grayscale, like_input
 
+@channel_policy
 def apply_sobel(image):
     """
     Apply Sobel edge detection to an image.
@@ -10,45 +15,24 @@ def apply_sobel(image):
     gradient in the x and y directions. The magnitude of the gradient is then computed to highlight the edges.
 
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
 
     Returns:
-        PIL.Image.Image: The image with Sobel edge detection applied.
+        PIL.Image.Image or numpy.ndarray: The image with Sobel edge detection applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-
-    width, height = image.size
-    image_array = np.array(image, dtype=np.float64)
-
-    # Sobel operators
-    sobel_x = [[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]]
-    sobel_y = [[-1, -2, -1], [0, 0, 0], [1, 2, 1]]
-
-    # Initialize gradient arrays
-    gradient_x = np.zeros((height, width), dtype=np.float64)
-    gradient_y = np.zeros((height, width), dtype=np.float64)
-
-    # Apply convolution manually
-    for i in range(1, height-1):
-        for j in range(1, width-1):
-            gx = 0
-            gy = 0
-            for k in range(-1, 2):
-                for l in range(-1, 2):
-                    gx += image_array[i+k, j+l] * sobel_x[k+1][l+1]
-                    gy += image_array[i+k, j+l] * sobel_y[k+1][l+1]
-            gradient_x[i, j] = gx
-            gradient_y[i, j] = gy
-
-    # Calculate magnitude
-    magnitude = np.sqrt(gradient_x**2 + gradient_y**2)
+    image = ensure_grayscale(image)
+
+    image_array = as_array(image)
+
+    # Both Sobel kernels are evaluated from the same shifted views
+    magnitude = gradient(image_array, "sobel", dtype=accumulator("integer", image_array.dtype))
     magnitude = np.clip(magnitude, 0, 255).astype(np.uint8)
 
-    return Image.fromarray(magnitude)
+    return like_input(magnitude, image)
 
 
+@channel_policy
 def apply_prewitt(image):
     """
     Apply Prewitt edge detection to an image.
@@ -58,44 +42,23 @@ def apply_prewitt(image):
     gradient in the x and y directions. The magnitude of the gradient is then computed to highlight the edges.
 
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
 
     Returns:
-        PIL.Image.Image: The image with Prewitt edge detection applied.
+        PIL.Image.Image or numpy.ndarray: The image with Prewitt edge detection applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-
-    width, height = image.size
-    image_array = np.array(image, dtype=np.float64)
-
-    # Prewitt operators
-    prewitt_x = [[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]]
-    prewitt_y = [[-1, -1, -1], [0, 0, 0], [1, 1, 1]]
-
-    # Initialize gradient arrays
-    gradient_x = np.zeros((height, width), dtype=np.float64)
-    gradient_y = np.zeros((height, width), dtype=np.float64)
-
-    # Apply convolution manually
-    for i in range(1, height-1):
-        for j in range(1, width-1):
-            gx = 0
-            gy = 0
-            for k in range(-1, 2):
-                for l in range(-1, 2):
-                    gx += image_array[i+k, j+l] * prewitt_x[k+1][l+1]
-                    gy += image_array[i+k, j+l] * prewitt_y[k+1][l+1]
-            gradient_x[i, j] = gx
-            gradient_y[i, j] = gy
-
-    # Calculate magnitude
-    magnitude = np.sqrt(gradient_x**2 + gradient_y**2)
+    image = ensure_grayscale(image)
+
+    image_array = as_array(image)
+
+    # Both Prewitt kernels are evaluated from the same shifted views
+    magnitude = gradient(image_array, "prewitt", dtype=accumulator("integer", image_array.dtype))
     magnitude = np.clip(magnitude, 0, 255).astype(np.uint8)
 
-    return Image.fromarray(magnitude)
+    return like_input(magnitude, image)
 
+@channel_policy
 def apply_kirsch(image):
     """
     Apply Kirsch edge detection to an image.
@@ -105,51 +68,25 @@ def apply_kirsch(image):
     directions. The maximum response from these directions is then computed to highlight the edges.
 
     Args:
-        image (PIL.Image.Image): The input image to be processed.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be processed.
 
     Returns:
-        PIL.Image.Image: The image with Kirsch edge detection applied.
+        PIL.Image.Image or numpy.ndarray: The image with Kirsch edge detection applied.
     """
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-
-    width, height = image.size
-    image_array = np.array(image, dtype=np.float64)
-
-    # Kirsch operators (8 directions)
-    kirsch_filters = [
-        [[ 5,  5,  5], [-3,  0, -3], [-3, -3, -3]],  # North
-        [[ 5,  5, -3], [ 5,  0, -3], [-3, -3, -3]],  # North East
-        [[ 5, -3, -3], [ 5,  0, -3], [ 5, -3, -3]],  # East
-        [[-3, -3, -3], [ 5,  0, -3], [ 5,  5, -3]],  # South East
-        [[-3, -3, -3], [-3,  0, -3], [ 5,  5,  5]],  # South
-        [[-3, -3, -3], [-3,  0,  5], [-3,  5,  5]],  # South West
-        [[-3, -3,  5], [-3,  0,  5], [-3, -3,  5]],  # West
-        [[-3,  5,  5], [-3,  0,  5], [-3, -3, -3]]   # North West
-    ]
-
-    # Initialize maximum magnitude array
-    max_magnitude = np.zeros((height, width), dtype=np.float64)
-
-    # Apply all directions and get maximum response
-    for kernel in kirsch_filters:
-        response = np.zeros((height, width), dtype=np.float64)
-        for i in range(1, height-1):
-            for j in range(1, width-1):
-                value = 0
-                for k in range(-1, 2):
-                    for l in range(-1, 2):
-                        value += image_array[i+k, j+l] * kernel[k+1][l+1]
-                response[i, j] = value
-        max_magnitude = np.maximum(max_magnitude, response)
-
-    # Normalize magnitude
-    magnitude = np.clip(max_magnitude, 0, 255).astype(np.uint8)
-
-    return Image.fromarray(magnitude)
+    image = ensure_grayscale(image)
+
+    image_array = as_array(image)
+
+    # All eight directions share one ring sum and only the running maximum
+    # is kept, see gradient._kirsch_max
+    magnitude = np.empty(image_array.shape, dtype=np.uint8)
+    kirsch_compass_into(image_array, magnitude, accumulator("integer", image_array.dtype))
 
+    return like_input(magnitude, image)
 
+
+@channel_policy
 def edge_detection(image, method="sobel"):
     """
     Apply edge detection to an image using the specified method.
@@ -168,4 +105,44 @@ def edge_detection(image, method="sobel"):
     elif method == "kirsch":
         return apply_kirsch(image)
     else:
-        return apply_sobel(image)  # default to sobel
\ No newline at end of file
+        return apply_sobel(image)  # default to sobel
+
+
+def apply_sobel_array(image_array, out=None, pool=None):
+    """
+    apply_sobel for a 2-D uint8 array, written into `out`.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Supplies the temporaries.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return gradient_magnitude_into(image_array, "sobel", out, accumulator("integer"), pool)
+
+
+def apply_prewitt_array(image_array, out=None, pool=None):
+    """apply_prewitt for a 2-D uint8 array, see apply_sobel_array."""
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return gradient_magnitude_into(image_array, "prewitt", out, accumulator("integer"), pool)
+
+
+def apply_kirsch_array(image_array, out=None, pool=None):
+    """apply_kirsch for a 2-D uint8 array, see apply_sobel_array."""
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    return kirsch_compass_into(image_array, out, accumulator("integer"), pool)
+
+
+def edge_detection_array(image_array, method="sobel", out=None, pool=None):
+    """edge_detection for a 2-D uint8 array, see apply_sobel_array."""
+    if method == "prewitt":
+        return apply_prewitt_array(image_array, out, pool)
+    if method == "kirsch":
+        return apply_kirsch_array(image_array, out, pool)
+    return apply_sobel_array(image_array, out, pool)
\ No newline at end of file
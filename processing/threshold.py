@@ -1,4 +1,10 @@
-from PIL import Image
+import logging
+
+import numpy as np
+from processing.buffers import check_gray, output_array
+from processing.utils import as_array, ensure_grayscale
+
+logger = logging.getLogger(__name__)
 
 def calculate_threshold(image):
     """
@@ -6,22 +12,42 @@ def calculate_threshold(image):
     based on the average pixel value, and applies the threshold to create a binary image.
 
     Args:
-        image (PIL.Image.Image): The input image to be thresholded.
+        image (PIL.Image.Image or numpy.ndarray): The input image to be thresholded.
 
     Returns:
-        PIL.Image.Image: The thresholded binary image.
+        PIL.Image.Image or numpy.ndarray: The thresholded binary image.
     """
     
     # Convert image to grayscale if it isn't already
-    if image.mode != 'L':
-        image = image.convert('L')
-    
-    width, height = image.size
+    image = ensure_grayscale(image)
     
     # Calculate the average pixel value (global threshold)
-    pixel_values = [image.getpixel((x, y)) for x in range(width) for y in range(height)]
-    threshold = sum(pixel_values) // len(pixel_values)
+    img_array = as_array(image)
+    threshold = int(img_array.sum(dtype=np.int64)) // img_array.size
     print(f"Calculated Threshold: {threshold}")
     
     # Return the original image and the calculated threshold
-    return image
\ No newline at end of file
+    return image
+
+
+def calculate_threshold_array(image_array, out=None, pool=None):
+    """
+    calculate_threshold for a 2-D uint8 array: copies the array into `out`.
+
+    The threshold is logged at debug level instead of printed, since
+    variants run once per frame or tile.
+
+    Args:
+        image_array (numpy.ndarray): 2-D uint8 array.
+        out (numpy.ndarray): uint8 array of the same shape for the result.
+        pool (processing.buffers.BufferPool): Unused, accepted like the other variants.
+
+    Returns:
+        numpy.ndarray: `out` (a new array if it is None).
+    """
+    check_gray(image_array)
+    out = output_array(out, image_array.shape)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Calculated Threshold: %d", int(image_array.sum(dtype=np.int64)) // image_array.size)
+    np.copyto(out, image_array)
+    return out
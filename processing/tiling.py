@@ -0,0 +1,225 @@
+import numpy as np
+from processing.channels import CHANNEL_WORKERS
+from processing.image_store import open_npy, open_tiff, scratch_array
+from processing.precision import accumulator
+from processing.progress import report_progress
+from processing.registry import OPERATIONS, get_operation
+
+def operation_halo(name, kwargs=None):
+    """
+    Margin an operation needs around a tile to give exact results.
+
+    Operations that depend on the whole image (global normalisation,
+    histograms, error diffusion) are not tileable in the registry and are
+    rejected.
+
+    Args:
+        name (str): Operation (function) name.
+        kwargs (dict): Parameters the operation will be called with.
+
+    Returns:
+        int: Halo width in pixels.
+    """
+    operation = get_operation(name)
+    if not operation.tileable:
+        raise ValueError(f"Operation {name!r} cannot be run on tiles")
+    return operation.neighbourhood(kwargs)
+
+
+def chain_halo(chain):
+    """Total halo of a chain of (function, kwargs) pairs."""
+    return sum(operation_halo(func.__name__, kwargs) for func, kwargs in chain)
+
+
+def chain_bytes_per_pixel(chain, bands=1):
+    """
+    Working memory per pixel of a tile while a chain runs on it.
+
+    Each step holds its input and output tiles plus its temporaries, in the
+    dtype the current precision setting gives its policy; per-channel
+    operations work on the colour channels concurrently, each with its own
+    temporaries.
+
+    Args:
+        chain (list): (function, kwargs) pairs applied in order.
+        bands (int): Bands of the input (an upper bound for every step).
+
+    Returns:
+        int: Bytes per pixel of the busiest step.
+    """
+    busiest = 0
+    for func, _ in chain:
+        operation = get_operation(func.__name__)
+        itemsize = np.dtype(accumulator(operation.precision)).itemsize if operation.precision else 1
+        # Alpha is passed through, so at most the three colour channels run at once
+        workers = min(bands, 3, CHANNEL_WORKERS) if operation.channels == "per-channel" else 1
+        busiest = max(busiest, 2 * bands + workers * operation.temporaries * itemsize)
+    return busiest
+
+
+def choose_tile_size(memory_limit, halo, bytes_per_pixel):
+    """
+    Largest square tile whose padded area fits in the memory limit.
+
+    Args:
+        memory_limit (int): Memory ceiling in bytes.
+        halo (int): Margin added on every side of a tile.
+        bytes_per_pixel (int): Working memory per pixel of the padded tile.
+
+    Returns:
+        int: Tile width and height in pixels.
+    """
+    side = int((memory_limit / bytes_per_pixel) ** 0.5) - 2 * halo
+    if side < 16:
+        raise ValueError("Memory limit too small for this chain")
+    return side
+
+
+def open_source(path):
+    """
+    Open an input image for tiled reading.
+
+    Only ``.npy`` files and uncompressed strip TIFFs are accepted: they are
+    memory mapped, so only the tiles being processed are read from disk.
+    Other formats would have to be decoded whole, which the memory limit of a
+    tiled run cannot allow.
+
+    Returns:
+        numpy.ndarray: Array of shape (height, width) or (height, width, bands).
+
+    Raises:
+        ValueError: If the file cannot be memory mapped.
+    """
+    hint = "convert it to .npy or an uncompressed TIFF first"
+    lower = path.lower()
+    if lower.endswith(".npy"):
+        return open_npy(path)
+    if lower.endswith((".tif", ".tiff")):
+        try:
+            return open_tiff(path)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}; {hint}") from None
+    raise ValueError(f"{path} cannot be read tile by tile (only .npy and uncompressed TIFF "
+                     f"inputs are memory mapped); {hint}")
+
+
+def _run_chain(tile, chain):
+    tile = np.ascontiguousarray(tile)
+    for func, kwargs in chain:
+        tile = func(tile, **kwargs)
+    return np.asarray(tile)
+
+
+def process_tiles(source, chain, tile_size, halo, output=None, output_path=None):
+    """
+    Run a chain of operations tile by tile.
+
+    Every tile is read with `halo` extra pixels on each side (clipped at the
+    image border, where the operators pad exactly as they do on a whole
+    image), processed, and only its interior is written out, so the result
+    matches whole-image processing.
+
+    Args:
+        source (numpy.ndarray): Input array (may be memory mapped).
+        chain (list): (function, kwargs) pairs applied in order.
+        tile_size (int): Width and height of the written tiles.
+        halo (int): Margin read around each tile.
+        output (numpy.ndarray): Array to write into; created on the first tile
+            if omitted.
+        output_path (str): If given and `output` is omitted, the output is
+            created as a memory-mapped ``.npy`` file at this path.
+
+    Returns:
+        numpy.ndarray: The output array.
+    """
+    height, width = source.shape[:2]
+    rows = range(0, height, tile_size)
+    cols = range(0, width, tile_size)
+    total = len(rows) * len(cols)
+    done = 0
+
+    for y0 in rows:
+        for x0 in cols:
+            report_progress(done / total)
+            y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+            top, left = max(y0 - halo, 0), max(x0 - halo, 0)
+            bottom, right = min(y1 + halo, height), min(x1 + halo, width)
+
+            result = _run_chain(source[top:bottom, left:right], chain)
+            interior = result[y0 - top:y1 - top, x0 - left:x1 - left]
+
+            if output is None:
+                shape = (height, width) + interior.shape[2:]
+                if output_path is not None:
+                    output = np.lib.format.open_memmap(output_path, mode="w+",
+                                                       dtype=interior.dtype, shape=shape)
+                else:
+                    output = np.empty(shape, dtype=interior.dtype)
+            output[y0:y1, x0:x1] = interior
+            done += 1
+
+    if isinstance(output, np.memmap):
+        output.flush()
+    return output
+
+
+def process_tiled(input_path, output_path, chain, memory_limit=512 * 1024 * 1024, tile_size=None):
+    """
+    Process an image that may not fit in memory, writing a ``.npy`` output.
+
+    Args:
+        input_path (str): ``.npy`` or uncompressed TIFF input, memory mapped
+            (see open_source).
+        output_path (str): Output ``.npy`` file (an ordinary row-major array,
+            memory mapped and filled in tile by tile).
+        chain (list): (function, kwargs) pairs applied in order.
+        memory_limit (int): Working memory ceiling in bytes, used to size tiles.
+        tile_size (int): Explicit tile size, overriding memory_limit.
+
+    Returns:
+        numpy.ndarray: The memory-mapped output.
+    """
+    if not output_path.lower().endswith(".npy"):
+        raise ValueError("Tiled output must be written to a .npy file")
+
+    halo = chain_halo(chain)
+    source = open_source(input_path)
+    if tile_size is None:
+        bands = source.shape[2] if source.ndim == 3 else 1
+        tile_size = choose_tile_size(memory_limit, halo, chain_bytes_per_pixel(chain, bands))
+
+    return process_tiles(source, chain, tile_size, halo, output_path=output_path)
+
+
+def run_chain_on_disk(source, chain, tile_size=1024, directory=None):
+    """
+    Run a chain of operations keeping every intermediate result in a scratch file.
+
+    Tileable operations are streamed tile by tile from the previous result
+    into the next scratch file; the others run on the whole array and their
+    result is moved to a scratch file right away.
+
+    Args:
+        source (numpy.ndarray): Input array (may be memory mapped).
+        chain (list): (function, kwargs) pairs applied in order.
+        tile_size (int): Tile size for tileable operations.
+        directory (str): Where to create scratch files (default: system temp dir).
+
+    Returns:
+        numpy.memmap: The final result, backed by a scratch file.
+    """
+    current = source
+    for func, kwargs in chain:
+        operation = OPERATIONS.get(func.__name__)
+        if operation is not None and operation.tileable:
+            halo = operation_halo(func.__name__, kwargs)
+            probe = _run_chain(current[:1, :1], [(func, kwargs)])
+            output = scratch_array(current.shape[:2] + probe.shape[2:], probe.dtype, directory)
+            process_tiles(current, [(func, kwargs)], tile_size, halo, output=output)
+        else:
+            result = np.asarray(func(current, **kwargs))
+            output = scratch_array(result.shape, result.dtype, directory)
+            output[...] = result
+            del result
+        current = output
+    return current
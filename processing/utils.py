@@ -0,0 +1,199 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageMode
+from processing.profiling import count_conversion
+
+# Number of results derived from images (grayscale planes, histograms) that
+# are kept while the images exist
+PLANE_CACHE_SIZE = 32
+_PLANE_CACHE = OrderedDict()
+# Used from the GUI worker and the channel threads at the same time
+_plane_lock = threading.Lock()
+# (key, weakref) of collected images; the weakref callbacks can run in any
+# thread, even one holding the lock, so they only append here
+_collected = []
+
+
+def image_digest(image):
+    """
+    Content hash of an image, used as a key by the caches in this package.
+
+    Two images with the same mode, size and pixels get the same digest,
+    whatever object holds them.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The image to hash.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(image, np.ndarray):
+        digest.update(f"array:{image.dtype.str}:{image.shape}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+    else:
+        digest.update(f"image:{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def cached_plane(image, kind, compute):
+    """
+    A result derived from a PIL image, computed once per image object.
+
+    Lets the many operations that reduce their input to grayscale share one
+    conversion, and the histogram users share one count. Images are treated
+    as immutable, as everywhere in this package; the entry of a garbage
+    collected image is dropped on the next call. Safe to call from several
+    threads.
+
+    Args:
+        image (PIL.Image.Image): The source image.
+        kind (str): What is derived, e.g. "L" or "histogram".
+        compute (callable): Computes it from the image on a miss.
+
+    Returns:
+        The (shared) result of ``compute(image)``.
+    """
+    key = (id(image), kind)
+    with _plane_lock:
+        _drop_collected()
+        entry = _PLANE_CACHE.get(key)
+        if entry is not None and entry[0]() is image:
+            _PLANE_CACHE.move_to_end(key)
+            return entry[1]
+
+    plane = compute(image)
+    reference = weakref.ref(image, lambda reference: _collected.append((key, reference)))
+    with _plane_lock:
+        _PLANE_CACHE[key] = (reference, plane)
+        while len(_PLANE_CACHE) > PLANE_CACHE_SIZE:
+            _PLANE_CACHE.popitem(last=False)
+    return plane
+
+
+def _drop_collected():
+    """Remove the entries of collected images (with the lock held)."""
+    while _collected:
+        key, reference = _collected.pop()
+        entry = _PLANE_CACHE.get(key)
+        # The id may already belong to a newer image
+        if entry is not None and entry[0] is reference:
+            del _PLANE_CACHE[key]
+
+
+def clear_plane_cache():
+    """Forget every cached plane (e.g. between benchmark repetitions)."""
+    with _plane_lock:
+        _PLANE_CACHE.clear()
+        _collected.clear()
+
+
+def _convert_to_l(image):
+    count_conversion("mode")
+    return image.convert('L')
+
+
+def luminance(image_array):
+    """
+    Grayscale plane of an RGB(A) array, computed exactly as PIL's convert('L').
+
+    Args:
+        image_array (numpy.ndarray): uint8 array of shape (height, width, bands).
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, width).
+    """
+    if image_array.shape[2] < 3:
+        return np.ascontiguousarray(image_array[:, :, 0])
+    # ITU-R 601-2 weights in 16-bit fixed point, rounded (as PIL does)
+    r = image_array[:, :, 0].astype(np.uint32)
+    gray = r * 19595
+    gray += image_array[:, :, 1] * np.uint32(38470)
+    gray += image_array[:, :, 2] * np.uint32(7471)
+    gray += 0x8000
+    gray >>= 16
+    return gray.astype(np.uint8)
+
+
+def ensure_grayscale(image):
+    """
+    Grayscale version of an image, keeping its type.
+
+    PIL images are converted to mode 'L' once, and the result is shared by
+    later calls on the same image; arrays (including memory-mapped ones) are
+    used as they are when 2-D and reduced to luminance otherwise, without
+    going through PIL.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: The grayscale image.
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return image
+        count_conversion("mode")
+        return luminance(image)
+    if image.mode != 'L':
+        return cached_plane(image, "L", _convert_to_l)
+    return image
+
+
+def as_array(image, dtype=None):
+    """
+    Pixels of an image as a NumPy array.
+
+    Arrays are returned without a copy when they already have the dtype.
+
+    Args:
+        image (PIL.Image.Image or numpy.ndarray): The input image.
+        dtype: Requested dtype (default: keep).
+
+    Returns:
+        numpy.ndarray: The pixel array.
+    """
+    if isinstance(image, np.ndarray):
+        return np.asarray(image, dtype=dtype)
+    count_conversion("to_array")
+    return np.array(image, dtype=dtype)
+
+
+def raw_nbytes(image):
+    """
+    Memory taken by the pixels of an image: len(image.tobytes()) for PIL
+    images, without making the copy, and nbytes for arrays.
+    """
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    width, height = image.size
+    if image.mode == "1":
+        # One bit per pixel, every row padded to whole bytes
+        return (width + 7) // 8 * height
+    mode = ImageMode.getmode(image.mode)
+    # typestr is e.g. "|u1", "<u2" or "<f4": the last digits are bytes per band
+    return int(mode.typestr[2:]) * len(mode.bands) * width * height
+
+
+def like_input(result, image, mode=None):
+    """
+    Return an operation result in the same form as its input.
+
+    Args:
+        result (numpy.ndarray): The computed pixels.
+        image (PIL.Image.Image or numpy.ndarray): The operation's input.
+        mode (str): PIL mode of the result, if it cannot be inferred.
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: An array for array input, an
+        image otherwise.
+    """
+    if isinstance(image, np.ndarray):
+        return result
+    count_conversion("to_image")
+    return Image.fromarray(result, mode) if mode else Image.fromarray(result)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from processing.histogram_based_segmentation import adaptive_segmentation, adaptive_threshold
+
+
+def _brute_force_thresholds(image, window_size, method, c, k, r):
+    padded = np.pad(image.astype(np.float64), window_size // 2, mode="reflect")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (window_size, window_size))
+    windows = windows[:image.shape[0], :image.shape[1]]
+    mean = windows.mean(axis=(2, 3))
+    std = windows.std(axis=(2, 3))
+    if method == "mean":
+        return mean - c
+    if method == "niblack":
+        return mean - k * std
+    return mean * (1 + k * (std / r - 1))
+
+
+@pytest.mark.parametrize("method, c, k, r", [("mean", 0.0, 0.2, 128.0), ("mean", 5.5, 0.2, 128.0),
+                                            ("niblack", 0.0, -0.2, 128.0), ("sauvola", 0.0, 0.2, 128.0),
+                                            ("sauvola", 0.0, 0.5, 64.0)])
+@pytest.mark.parametrize("window_size", [1, 4, 5, 15])
+def test_adaptive_threshold_matches_brute_force(method, c, k, r, window_size):
+    image = np.random.default_rng(window_size).integers(0, 256, (20, 23), dtype=np.uint8)
+    threshold = _brute_force_thresholds(image, window_size, method, c, k, r)
+    result = adaptive_threshold(image, window_size, method, c, k, r)
+    expected = np.where(image > threshold, 255, 0)
+    # The mean method compares integers exactly; the others work in float32,
+    # so pixels within rounding of their threshold may land on either side
+    clear = np.abs(image - threshold) > 1e-3 if method != "mean" else np.ones(image.shape, bool)
+    assert set(np.unique(result)) <= {0, 255}
+    np.testing.assert_array_equal(result[clear], expected[clear])
+
+
+def test_adaptive_segmentation_is_the_mean_method():
+    image = np.random.default_rng(0).integers(0, 256, (18, 21), dtype=np.uint8)
+    expected = np.where(image > _brute_force_thresholds(image, 6, "mean", 0.0, 0.0, 1.0), 255, 0)
+    np.testing.assert_array_equal(adaptive_segmentation(image, block_size=6), expected)
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        adaptive_threshold(np.zeros((4, 4), np.uint8), method="bernsen")
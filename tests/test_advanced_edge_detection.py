@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from processing.advanced_edge_detection import difference_operator, homogeneity_operator
+
+
+def _brute_force(image, offsets, combine):
+    height, width = image.shape
+    values = np.zeros((height, width), dtype=np.float64)
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            values[y, x] = combine([abs(int(image[y, x]) - int(image[y + dy, x + dx])) for dy, dx in offsets])
+    if values.max() == values.min():
+        return np.zeros_like(image)
+    return np.uint8(255 * (values - values.min()) / (values.max() - values.min()))
+
+
+@pytest.mark.parametrize("shape", [(17, 23), (3, 3), (2, 9)])
+def test_neighbour_operators_match_brute_force(shape):
+    image = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    eight = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)]
+    four = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    np.testing.assert_array_equal(homogeneity_operator(image), _brute_force(image, eight, max))
+    np.testing.assert_array_equal(difference_operator(image),
+                                  _brute_force(image, four, lambda d: sum(d) // len(d)))
@@ -0,0 +1,93 @@
+import queue
+import threading
+
+from app import ImageProcessingApp
+
+
+class _Recorder:
+    """Stands in for the Tk widgets and root the worker code talks to."""
+
+    def __init__(self):
+        self.scheduled = []
+        self.text = None
+
+    def after(self, delay, func, *args):
+        self.scheduled.append((func, args))
+
+    def config(self, **options):
+        pass
+
+    def set(self, text):
+        self.text = text
+
+    def run_scheduled(self):
+        calls, self.scheduled = self.scheduled, []
+        for func, args in calls:
+            func(*args)
+
+
+def _app(release, kind="cancelled"):
+    app = ImageProcessingApp.__new__(ImageProcessingApp)
+    app.root = app.cancel_button = app.status_var = _Recorder()
+    app.worker = app.cancel_token = app.pending = app.after_materialize = None
+    app.worker_queue = queue.Queue()
+    app.processed_image = None
+    app.display_image = lambda image, frame: None
+    app.processed_frame = None
+
+    # Stands in for an operation that only notices a cancel once `release` is set
+    def run_operation(func, image, preview, token, name=None, params=None):
+        release.wait()
+        app.worker_queue.put((token, kind, None))
+    app.run_operation = run_operation
+    return app
+
+
+def test_cancelled_worker_blocks_new_jobs_until_it_exits():
+    release = threading.Event()
+    app = _app(release)
+    app.start_worker(None)
+    thread = app.worker
+    app.cancel_operation()
+    assert app.worker is thread
+    assert app.worker_busy()
+    assert app.status_var.text == "Waiting for the cancelled operation to stop"
+
+    # The polling chain keeps going while the thread is alive
+    app.root.run_scheduled()
+    assert len(app.root.scheduled) == 1
+
+    release.set()
+    thread.join()
+    app.root.run_scheduled()
+    assert app.root.scheduled == []
+    assert app.worker is None
+    assert not app.worker_busy()
+    assert app.status_var.text == "Operation cancelled"
+
+
+def test_result_of_cancelled_worker_is_dropped():
+    release = threading.Event()
+    app = _app(release, kind="done")
+    app.start_worker(None)
+    thread = app.worker
+    app.cancel_operation()
+    release.set()
+    thread.join()
+    app.root.run_scheduled()
+    assert app.worker is None
+    assert app.processed_image is None
+    assert app.status_var.text == "Operation cancelled"
+
+
+def test_operations_with_defaulted_parameters_ask_for_them():
+    from processing.registry import OPERATIONS
+
+    app = ImageProcessingApp.__new__(ImageProcessingApp)
+    asked, run = [], []
+    app.ask_parameters = asked.append
+    app.process_image = run.append
+    app.request_operation(OPERATIONS["error_diffusion_halftoning"])
+    app.request_operation(OPERATIONS["invert_image"])
+    assert [operation.name for operation in asked] == ["error_diffusion_halftoning"]
+    assert [operation.name for operation in run] == ["invert_image"]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmark import BENCHMARK_KWARGS, synthetic_image
+from processing.buffers import BufferPool
+from processing.registry import OPERATIONS
+
+ARRAY_OPERATIONS = sorted(name for name, operation in OPERATIONS.items()
+                          if operation.array_function is not None)
+
+
+def test_every_image_operation_has_an_array_variant():
+    assert sorted(set(OPERATIONS) - set(ARRAY_OPERATIONS)) == ["show_histogram"]
+
+
+@pytest.mark.parametrize("name", ARRAY_OPERATIONS)
+def test_array_variant_matches_function(name, capsys):
+    operation = OPERATIONS[name]
+    kwargs = BENCHMARK_KWARGS.get(name, {})
+    image = synthetic_image("L", 96)
+    expected = np.asarray(operation(image, **kwargs))
+    if expected.dtype == bool:
+        expected = expected.astype(np.uint8) * 255
+
+    pool = BufferPool()
+    out = np.empty((96, 96), np.uint8)
+    capsys.readouterr()
+    for _ in range(2):
+        result = operation.call_array(np.asarray(image), out=out, pool=pool, **kwargs)
+        assert result is out
+        np.testing.assert_array_equal(result, expected)
+    # Variants run once per frame or tile, so they must not print
+    assert capsys.readouterr().out == ""
+
+
+def test_pool_is_reused_across_frames():
+    pool = BufferPool()
+    gray = np.empty((64, 80), np.uint8)
+    edges = np.empty_like(gray)
+    frames = [np.asarray(synthetic_image("RGB", 80, seed))[:64] for seed in range(3)]
+    counts = []
+    for frame in frames:
+        OPERATIONS["convert_to_grayscale"].call_array(frame, out=gray, pool=pool)
+        OPERATIONS["apply_sobel"].call_array(gray, out=edges, pool=pool)
+        OPERATIONS["apply_median"].call_array(edges, out=gray, pool=pool, size=4)
+        counts.append(pool.allocations)
+    assert counts[0] == counts[-1]
+
+
+def test_out_must_match_the_result():
+    with pytest.raises(ValueError):
+        OPERATIONS["apply_sobel"].call_array(np.zeros((8, 8), np.uint8), out=np.empty((8, 9), np.uint8))
@@ -0,0 +1,26 @@
+import numpy as np
+from PIL import Image
+
+import batch
+
+
+def test_cache_dir_is_rejected_for_tiled_runs(tmp_path, capsys):
+    source = tmp_path / "in.png"
+    Image.fromarray(np.zeros((8, 8), np.uint8)).save(source)
+    status = batch.main([str(source), "-o", str(tmp_path / "out"), "--op", "invert_image",
+                         "--memory-limit", "16", "--cache-dir", str(tmp_path / "cache")])
+    assert status == 2
+    assert "--cache-dir" in capsys.readouterr().err
+    assert not (tmp_path / "out").exists()
+
+
+def test_cached_run_reports_hits(tmp_path, capsys):
+    source = tmp_path / "in.png"
+    Image.fromarray(np.arange(64, dtype=np.uint8).reshape(8, 8)).save(source)
+    argv = [str(source), "-o", str(tmp_path / "out"), "--op", "invert_image", "-j", "1",
+            "--cache-dir", str(tmp_path / "cache")]
+    assert batch.main(argv) == 0
+    assert batch.main(argv) == 0
+    assert "Cache: 1 hits, 0 misses" in capsys.readouterr().out
+    result = np.asarray(Image.open(tmp_path / "out" / "in.png"))
+    np.testing.assert_array_equal(result, 255 - np.arange(64, dtype=np.uint8).reshape(8, 8))
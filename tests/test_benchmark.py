@@ -0,0 +1,23 @@
+import json
+
+import benchmark
+
+
+def _record(seconds, precision):
+    return {"operation": "apply_sobel", "mode": "L", "size": 256, "seconds": seconds,
+            "mp_per_sec": 1.0, "peak_rss_mb": None, "precision": precision}
+
+
+def test_cases_at_different_precisions_are_not_compared():
+    regressions = benchmark.compare_results([_record(1.0, "float64")], [_record(0.1, "policy")], 0.1)
+    assert regressions == []
+    regressions = benchmark.compare_results([_record(1.0, "policy")], [_record(0.1, "policy")], 0.1)
+    assert len(regressions) == 1
+
+
+def test_baseline_with_other_precision_is_refused(tmp_path, capsys):
+    current, baseline = tmp_path / "current.json", tmp_path / "baseline.json"
+    current.write_text(json.dumps({"results": [_record(1.0, "float64")]}))
+    baseline.write_text(json.dumps({"results": [_record(1.0, "policy")]}))
+    assert benchmark.main(["--load", str(current), "--baseline", str(baseline)]) == 2
+    assert "--precision" in capsys.readouterr().err
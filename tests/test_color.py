@@ -0,0 +1,27 @@
+import numpy as np
+from PIL import Image
+
+from processing.color import convert_to_grayscale
+
+
+def _reference(rgb):
+    r, g, b = (rgb[..., c].astype(np.float64) for c in range(3))
+    return (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
+
+
+def test_every_red_green_pair_matches_the_float_formula():
+    r, g = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+    for b in (0, 1, 127, 254, 255):
+        rgb = np.stack([r, g, np.full_like(r, b)], axis=-1).astype(np.uint8)
+        expected = _reference(rgb)
+        np.testing.assert_array_equal(convert_to_grayscale(rgb), expected)
+        np.testing.assert_array_equal(np.asarray(convert_to_grayscale(Image.fromarray(rgb))), expected)
+
+
+def test_other_modes_go_through_rgb():
+    rgb = np.random.default_rng(0).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    image = Image.fromarray(rgb).convert("P")
+    expected = _reference(np.asarray(image.convert("RGB")))
+    np.testing.assert_array_equal(np.asarray(convert_to_grayscale(image)), expected)
+    gray = np.asarray(Image.fromarray(rgb).convert("L"))
+    np.testing.assert_array_equal(convert_to_grayscale(gray), _reference(np.dstack([gray] * 3)))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from processing.error_diffusion import DIFFUSION_KERNELS, error_diffusion, error_diffusion_image
+
+
+def _brute_force(image, threshold, kernel, serpentine):
+    """Pixel-by-pixel error diffusion over a whole float copy of the image."""
+    values = image.astype(np.float64)
+    height, width = values.shape
+    bits = np.zeros((height, width), dtype=np.uint8)
+    for y in range(height):
+        reverse = serpentine and y % 2 == 1
+        direction = -1 if reverse else 1
+        for x in (range(width - 1, -1, -1) if reverse else range(width)):
+            old_pixel = values[y, x]
+            bits[y, x] = old_pixel >= threshold
+            error = old_pixel - 255 * bits[y, x]
+            for dx, dy, weight in DIFFUSION_KERNELS[kernel]:
+                nx, ny = x + dx * direction, y + dy
+                if 0 <= nx < width and ny < height:
+                    values[ny, nx] += error * weight
+    return bits
+
+
+@pytest.mark.parametrize("kernel", sorted(DIFFUSION_KERNELS))
+@pytest.mark.parametrize("serpentine", [False, True])
+@pytest.mark.parametrize("shape", [(12, 19), (2, 3), (1, 9)])
+def test_error_diffusion_matches_brute_force(kernel, serpentine, shape):
+    image = np.random.default_rng(3).integers(0, 256, shape, dtype=np.uint8)
+    expected = _brute_force(image, 128, kernel, serpentine)
+    packed = error_diffusion(image, 128, kernel, serpentine)
+    np.testing.assert_array_equal(np.unpackbits(packed, axis=1, count=shape[1]), expected)
+    result = error_diffusion_image(image, 100, kernel, serpentine)
+    np.testing.assert_array_equal(np.asarray(result), _brute_force(image, 100, kernel, serpentine).astype(bool))
+
+
+def test_unknown_kernel_is_rejected():
+    with pytest.raises(ValueError):
+        error_diffusion(np.zeros((2, 2), np.uint8), kernel="bayer")
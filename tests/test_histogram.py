@@ -0,0 +1,19 @@
+import numpy as np
+from PIL import Image
+
+from processing.histogram import calculate_histogram, channel_histograms
+
+
+def test_histograms_are_shared_per_image():
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (32, 48, 3), dtype=np.uint8))
+    histogram = calculate_histogram(image)
+    assert np.shares_memory(calculate_histogram(image), histogram)
+    assert channel_histograms(image) is channel_histograms(image)
+    np.testing.assert_array_equal(histogram, image.convert("L").histogram())
+
+
+def test_array_histograms_follow_the_pixels():
+    array = np.zeros((4, 4), dtype=np.uint8)
+    assert calculate_histogram(array)[0] == 16
+    array[0, 0] = 7
+    assert calculate_histogram(array)[7] == 1
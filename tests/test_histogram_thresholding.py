@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from processing.histogram_thresholding import kapur_threshold, multi_otsu_thresholds, otsu_threshold
+
+LEVELS = np.arange(256)
+
+
+def _classes(histogram, thresholds):
+    """Pixel counts and value sums of the classes split by the thresholds (v <= t goes below)."""
+    edges = [0] + [t + 1 for t in thresholds] + [256]
+    return [(histogram[a:b].sum(), (histogram[a:b] * LEVELS[a:b]).sum()) for a, b in zip(edges, edges[1:])]
+
+
+def _otsu_score(histogram, thresholds):
+    """Between-class variance up to constant terms; None if a class is empty."""
+    classes = _classes(histogram, thresholds)
+    if any(count == 0 for count, _ in classes):
+        return None
+    return sum(total * total / count for count, total in classes)
+
+
+def _kapur_score(histogram, t):
+    p = histogram / histogram.sum()
+    score = 0.0
+    for part in (p[:t + 1], p[t + 1:]):
+        weight = part.sum()
+        if weight == 0:
+            return None
+        q = part[part > 0] / weight
+        score -= (q * np.log(q)).sum()
+    return score
+
+
+def _histogram(seed, distinct):
+    rng = np.random.default_rng(seed)
+    histogram = np.zeros(256, dtype=np.int64)
+    histogram[rng.choice(256, distinct, replace=False)] = rng.integers(1, 500, distinct)
+    return histogram
+
+
+def _best(scores):
+    return max(score for score in scores if score is not None)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_otsu_and_kapur_match_brute_force(seed):
+    histogram = _histogram(seed, 40)
+    best = _best(_otsu_score(histogram, [t]) for t in range(255))
+    assert _otsu_score(histogram, [otsu_threshold(histogram)]) == pytest.approx(best)
+    best = _best(_kapur_score(histogram, t) for t in range(255))
+    assert _kapur_score(histogram, kapur_threshold(histogram)) == pytest.approx(best)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("classes", [2, 3, 4])
+def test_multi_otsu_matches_brute_force(seed, classes):
+    histogram = _histogram(seed, 12)
+    values = np.flatnonzero(histogram)
+    # Any threshold between two neighbouring values gives the same classes
+    candidates = itertools.combinations(values[:-1].tolist(), classes - 1)
+    best = _best(_otsu_score(histogram, list(split)) for split in candidates)
+    thresholds = multi_otsu_thresholds(histogram, classes)
+    assert len(thresholds) == classes - 1
+    assert thresholds == sorted(thresholds)
+    assert _otsu_score(histogram, thresholds) == pytest.approx(best)
+    if classes == 2:
+        assert _otsu_score(histogram, thresholds) == pytest.approx(_otsu_score(histogram, [otsu_threshold(histogram)]))
+
+
+def test_multi_otsu_needs_enough_values():
+    with pytest.raises(ValueError):
+        multi_otsu_thresholds(_histogram(0, 2), classes=3)
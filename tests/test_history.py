@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from processing.history import ImageHistory, _Snapshot
+
+
+@pytest.mark.parametrize("mode", ["1", "L", "P", "LA", "RGB", "RGBA", "I", "F", "I;16"])
+def test_snapshot_size_matches_raw_bytes(mode):
+    image = Image.new(mode, (13, 5))
+    assert _Snapshot(image).nbytes == len(image.tobytes())
+
+
+def _noise(seed):
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 256, (50, 50), dtype=np.uint8))
+
+
+def test_budget_takes_bottoms_of_both_stacks_in_turn():
+    history = ImageHistory(byte_budget=10 ** 9)
+    current = _noise(0)
+    for seed in range(1, 9):
+        history.push(current)
+        current = _noise(seed)
+    for _ in range(4):
+        current = history.undo(current)
+
+    # Noise does not compress, so every state holds about the same bytes
+    history.byte_budget = history.nbytes // 2
+    history._enforce_budget()
+    spilled = [snapshot.path is not None for snapshot in history._undo + history._redo]
+    assert spilled == [True, True, False, False] * 2
+    assert history.nbytes <= history.byte_budget
+
+    for _ in range(4):
+        current = history.redo(current)
+    np.testing.assert_array_equal(np.asarray(current), np.asarray(_noise(8)))
+    history.clear()
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from processing import local_statistics
+from processing.local_statistics import local_max, local_mean, local_min, local_variance, window_sums
+
+
+def _windows(image, kernel_size):
+    """Every kernel_size x kernel_size window of the reflect-padded image, as (H, W, k, k)."""
+    padded = np.pad(image, kernel_size // 2, mode="reflect")
+    return np.lib.stride_tricks.sliding_window_view(padded, (kernel_size, kernel_size))[
+        :image.shape[0], :image.shape[1]]
+
+
+@pytest.mark.parametrize("shape", [(11, 14), (3, 5), (1, 6)])
+@pytest.mark.parametrize("kernel_size", [1, 2, 3, 4, 5, 8])
+@pytest.mark.parametrize("dtype", [np.uint8, np.float64])
+def test_window_statistics_match_brute_force(monkeypatch, shape, kernel_size, dtype):
+    # Small stripes, so the stripe seams are exercised too
+    monkeypatch.setattr(local_statistics, "SUM_STRIPE_ROWS", 4)
+    image = np.random.default_rng(0).integers(0, 256, shape).astype(dtype)
+    windows = _windows(image, kernel_size).astype(np.float64)
+
+    np.testing.assert_array_equal(window_sums(image, kernel_size), windows.sum(axis=(2, 3)))
+    np.testing.assert_array_equal(window_sums(image, kernel_size, squared=True),
+                                  (windows ** 2).sum(axis=(2, 3)))
+    np.testing.assert_allclose(local_mean(image, kernel_size), windows.mean(axis=(2, 3)))
+    np.testing.assert_allclose(local_variance(image, kernel_size), windows.var(axis=(2, 3)),
+                               atol=1e-9)
+    np.testing.assert_array_equal(local_min(image, kernel_size), windows.min(axis=(2, 3)))
+    np.testing.assert_array_equal(local_max(image, kernel_size), windows.max(axis=(2, 3)))
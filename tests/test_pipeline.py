@@ -0,0 +1,18 @@
+import numpy as np
+
+from processing.pipeline import LazyImage
+
+
+def test_compute_leaves_source_array_writeable():
+    source = np.arange(48, dtype=np.uint8).reshape(6, 8)
+    # calculate_threshold returns its input unchanged
+    result = LazyImage(source).then("calculate_threshold").compute()
+    assert source.flags.writeable
+    assert not result.flags.writeable
+    np.testing.assert_array_equal(result, source)
+
+
+def test_merged_point_operations_match_eager_run():
+    source = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    result = LazyImage(source).then("invert_image").then("manual_segmentation", threshold=100).compute()
+    np.testing.assert_array_equal(result, np.where(255 - source > 100, 255, 0))
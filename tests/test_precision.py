@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from benchmark import ACCURACY_TOLERANCE, BENCHMARK_KWARGS, synthetic_image
+from processing.precision import accumulator, precision
+from processing.registry import OPERATIONS
+
+POLICY_OPERATIONS = sorted(name for name, operation in OPERATIONS.items()
+                           if operation.precision is not None)
+
+
+def test_policies_cover_filters_and_edge_operators():
+    policies = {name: OPERATIONS[name].precision for name in POLICY_OPERATIONS}
+    for name in ("apply_sobel", "apply_prewitt", "apply_kirsch", "apply_highpass"):
+        assert policies[name] == "integer"
+    for name in ("apply_lowpass", "difference_of_gaussians"):
+        assert policies[name] == "float32"
+    assert accumulator("integer") is np.int16
+    assert accumulator("float32") is np.float32
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB"])
+@pytest.mark.parametrize("name", POLICY_OPERATIONS)
+def test_policy_within_one_gray_level_of_float64(name, mode):
+    operation = OPERATIONS[name]
+    kwargs = operation.bind_arguments(BENCHMARK_KWARGS.get(name, {}))
+    image = synthetic_image(mode, 256)
+    with precision("float64"):
+        reference = np.asarray(operation(image, **kwargs), dtype=np.int16)
+    result = np.asarray(operation(image, **kwargs), dtype=np.int16)
+    assert np.abs(result - reference).max() <= ACCURACY_TOLERANCE
+    if operation.precision == "integer":
+        # Integer accumulation of 8-bit data is exact
+        np.testing.assert_array_equal(result, reference)
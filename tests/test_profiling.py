@@ -0,0 +1,32 @@
+import numpy as np
+
+from processing.channels import apply_per_channel
+from processing.profiling import Profiler, count_conversion
+
+
+def test_nested_measure_keeps_outer_peak():
+    profiler = Profiler(trace_memory=True)
+    with profiler.measure("outer"):
+        block = np.ones(4_000_000, dtype=np.uint8)
+        del block
+        with profiler.measure("inner"):
+            pass
+    inner, outer = profiler.records
+    assert outer["name"] == "outer"
+    assert outer["peak_bytes"] >= 4_000_000
+    assert inner["peak_bytes"] < 4_000_000
+
+
+def test_conversions_in_channel_threads_are_counted():
+    def plane_op(plane):
+        count_conversion("mode")
+        return plane
+
+    profiler = Profiler(trace_memory=False)
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    with profiler.measure("outer"):
+        with profiler.measure("per_channel"):
+            apply_per_channel(plane_op, image)
+    inner, outer = profiler.records
+    assert inner["conversions"] == {"mode": 3}
+    assert outer["conversions"] == {"mode": 3}
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from processing.convolution import convolve, gaussian_kernel
+from processing.local_statistics import local_max, window_sums
+from processing.point_ops import apply_lut_array, invert_lut
+from processing.progress import CancelToken, OperationCancelled, progress_context
+
+_IMAGE = np.random.default_rng(0).integers(0, 256, (600, 300), dtype=np.uint8)
+
+_ENGINES = {
+    "separable": lambda: convolve(_IMAGE, gaussian_kernel(5, 1.0)),
+    "direct": lambda: convolve(_IMAGE, np.arange(9).reshape(3, 3), dtype=np.int32),
+    "fft": lambda: convolve(_IMAGE, np.ones((31, 31)) / 961),
+    "window_sums": lambda: window_sums(_IMAGE, 5),
+    "running_extreme": lambda: local_max(_IMAGE, 5),
+    "lut": lambda: apply_lut_array(_IMAGE, invert_lut()),
+}
+
+
+@pytest.mark.parametrize("name", _ENGINES)
+def test_engines_report_progress(name):
+    fractions = []
+    with progress_context(fractions.append):
+        _ENGINES[name]()
+    assert fractions
+    assert all(0 <= fraction <= 1 for fraction in fractions)
+
+
+@pytest.mark.parametrize("name", _ENGINES)
+def test_engines_stop_when_cancelled(name):
+    token = CancelToken()
+    token.cancel()
+    with progress_context(None, token), pytest.raises(OperationCancelled):
+        _ENGINES[name]()
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from processing.rank_filter import median_filter, percentile_rank, rank_filter
+
+
+def _windows(image, size):
+    padded = np.pad(image, size // 2, mode="reflect")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (size, size))
+    return np.sort(windows[:image.shape[0], :image.shape[1]].reshape(*image.shape, -1), axis=-1)
+
+
+@pytest.mark.parametrize("shape", [(13, 17), (4, 6)])
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5, 7])
+def test_rank_filter_matches_brute_force(shape, size):
+    image = np.random.default_rng(size).integers(0, 256, shape, dtype=np.uint8)
+    windows = _windows(image, size)
+    for percentile in (0, 10, 50, 73.5, 100):
+        expected = windows[..., percentile_rank(size, percentile)]
+        np.testing.assert_array_equal(rank_filter(image, size, percentile), expected)
+
+    expected = np.median(windows, axis=-1).astype(np.uint8)
+    np.testing.assert_array_equal(median_filter(image, size), expected)
+
+
+def test_rank_filter_handles_flat_and_extreme_values():
+    image = np.zeros((9, 9), dtype=np.uint8)
+    image[::2, ::3] = 255
+    windows = _windows(image, 3)
+    np.testing.assert_array_equal(median_filter(image, 3), np.median(windows, axis=-1).astype(np.uint8))
+    np.testing.assert_array_equal(rank_filter(image, 3, 100), windows[..., -1])
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+
+from processing.result_cache import ResultCache
+
+
+def _disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def test_overwriting_an_entry_keeps_disk_total_exact(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    value = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    cache.put("other", value + 1)  # First write counts what is on disk
+    for _ in range(3):
+        cache.put("key", value)
+    assert cache._disk_bytes == _disk_usage(tmp_path)
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    value = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    ResultCache(directory=str(tmp_path)).put("key", value)
+    cache = ResultCache(directory=str(tmp_path))
+    np.testing.assert_array_equal(cache.get("key"), value)
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_memory_total_follows_the_image_mode():
+    from PIL import Image
+
+    cache = ResultCache()
+    cache.put("float", Image.new("F", (10, 4)))
+    assert cache.nbytes == 4 * 10 * 4
+    cache.put("bits", Image.new("1", (10, 4)))
+    assert cache.nbytes == 4 * 10 * 4 + 2 * 4
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+from benchmark import STARTUP_TARGET, measure_startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_imports_within_target():
+    seconds, _ = measure_startup(runs=3)
+    assert seconds < STARTUP_TARGET, f"import app took {seconds * 1000:.0f} ms"
+
+
+def test_app_import_does_not_load_matplotlib():
+    # matplotlib is only needed once a histogram is shown
+    script = "import sys, app; print('matplotlib' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "False"
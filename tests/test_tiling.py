@@ -0,0 +1,85 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from processing import tiling
+from processing.precision import precision
+from processing.registry import OPERATIONS
+
+TILEABLE = [operation for operation in OPERATIONS.values()
+            if operation.tileable and not operation.name.endswith("_and_copy")]
+# Allowance for allocations that do not grow with the tile (lookup tables, histograms)
+FIXED_BYTES = 256 * 1024
+ARGUMENTS = {"manual_segmentation": {"threshold": 100}, "edge_detection": {"method": "kirsch"}}
+
+
+@pytest.mark.parametrize("setting", ["policy", "float64"])
+@pytest.mark.parametrize("operation", TILEABLE, ids=lambda operation: operation.name)
+def test_estimate_covers_measured_peak(operation, setting):
+    bands = 1 if operation.modes[0] == "L" else 3
+    shape = (512, 512, 3) if bands == 3 else (512, 512)
+    tile = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    kwargs = ARGUMENTS.get(operation.name, {})
+    with precision(setting):
+        operation(tile, **kwargs)
+        tracemalloc.start()
+        try:
+            operation(tile, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        estimate = tiling.chain_bytes_per_pixel([(operation.function, kwargs)], bands)
+    assert peak <= estimate * tile.shape[0] * tile.shape[1] + FIXED_BYTES
+
+
+def test_estimate_follows_precision_and_channels(monkeypatch):
+    chain = [(OPERATIONS["apply_kirsch"].function, {})]
+    with precision("float64"):
+        gray = tiling.chain_bytes_per_pixel(chain)
+        monkeypatch.setattr(tiling, "CHANNEL_WORKERS", 3)
+        colour = tiling.chain_bytes_per_pixel(chain, bands=3)
+    # Input and output tiles plus five float64 temporaries per channel
+    assert gray == 2 + 5 * 8
+    assert colour == 6 + 3 * 5 * 8
+    assert tiling.chain_bytes_per_pixel(chain) == 2 + 5 * 2
+
+
+@pytest.mark.parametrize("name, options", [("in.png", {}), ("in.tif", {"compression": "tiff_deflate"})])
+def test_inputs_that_cannot_be_mapped_are_rejected(tmp_path, name, options):
+    path = str(tmp_path / name)
+    Image.fromarray(np.zeros((8, 8), np.uint8)).save(path, **options)
+    with pytest.raises(ValueError, match="convert it to .npy"):
+        tiling.process_tiled(path, str(tmp_path / "out.npy"), [(OPERATIONS["invert_image"].function, {})])
+
+
+def _source(operation):
+    shape = (45, 61) if operation.modes[0] == "L" else (45, 61, 3)
+    return np.random.default_rng(1).integers(0, 256, shape, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("operation", TILEABLE, ids=lambda operation: operation.name)
+def test_tiles_match_whole_image(operation):
+    source = _source(operation)
+    kwargs = ARGUMENTS.get(operation.name, {})
+    chain = [(operation.function, kwargs)]
+    expected = np.asarray(operation.function(source, **kwargs))
+    # Small tiles, so every seam and every border is crossed
+    result = tiling.process_tiles(source, chain, 8, tiling.chain_halo(chain))
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(tiling.run_chain_on_disk(source, chain, tile_size=8), expected)
+
+
+def test_tiled_chain_matches_whole_image(tmp_path):
+    source = np.random.default_rng(2).integers(0, 256, (50, 37, 3), dtype=np.uint8)
+    chain = [(OPERATIONS["apply_median"].function, {"size": 5}),
+             (OPERATIONS["apply_sobel"].function, {})]
+    expected = OPERATIONS["apply_sobel"].function(OPERATIONS["apply_median"].function(source, size=5))
+    path = str(tmp_path / "in.npy")
+    np.save(path, source)
+
+    result = tiling.process_tiled(path, str(tmp_path / "out.npy"), chain, tile_size=8)
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(np.load(str(tmp_path / "out.npy")), expected)
+    np.testing.assert_array_equal(tiling.run_chain_on_disk(source, chain, tile_size=8), expected)
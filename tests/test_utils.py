@@ -0,0 +1,39 @@
+import gc
+import threading
+
+import numpy as np
+from PIL import Image
+
+from processing import utils
+
+
+def test_plane_cache_is_safe_across_threads():
+    utils.clear_plane_cache()
+    errors = []
+
+    def work(seed):
+        try:
+            for index in range(200):
+                image = Image.new("RGB", (4, 4), (seed, index % 256, 0))
+                plane = utils.ensure_grayscale(image)
+                assert utils.ensure_grayscale(image) is plane
+        except Exception as e:  # collected for the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(utils._PLANE_CACHE) <= utils.PLANE_CACHE_SIZE
+
+
+def test_collected_images_leave_the_plane_cache():
+    utils.clear_plane_cache()
+    image = Image.fromarray(np.zeros((4, 4, 3), dtype=np.uint8))
+    utils.ensure_grayscale(image)
+    del image
+    gc.collect()
+    utils.ensure_grayscale(Image.new("RGB", (2, 2)))
+    assert len(utils._PLANE_CACHE) == 1